@@ -0,0 +1,72 @@
+import argparse
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import main as solver
+
+
+def expand_instance_paths(patterns: list[str]) -> list[Path]:
+	"""Expands glob patterns and directories into a sorted list of unique instance files."""
+	paths: set[Path] = set()
+	for pattern in patterns:
+		matches = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+		for match in matches:
+			path = Path(match)
+			if path.is_dir():
+				paths.update(path.glob('*.json'))
+			else:
+				paths.add(path)
+	return sorted(paths)
+
+
+def _solve_instance(input_path: Path, args: argparse.Namespace) -> tuple[list[str | float], float]:
+	start_time = time.time()
+	row = solver.solve_instance(input_path, args, append_csv=False)
+	return row, time.time() - start_time
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Solve many instances over a pool of worker processes.")
+	parser.add_argument("instances", type=str, nargs='+', help="Instance files, directories or glob patterns.")
+	parser.add_argument("-j",
+	                    "--jobs",
+	                    type=int,
+	                    default=os.cpu_count(),
+	                    help="Number of instances solved in parallel (default: number of CPUs).")
+	solver.add_solver_arguments(parser)
+	args = parser.parse_args()
+
+	instance_paths = expand_instance_paths(args.instances)
+	results_path = Path(args.output) / "results.csv"
+	print(f"Solving {len(instance_paths)} instances with {args.jobs} workers")
+
+	start_time = time.time()
+	failed: list[Path] = []
+	with ProcessPoolExecutor(args.jobs) as executor:
+		futures = {executor.submit(_solve_instance, path, args): path for path in instance_paths}
+		for future in as_completed(futures):
+			path = futures[future]
+			try:
+				row, elapsed = future.result()
+			except Exception:
+				failed.append(path)
+				print(f"Failed to solve {path}:\n{traceback.format_exc()}")
+				continue
+			# Only this process writes the results file, so rows of parallel solves cannot interleave
+			solver.append_results(results_path, [row])
+			print(f"Solved {path} in {elapsed:.1f}s")
+
+	elapsed = time.time() - start_time
+	solved = len(instance_paths) - len(failed)
+	print(f"Solved {solved}/{len(instance_paths)} instances in {elapsed:.1f}s "
+	      f"({solved / elapsed * 3600:.1f} instances/hour)")
+	if failed:
+		print("Failed instances: " + ", ".join(str(path) for path in failed))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,773 @@
+import argparse
+import copy
+import json
+import datetime
+import functools
+import math
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from pyvrp import Model, solve
+from pyvrp.search import NeighbourhoodParams, compute_neighbours
+from pyvrp.stop import MaxIterations
+
+import instance_cache
+import instance_generator
+import loader_heuristic
+import loader_path_cover
+import loader_schedule
+import objective
+import pyvrp_model
+import solution_validator
+from instance import Instance, Order, integer_round
+
+
+def reference_matrices(json_path: Path):
+	"""
+	Builds the distance and time matrices with the original pure-Python loops. Used as a reference for the regression
+	check of the vectorized implementation.
+	"""
+	with open(json_path, 'r') as f:
+		data = json.load(f)
+	depot = data['depot']
+	orders = data['orders']
+	distances: list[list[int]] = []
+	row = [0]
+	for order in orders:
+		row.append(integer_round(math.sqrt((depot['x'] - order['x'])**2 + (depot['y'] - order['y'])**2)))
+	distances.append(row)
+	for order1 in orders:
+		row = [integer_round(math.sqrt((depot['x'] - order1['x'])**2 + (depot['y'] - order1['y'])**2))]
+		row += [
+		    integer_round(math.sqrt((order1['x'] - order2['x'])**2 + (order1['y'] - order2['y'])**2))
+		    for order2 in orders
+		]
+		distances.append(row)
+	vehicle_times = [[integer_round(distance / data['vehicle_speed'] / 100) for distance in row] for row in distances]
+	loader_times = [[integer_round(distance / data['loader_speed'] / 100) for distance in row] for row in distances]
+	return distances, vehicle_times, loader_times
+
+
+def benchmark_load(instance_paths: list[Path]):
+	"""Times instance loading against the reference implementation and checks that the matrices are identical."""
+	for path in instance_paths:
+		start = time.perf_counter()
+		reference = reference_matrices(path)
+		reference_time = time.perf_counter() - start
+
+		start = time.perf_counter()
+		instance = Instance.from_json(path)
+		load_time = time.perf_counter() - start
+
+		matrices = (instance.distances, instance.vehicle_times, instance.loader_times)
+		for name, expected, actual in zip(('distances', 'vehicle_times', 'loader_times'), reference, matrices):
+			if expected != actual:
+				raise AssertionError(f'{path}: {name} differs from the reference implementation')
+		print(f'{path.name}: {len(instance.orders)} orders, reference {reference_time:.3f}s, '
+		      f'from_json {load_time:.3f}s, speedup {reference_time / load_time:.1f}x, matrices match')
+
+
+def benchmark_memory(instance_paths: list[Path]):
+	"""Reports the memory used by the default and compact representations of each instance."""
+	for path in instance_paths:
+		for compact in (False, True):
+			start = time.perf_counter()
+			instance = Instance.from_json(path, compact=compact)
+			load_time = time.perf_counter() - start
+			usage = instance.memory_usage()
+			details = ', '.join(f'{name} {size / 2**20:.1f} MiB' for name, size in usage.items())
+			print(f'{path.name} ({"compact" if compact else "default"}, loaded in {load_time:.3f}s): {details}')
+
+
+def benchmark_sparse(instance_paths: list[Path], neighbours: list[int], time_limit: float):
+	"""
+	Compares the sparse mode with the compact dense mode: instance memory, peak memory of building the PyVRP problem
+	data with its neighbourhood, and the objective after solving both stages for the same time. The sparse
+	neighbourhoods are checked to equal `compute_neighbours` with the same number of neighbours.
+	"""
+	for path in instance_paths:
+		instances = [('dense', Instance.from_json(path, compact=True))]
+		instances += [(f'k={k}', Instance.from_json(path, neighbours=k)) for k in neighbours]
+		dense_data = pyvrp_model.build_first_stage_data(instances[0][1])
+		for name, instance in instances:
+			sparse_neighbours = pyvrp_model.search_neighbours(instance)
+			if instance.neighbours is not None:
+				params = NeighbourhoodParams(nb_granular=instance.neighbours.shape[1])
+				if sparse_neighbours != compute_neighbours(dense_data, params):
+					raise AssertionError(f'{path}: sparse neighbourhood differs from compute_neighbours')
+
+			tracemalloc.start()
+			data = pyvrp_model.build_first_stage_data(instance)
+			if sparse_neighbours is None:
+				compute_neighbours(data)
+			_, model_memory = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+
+			instance_memory = instance.memory_usage()['total']
+			routes = pyvrp_model.build_vehicle_schedule(instance, time_limit).routes
+			vehicle_objective = objective.calculate_vehicle_objective(instance, routes)
+			jobs = loader_schedule.collect_loader_jobs(instance, [route.clients for route in routes])
+			jobs.sort(key=lambda job: job.earliest_time)
+			loader_objective = objective.calculate_loader_objective(instance,
+			                                                        loader_schedule.build_loader_schedule(instance, jobs))
+			print(f'{path.name} ({name}): instance {instance_memory / 2**20:.1f} MiB, '
+			      f'problem data and neighbourhood peak {model_memory / 2**20:.1f} MiB, '
+			      f'vehicle objective {vehicle_objective / 10_000:.2f}, loader objective {loader_objective / 10_000:.2f}')
+
+
+def benchmark_cache(instance_paths: list[Path]):
+	"""Compares loading from JSON with cold and warm loads through the instance cache."""
+	with tempfile.TemporaryDirectory() as cache_dir:
+		for path in instance_paths:
+			timings = {}
+			start = time.perf_counter()
+			Instance.from_json(path, compact=True)
+			timings['json'] = time.perf_counter() - start
+			for name in ('cold', 'warm'):
+				start = time.perf_counter()
+				instance_cache.load_instance(path, Path(cache_dir))
+				timings[name] = time.perf_counter() - start
+			print(f'{path.name}: ' + ', '.join(f'{name} {value:.3f}s' for name, value in timings.items()))
+
+
+def synthetic_routes(instance: Instance, route_length: int = 20) -> list[list[tuple[int, int]]]:
+	"""Splits all orders, sorted by the start of their time windows, into routes of the given length."""
+	orders = sorted(instance.orders, key=lambda order: order.time_window[0])
+	return [[(0, 0)] + [(order.id, order.time_window[0]) for order in orders[i:i + route_length]] + [(0, 0)]
+	        for i in range(0, len(orders), route_length)]
+
+
+def collect_loader_jobs_linear(instance: Instance, vehicle_routes: list[list[tuple[int, int]]]):
+	"""The original `collect_loader_jobs` with a linear scan per stop."""
+	jobs: list[loader_schedule.LoaderJob] = []
+	for route in vehicle_routes:
+		for order_id, arrival_time in route:
+			if order_id == 0:
+				continue
+			order = next(o for o in instance.orders if o.id == order_id)
+			if order.loader_cnt > 0:
+				jobs.append(
+				    loader_schedule.LoaderJob(order.inner_id, arrival_time, order.loader_service_time, order.loader_cnt,
+				                              order))
+	return jobs
+
+
+def benchmark_jobs(instance_paths: list[Path]):
+	"""Compares the scaling of loader job collection with the linear scan and with the order index."""
+	for path in instance_paths:
+		instance = Instance.from_json(path, compact=True)
+		routes = synthetic_routes(instance)
+
+		start = time.perf_counter()
+		expected = collect_loader_jobs_linear(instance, routes)
+		linear_time = time.perf_counter() - start
+
+		start = time.perf_counter()
+		actual = loader_schedule.collect_loader_jobs(instance, routes)
+		indexed_time = time.perf_counter() - start
+
+		if expected != actual:
+			raise AssertionError(f'{path}: indexed job collection differs from the linear scan')
+		print(f'{path.name}: {len(instance.orders)} orders, linear scan {linear_time * 1000:.2f}ms, '
+		      f'indexed {indexed_time * 1000:.2f}ms (including index construction)')
+
+
+def benchmark_loader_evaluation(instance_paths: list[Path], evaluations: int):
+	"""Compares the Nevergrad objective built on `build_loader_schedule` with `LoaderScheduleEvaluator` on random job
+	orders and checks that both give the same objective."""
+	rng = random.Random(43)
+	for path in instance_paths:
+		instance = Instance.from_json(path)
+		jobs = loader_schedule.collect_loader_jobs(instance, synthetic_routes(instance))
+		jobs.sort(key=lambda job: job.earliest_time)
+		orders = [list(range(len(jobs)))] + [rng.sample(range(len(jobs)), len(jobs)) for _ in range(evaluations - 1)]
+
+		start = time.perf_counter()
+		expected = [
+		    objective.calculate_loader_objective(
+		        instance, loader_schedule.build_loader_schedule(instance, [jobs[i] for i in order],
+		                                                        loader_schedule.select_job_next)) for order in orders
+		]
+		reference_time = time.perf_counter() - start
+
+		evaluator = loader_schedule.LoaderScheduleEvaluator(instance, jobs)
+		start = time.perf_counter()
+		actual = [evaluator.evaluate(order) for order in orders]
+		evaluator_time = time.perf_counter() - start
+
+		if expected != actual:
+			raise AssertionError(f'{path}: evaluator objective differs from build_loader_schedule')
+		print(f'{path.name}: {len(jobs)} jobs, build_loader_schedule {evaluations / reference_time:.1f} evals/s, '
+		      f'evaluator {evaluations / evaluator_time:.1f} evals/s, speedup {reference_time / evaluator_time:.1f}x')
+
+
+def reference_select_job_min_wait(instance: Instance, job_pool: list[loader_schedule.LoaderJob], finish_time: int,
+                                  prev_order: Order, first_order_id: int, begin_time: int):
+	"""The original `select_job_min_wait` scanning the whole job list."""
+	best_job_idx = None
+	min_wait = math.inf
+	best_arrival_time = None
+	for job_idx, candidate_job in enumerate(job_pool):
+		travel_time = instance.loader_times[prev_order.inner_id][candidate_job.order.inner_id]
+		arrival_time = finish_time + travel_time
+		candidate_start = max(arrival_time, candidate_job.earliest_time)
+		candidate_finish = candidate_start + candidate_job.loader_service_time
+		return_time = candidate_finish + instance.loader_times[candidate_job.order.inner_id][first_order_id]
+		if arrival_time > candidate_job.earliest_time or return_time - begin_time > instance.loader_shift_size:
+			continue
+		wait_time = candidate_job.earliest_time - arrival_time
+		if wait_time < min_wait:
+			min_wait = wait_time
+			best_job_idx = job_idx
+			best_arrival_time = arrival_time
+	return best_job_idx, best_arrival_time
+
+
+def reference_select_job_next(instance: Instance, job_pool: list[loader_schedule.LoaderJob], finish_time: int,
+                              prev_order: Order, first_order_id: int, begin_time: int):
+	"""The original `select_job_next` scanning the job list up to the first feasible job."""
+	for job_idx, candidate_job in enumerate(job_pool):
+		travel_time = instance.loader_times[prev_order.inner_id][candidate_job.order.inner_id]
+		arrival_time = finish_time + travel_time
+		candidate_start = max(arrival_time, candidate_job.earliest_time)
+		candidate_finish = candidate_start + candidate_job.loader_service_time
+		return_time = candidate_finish + instance.loader_times[candidate_job.order.inner_id][first_order_id]
+		if arrival_time > candidate_job.earliest_time or return_time - begin_time > instance.loader_shift_size:
+			continue
+		return job_idx, arrival_time
+	return None, None
+
+
+def reference_build_loader_schedule(instance: Instance, jobs: list[loader_schedule.LoaderJob],
+                                    job_selector: Callable) -> list[loader_schedule.LoaderRoute]:
+	"""The original `build_loader_schedule` keeping the job pool as a list."""
+	job_pool = [copy.copy(job) for job in jobs]
+	routes: list[loader_schedule.LoaderRoute] = []
+	while job_pool:
+		loader_route: list[int] = []
+		finish_time = 0
+		current_job = job_pool[0]
+		current_time = current_job.earliest_time
+		first_order_id = current_job.order_id
+		begin_time = current_job.earliest_time
+		while job_pool:
+			current_job.loader_cnt -= 1
+			if current_job.loader_cnt == 0:
+				job_pool.remove(current_job)
+			start_time = max(current_time, current_job.earliest_time)
+			finish_time = start_time + current_job.loader_service_time
+			loader_route.append(current_job.order_id)
+			best_job_idx, best_arrival_time = job_selector(instance, job_pool, finish_time, current_job.order,
+			                                               first_order_id, begin_time)
+			if best_job_idx is None:
+				break
+			current_job = job_pool[best_job_idx]
+			current_time = best_arrival_time
+		if loader_route:
+			finish_time = finish_time + instance.loader_times[current_job.order.id][first_order_id]
+			routes.append(loader_schedule.LoaderRoute(loader_route, int(finish_time - begin_time)))
+	return routes
+
+
+def benchmark_greedy(instance_paths: list[Path], orders: int):
+	"""Compares `build_loader_schedule` on the indexed job pool with the original list scan for both selectors, on
+	the jobs sorted by earliest time and on random orders, and checks that the schedules are identical."""
+	rng = random.Random(43)
+	for path in instance_paths:
+		instance = Instance.from_json(path)
+		jobs = loader_schedule.collect_loader_jobs(instance, synthetic_routes(instance))
+		jobs.sort(key=lambda job: job.earliest_time)
+		job_orders = [jobs] + [rng.sample(jobs, len(jobs)) for _ in range(orders - 1)]
+		for name, selector, reference_selector in (
+		    ('min_wait', loader_schedule.select_job_min_wait, reference_select_job_min_wait),
+		    ('next', loader_schedule.select_job_next, reference_select_job_next)):
+			start = time.perf_counter()
+			expected = [reference_build_loader_schedule(instance, ordered, reference_selector) for ordered in job_orders]
+			reference_time = time.perf_counter() - start
+
+			start = time.perf_counter()
+			actual = [loader_schedule.build_loader_schedule(instance, ordered, selector) for ordered in job_orders]
+			indexed_time = time.perf_counter() - start
+
+			if expected != actual:
+				raise AssertionError(f'{path}: {name} schedules differ from the list scan')
+			print(f'{path.name}: {len(jobs)} jobs, {name}, list scan {reference_time / orders * 1000:.1f}ms, '
+			      f'indexed pool {indexed_time / orders * 1000:.1f}ms, speedup {reference_time / indexed_time:.1f}x')
+
+
+def benchmark_path_cover(instance_paths: list[Path], successors: list[int], time_limit: float):
+	"""
+	Compares the path cover schedule for different numbers of successors with the greedy schedules and with Nevergrad
+	and the local search given `time_limit` seconds each: number of loaders, both loader objectives and runtime. The
+	path cover over all successors, before chains are split at the shift size, is the minimum number of loaders for
+	the jobs.
+	"""
+	for path in instance_paths:
+		instance = Instance.from_json(path)
+		jobs = loader_schedule.collect_loader_jobs(instance, synthetic_routes(instance))
+		jobs.sort(key=lambda job: job.earliest_time)
+		minimum = len(loader_path_cover.minimum_path_cover(jobs, loader_path_cover.successor_candidates(instance,
+		                                                                                                jobs, None)))
+		print(f'{path.name}: {len(jobs)} jobs, {sum(job.loader_cnt for job in jobs)} loader slots, at least {minimum} '
+		      f'loaders')
+
+		def nevergrad() -> list[loader_schedule.LoaderRoute]:
+			ordered_jobs = loader_heuristic.optimize_loader_schedule_with_nevergrad(instance, jobs, time_limit)
+			return loader_schedule.build_loader_schedule(instance, ordered_jobs, loader_schedule.select_job_next)
+
+		def local_search() -> list[loader_schedule.LoaderRoute]:
+			ordered_jobs = loader_heuristic.optimize_loader_schedule_with_local_search(instance, jobs, time_limit)
+			return loader_schedule.build_loader_schedule(instance, ordered_jobs, loader_schedule.select_job_next)
+
+		variants: list[tuple[str, Callable[[], list[loader_schedule.LoaderRoute]]]] = [
+		    ('min wait', lambda: loader_schedule.build_loader_schedule(instance, jobs)),
+		    ('due time', lambda: loader_schedule.build_loader_schedule(instance, jobs, loader_schedule.select_job_next)),
+		]
+		for num_successors in successors:
+			variants.append((f'path cover {num_successors}',
+			                 functools.partial(loader_path_cover.build_path_cover_schedule, instance, jobs,
+			                                   num_successors)))
+		if time_limit > 0:
+			variants += [('nevergrad', nevergrad), ('local search', local_search)]
+		for name, build in variants:
+			start = time.perf_counter()
+			schedule = build()
+			elapsed = time.perf_counter() - start
+			print(f'  {name}: {len(schedule)} loaders, objective '
+			      f'{objective.calculate_loader_objective(instance, schedule) / 10_000:.2f}, validator '
+			      f'{objective.calculate_loader_objective_wrong(instance, schedule) / 10_000:.2f}, {elapsed:.2f}s')
+
+
+def benchmark_startup(instance_path: Path, time_limit: float, repeat: int):
+	"""
+	Measures the startup overhead of the command line: importing the solver with and without Nevergrad, which is
+	imported on first use, and the time a solve takes beyond its time limit, for the command line and for requests to
+	a running `service.py`.
+	"""
+	root = Path(__file__).resolve().parent
+	python = sys.executable
+
+	def timed_run(command: list[str]) -> float:
+		start = time.perf_counter()
+		subprocess.run(command, check=True, capture_output=True, cwd=root)
+		return time.perf_counter() - start
+
+	import_time = min(timed_run([python, '-c', 'import main']) for _ in range(repeat))
+	eager_import_time = min(timed_run([python, '-c', 'import main, nevergrad']) for _ in range(repeat))
+	print(f'import main: {import_time:.2f}s, with Nevergrad: {eager_import_time:.2f}s')
+
+	with tempfile.TemporaryDirectory() as output:
+		command = [python, 'main.py', str(instance_path.resolve()), '-t', str(time_limit), '-o', output]
+		cli_times = [timed_run(command) for _ in range(repeat)]
+		print(f'main.py: {min(cli_times) - time_limit:.2f}s beyond the {time_limit:.1f}s time limit')
+
+		service = subprocess.Popen([python, 'service.py', '-o', output],
+		                           stdin=subprocess.PIPE,
+		                           stdout=subprocess.PIPE,
+		                           stderr=subprocess.DEVNULL,
+		                           text=True,
+		                           cwd=root)
+		assert service.stdin is not None and service.stdout is not None
+		request = json.dumps({'instance': str(instance_path.resolve()), 'options': {'time': time_limit}})
+		service_times = []
+		for _ in range(repeat + 1):
+			start = time.perf_counter()
+			print(request, file=service.stdin, flush=True)
+			response = json.loads(service.stdout.readline())
+			service_times.append(time.perf_counter() - start)
+			if response['status'] != 'ok':
+				raise AssertionError(f'service request failed: {response["error"]}')
+		service.stdin.close()
+		service.wait()
+	print(f'service: first request including service startup {service_times[0] - time_limit:.2f}s, cached requests '
+	      f'{min(service_times[1:]) - time_limit:.2f}s beyond the time limit')
+
+
+def benchmark_nevergrad(instance_path: Path, workers: list[int], time_limit: float):
+	"""Measures the Nevergrad evaluations per second for different numbers of worker processes."""
+	instance = Instance.from_json(instance_path)
+	jobs = loader_schedule.collect_loader_jobs(instance, synthetic_routes(instance))
+	jobs.sort(key=lambda job: job.earliest_time)
+	evaluator = loader_schedule.LoaderScheduleEvaluator(instance, jobs)
+	for num_workers in workers:
+		start = time.perf_counter()
+		permutation, evaluations = loader_heuristic.minimize_job_order(instance, jobs, time_limit, num_workers)
+		elapsed = time.perf_counter() - start
+		print(f'{instance_path.name}: {num_workers} workers, {evaluations / elapsed:.1f} evals/s, '
+		      f'best objective {evaluator.evaluate(permutation) / 10_000:.2f}')
+
+
+def benchmark_permutation_cache(instance_paths: list[Path], optimizers: list[str], time_limit: float):
+	"""Reports the share of Nevergrad candidates that decode to an already evaluated permutation, per optimizer."""
+	for path in instance_paths:
+		instance = Instance.from_json(path)
+		jobs = loader_schedule.collect_loader_jobs(instance, synthetic_routes(instance))
+		jobs.sort(key=lambda job: job.earliest_time)
+		for optimizer_name in optimizers:
+			cache = loader_heuristic.PermutationCache()
+			start = time.perf_counter()
+			_, evaluations = loader_heuristic.minimize_job_order(instance,
+			                                                     jobs,
+			                                                     time_limit,
+			                                                     optimizer_name=optimizer_name,
+			                                                     cache=cache)
+			elapsed = time.perf_counter() - start
+			statistics = cache.statistics()
+			print(f'{path.name}: {len(jobs)} jobs, {optimizer_name}, {evaluations / elapsed:.1f} candidates/s, '
+			      f'{statistics["hits"]} cache hits ({statistics["hit_rate"]:.1%})')
+
+
+def benchmark_validator(instance_path: Path, solution_path: Path, num_solutions: int, batch_sizes: list[int]):
+	"""Measures the throughput of the solution validator for copies of a solution checked in batches of different
+	sizes, where a batch size of 1 is checking every solution on its own."""
+	instance = Instance.from_json(instance_path, compact=True)
+	validator = solution_validator.SolutionValidator(instance)
+	solutions = solution_validator.load_solutions([solution_path]) * num_solutions
+	print(f'{solution_path.name}: {validator.validate(solutions[:1]).solution(0)}')
+	for batch_size in batch_sizes:
+		start = time.perf_counter()
+		for batch_start in range(0, num_solutions, batch_size):
+			validator.validate(solutions[batch_start:batch_start + batch_size])
+		elapsed = time.perf_counter() - start
+		print(f'  batch size {batch_size}: {num_solutions / elapsed:.0f} solutions/s')
+
+
+def benchmark_local_search(instance_paths: list[Path], time_limit: float):
+	"""Compares Nevergrad and the permutation local search at equal wall time."""
+	for path in instance_paths:
+		instance = Instance.from_json(path)
+		jobs = loader_schedule.collect_loader_jobs(instance, synthetic_routes(instance))
+		jobs.sort(key=lambda job: job.earliest_time)
+		results = {}
+		for name, optimize in (('nevergrad', loader_heuristic.optimize_loader_schedule_with_nevergrad),
+		                       ('local search', loader_heuristic.optimize_loader_schedule_with_local_search)):
+			ordered_jobs = optimize(instance, jobs, time_limit)
+			schedule = loader_schedule.build_loader_schedule(instance, ordered_jobs, loader_schedule.select_job_next)
+			results[name] = objective.calculate_loader_objective(instance, schedule) / 10_000
+		print(f'{path.name}: {len(jobs)} jobs, {time_limit:.0f}s each, ' +
+		      ', '.join(f'{name} {value:.2f}' for name, value in results.items()))
+
+
+def reference_model(instance: Instance):
+	"""
+	Builds the PyVRP model for vehicles only with per-edge `add_edge` calls, as originally done by `pyvrp_model`.
+
+	Args:
+		instance (Instance): An object containing the problem instance data
+
+	Returns:
+		Model: A configured PyVRP model.
+	"""
+	model = Model()
+	depot = model.add_depot(x=instance.depot.x, y=instance.depot.y)
+	model.add_vehicle_type(num_available=len(instance.orders),
+	                       start_depot=depot,
+	                       capacity=instance.vehicle_capacity,
+	                       fixed_cost=instance.weights.vehicle_salary,
+	                       max_duration=instance.vehicle_shift_size + instance.depot.load_time,
+	                       unit_distance_cost=instance.weights.fuel_cost,
+	                       reload_depots=[depot])
+	clients = [
+	    model.add_client(x=order.x,
+	                     y=order.y,
+	                     delivery=order.volume,
+	                     service_duration=order.vehicle_service_time,
+	                     tw_early=order.time_window[0],
+	                     tw_late=order.time_window[1],
+	                     required=False if order.optional else True,
+	                     prize=instance.weights.optional_order_penalty if order.optional else 0,
+	                     name=str(order.id)) for order in instance.orders
+	]
+	# Add edges between depot and clients
+	for i, client in enumerate(clients):
+		model.add_edge(depot,
+		               client,
+		               distance=int(instance.distances[0][i + 1]),
+		               duration=int(instance.vehicle_times[0][i + 1]))
+		model.add_edge(client,
+		               depot,
+		               distance=int(instance.distances[i + 1][0]),
+		               duration=int(instance.vehicle_times[i + 1][0] + instance.depot.load_time))
+
+	# Add edges between clients
+	for i, client1 in enumerate(clients):
+		for j, client2 in enumerate(clients):
+			if i != j:
+				model.add_edge(
+				    client1,
+				    client2,
+				    distance=int(instance.distances[i + 1][j + 1]),
+				    duration=int(instance.vehicle_times[i + 1][j + 1]),
+				)
+	return model
+
+
+def benchmark_model(instance_paths: list[Path]):
+	"""Compares building the PyVRP problem data edge by edge with the bulk construction and checks that both give the
+	same solution for a fixed number of iterations."""
+	for path in instance_paths:
+		instance = Instance.from_json(path)
+
+		start = time.perf_counter()
+		reference_data = reference_model(instance).data()
+		reference_time = time.perf_counter() - start
+
+		start = time.perf_counter()
+		data = pyvrp_model.build_first_stage_data(instance)
+		bulk_time = time.perf_counter() - start
+
+		reference_cost = solve(reference_data, stop=MaxIterations(50), seed=43).cost()
+		cost = solve(data, stop=MaxIterations(50), seed=43).cost()
+		if reference_cost != cost:
+			raise AssertionError(f'{path}: bulk problem data gives a different solution')
+		print(f'{path.name}: add_edge model {reference_time:.3f}s, bulk {bulk_time:.3f}s, '
+		      f'speedup {reference_time / bulk_time:.1f}x, same solution after 50 iterations')
+
+
+def suite_stages(instance_path: Path, compact: bool) -> list[tuple[str, Callable[[], object]]]:
+	"""
+	Prepares the stages timed by the benchmark suite. Each stage is a function running one hot path on inputs prepared
+	in advance, so that stages can be timed independently.
+	"""
+	instance = Instance.from_json(instance_path, compact=compact)
+	routes = synthetic_routes(instance)
+	jobs = loader_schedule.collect_loader_jobs(instance, routes)
+	jobs.sort(key=lambda job: job.earliest_time)
+	schedule = loader_schedule.build_loader_schedule(instance, jobs, loader_schedule.select_job_next)
+	vehicle_routes = [pyvrp_model.VehicleRoute(route, 0, 0) for route in routes]
+	evaluator = loader_schedule.LoaderScheduleEvaluator(instance, jobs)
+	order = list(range(len(jobs)))
+	return [
+	    ('load', lambda: Instance.from_json(instance_path, compact=compact)),
+	    ('build_first_stage_data', lambda: pyvrp_model.build_first_stage_data(instance)),
+	    ('collect_loader_jobs', lambda: loader_schedule.collect_loader_jobs(instance, routes)),
+	    ('build_loader_schedule_min_wait', lambda: loader_schedule.build_loader_schedule(instance, jobs)),
+	    ('build_loader_schedule_next',
+	     lambda: loader_schedule.build_loader_schedule(instance, jobs, loader_schedule.select_job_next)),
+	    ('loader_evaluator_init', lambda: loader_schedule.LoaderScheduleEvaluator(instance, jobs)),
+	    ('loader_evaluator_evaluate', lambda: evaluator.evaluate(order)),
+	    ('calculate_vehicle_objective', lambda: objective.calculate_vehicle_objective(instance, vehicle_routes)),
+	    ('calculate_loader_objective', lambda: objective.calculate_loader_objective(instance, schedule)),
+	    ('calculate_loader_objective_wrong', lambda: objective.calculate_loader_objective_wrong(instance, schedule)),
+	]
+
+
+def git_revision() -> str | None:
+	"""Returns the current git commit, if available."""
+	try:
+		return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+		                      cwd=Path(__file__).parent).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def benchmark_suite(sizes: list[int], seed: int, repeat: int, compact: bool, output: Path):
+	"""
+	Times every stage on generated instances of the given sizes and records the peak memory of each stage.
+
+	Timings are the minimum over `repeat` runs. Peak memory is measured with `tracemalloc` in a separate run, since
+	tracing slows the code down. The results are written to `output` as JSON.
+	"""
+	results: list[dict[str, object]] = []
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		for size in sizes:
+			instance_path = Path(tmp_dir) / f'generated_{size}_{seed}.json'
+			instance_generator.write_instance(instance_path, size, seed)
+			for stage, run in suite_stages(instance_path, compact):
+				timings = []
+				for _ in range(repeat):
+					start = time.perf_counter()
+					run()
+					timings.append(time.perf_counter() - start)
+				tracemalloc.start()
+				run()
+				_, peak_memory = tracemalloc.get_traced_memory()
+				tracemalloc.stop()
+				results.append({'orders': size, 'stage': stage, 'time': min(timings), 'peak_memory': peak_memory})
+				print(f'{size} orders, {stage}: {min(timings):.4f}s, peak memory {peak_memory / 2**20:.1f} MiB')
+
+	report = {
+	    'metadata': {
+	        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+	        'git_revision': git_revision(),
+	        'python': platform.python_version(),
+	        'machine': platform.machine(),
+	        'seed': seed,
+	        'repeat': repeat,
+	        'compact': compact,
+	    },
+	    'results': results,
+	}
+	output.parent.mkdir(parents=True, exist_ok=True)
+	with open(output, 'w') as f:
+		json.dump(report, f, indent=4)
+	print(f"Results written to {output}")
+
+
+def compare_suites(baseline_path: Path, current_path: Path):
+	"""Prints the time and memory ratios between two results files of the benchmark suite."""
+	with open(baseline_path, 'r') as f:
+		baseline = {(result['orders'], result['stage']): result for result in json.load(f)['results']}
+	with open(current_path, 'r') as f:
+		current = json.load(f)['results']
+	for result in current:
+		reference = baseline.get((result['orders'], result['stage']))
+		if reference is None:
+			continue
+		time_ratio = result['time'] / reference['time'] if reference['time'] else math.inf
+		memory_ratio = result['peak_memory'] / reference['peak_memory'] if reference['peak_memory'] else math.inf
+		print(f"{result['orders']} orders, {result['stage']}: time {reference['time']:.4f}s -> {result['time']:.4f}s "
+		      f"({time_ratio:.2f}x), peak memory {memory_ratio:.2f}x")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks and regression checks.")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	load_parser = subparsers.add_parser("load", help="Benchmark instance loading and check the matrices.")
+	load_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+
+	memory_parser = subparsers.add_parser("memory", help="Report memory per instance for both representations.")
+	memory_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+
+	sparse_parser = subparsers.add_parser("sparse", help="Compare the sparse mode with dense matrices.")
+	sparse_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+	sparse_parser.add_argument("-k",
+	                           "--neighbours",
+	                           type=int,
+	                           nargs='+',
+	                           default=[10, 20, 40],
+	                           help="Numbers of neighbours per order.")
+	sparse_parser.add_argument("-t", "--time", type=float, default=10.0, help="Vehicle time limit per run in seconds.")
+
+	cache_parser = subparsers.add_parser("cache", help="Benchmark loading through the instance cache.")
+	cache_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+
+	jobs_parser = subparsers.add_parser("jobs", help="Benchmark loader job collection.")
+	jobs_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+
+	loader_eval_parser = subparsers.add_parser("loader-eval", help="Benchmark loader schedule evaluation.")
+	loader_eval_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+	loader_eval_parser.add_argument("-n", "--evaluations", type=int, default=200, help="Number of evaluated orders.")
+
+	greedy_parser = subparsers.add_parser("greedy", help="Benchmark the greedy loader schedule construction.")
+	greedy_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+	greedy_parser.add_argument("-n", "--orders", type=int, default=5, help="Number of job orders per instance.")
+
+	path_cover_parser = subparsers.add_parser("path-cover",
+	                                          help="Compare the path cover loader schedule with the other variants.")
+	path_cover_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+	path_cover_parser.add_argument("-k",
+	                               "--successors",
+	                               type=int,
+	                               nargs='+',
+	                               default=[16, 64],
+	                               help="Numbers of successors per job.")
+	path_cover_parser.add_argument("-t",
+	                               "--time",
+	                               type=float,
+	                               default=10.0,
+	                               help="Time limit of Nevergrad and the local search in seconds, 0 to skip them.")
+
+	startup_parser = subparsers.add_parser("startup", help="Benchmark the startup of the command line and the service.")
+	startup_parser.add_argument("instance", type=Path, help="Path to an instance JSON file.")
+	startup_parser.add_argument("-t", "--time", type=float, default=2.0, help="Time limit per solve in seconds.")
+	startup_parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed runs.")
+
+	nevergrad_parser = subparsers.add_parser("nevergrad", help="Benchmark parallel Nevergrad evaluation.")
+	nevergrad_parser.add_argument("instance", type=Path, help="Path to an instance JSON file.")
+	nevergrad_parser.add_argument("-w", "--workers", type=int, nargs='+', default=[1, 2, 4], help="Worker counts.")
+	nevergrad_parser.add_argument("-t", "--time", type=float, default=10.0, help="Time limit per run in seconds.")
+
+	permutation_cache_parser = subparsers.add_parser("permutation-cache",
+	                                                 help="Measure duplicate permutations proposed by Nevergrad.")
+	permutation_cache_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+	permutation_cache_parser.add_argument("--optimizers",
+	                                      type=str,
+	                                      nargs='+',
+	                                      default=['NGOpt', 'OnePlusOne', 'TwoPointsDE', 'DiscreteLenglerOnePlusOne'],
+	                                      help="Nevergrad optimizers to compare.")
+	permutation_cache_parser.add_argument("-t", "--time", type=float, default=5.0, help="Time limit per run in seconds.")
+
+	local_search_parser = subparsers.add_parser("local-search", help="Compare loader local search with Nevergrad.")
+	local_search_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+	local_search_parser.add_argument("-t", "--time", type=float, default=10.0, help="Time limit per run in seconds.")
+
+	validator_parser = subparsers.add_parser("validator", help="Measure the throughput of the solution validator.")
+	validator_parser.add_argument("instance", type=Path, help="Path to an instance JSON file.")
+	validator_parser.add_argument("solution", type=Path, help="Path to a solution file of the instance.")
+	validator_parser.add_argument("-n", "--solutions", type=int, default=2000, help="Number of solutions checked.")
+	validator_parser.add_argument("-b",
+	                              "--batch-sizes",
+	                              type=int,
+	                              nargs='+',
+	                              default=[1, 100, 1000],
+	                              help="Numbers of solutions checked at once.")
+
+	model_parser = subparsers.add_parser("model", help="Benchmark PyVRP problem construction.")
+	model_parser.add_argument("instances", type=Path, nargs='+', help="Paths to instance JSON files.")
+
+	suite_parser = subparsers.add_parser("suite", help="Time every stage on generated instances.")
+	suite_parser.add_argument("-n",
+	                          "--sizes",
+	                          type=int,
+	                          nargs='+',
+	                          default=[100, 500, 1000, 2000],
+	                          help="Numbers of orders of the generated instances.")
+	suite_parser.add_argument("-s", "--seed", type=int, default=43, help="Seed of the instance generator.")
+	suite_parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed runs per stage.")
+	suite_parser.add_argument("--compact", action="store_true", help="Use compact instances (needed for 10k orders).")
+	suite_parser.add_argument("-o",
+	                          "--output",
+	                          type=Path,
+	                          default=Path('benchmarks') / f'{datetime.date.today().isoformat()}.json',
+	                          help="Path of the JSON results file.")
+
+	compare_parser = subparsers.add_parser("compare", help="Compare two results files of the suite.")
+	compare_parser.add_argument("baseline", type=Path, help="Results file of the baseline.")
+	compare_parser.add_argument("current", type=Path, help="Results file to compare.")
+
+	args = parser.parse_args()
+	if args.command == "load":
+		benchmark_load(args.instances)
+	elif args.command == "memory":
+		benchmark_memory(args.instances)
+	elif args.command == "sparse":
+		benchmark_sparse(args.instances, args.neighbours, args.time)
+	elif args.command == "cache":
+		benchmark_cache(args.instances)
+	elif args.command == "jobs":
+		benchmark_jobs(args.instances)
+	elif args.command == "loader-eval":
+		benchmark_loader_evaluation(args.instances, args.evaluations)
+	elif args.command == "greedy":
+		benchmark_greedy(args.instances, args.orders)
+	elif args.command == "path-cover":
+		benchmark_path_cover(args.instances, args.successors, args.time)
+	elif args.command == "startup":
+		benchmark_startup(args.instance, args.time, args.repeat)
+	elif args.command == "nevergrad":
+		benchmark_nevergrad(args.instance, args.workers, args.time)
+	elif args.command == "permutation-cache":
+		benchmark_permutation_cache(args.instances, args.optimizers, args.time)
+	elif args.command == "local-search":
+		benchmark_local_search(args.instances, args.time)
+	elif args.command == "validator":
+		benchmark_validator(args.instance, args.solution, args.solutions, args.batch_sizes)
+	elif args.command == "model":
+		benchmark_model(args.instances)
+	elif args.command == "suite":
+		benchmark_suite(args.sizes, args.seed, args.repeat, args.compact, args.output)
+	elif args.command == "compare":
+		compare_suites(args.baseline, args.current)
+
+
+if __name__ == "__main__":
+	main()
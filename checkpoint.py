@@ -0,0 +1,195 @@
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import export_solution
+import loader_schedule
+import objective
+from instance import Instance
+from loader_schedule import LoaderRoute
+from pyvrp_model import SolutionTrips, VehicleRoute
+
+
+@dataclass
+class CheckpointState:
+	"""A structure describing the incumbent recorded by a checkpoint."""
+	stage: str  # Stage that produced the incumbent, 'vehicle' or 'loader'
+	elapsed: float  # Solver time spent before the checkpoint, in seconds
+	vehicle_elapsed: float  # Time spent by the vehicle stage, in seconds
+	vehicle_stopped_early: bool  # Whether the vehicle stage stopped on stagnation or its target before its time limit
+	vehicle_objective: int
+	vehicle_cost: float  # PyVRP cost of the vehicle routes, see `pyvrp_model.solution_cost`
+	loader_objective: int
+	solution_path: Path
+	loader_routes: list[LoaderRoute]  # The loader schedule of the solution, with shift lengths
+	vehicle_trips: SolutionTrips | None  # The vehicle routes as PyVRP trips, None for checkpoints written without them
+
+
+def checkpoint_path(directory: Path, instance_name: str) -> Path:
+	return directory / f'checkpoint_{instance_name}.json'
+
+
+def solution_path(directory: Path, instance_name: str, solution_format: str = 'json') -> Path:
+	return directory / export_solution.solution_file_name(instance_name, solution_format)
+
+
+def _write_atomically(path: Path, write):
+	"""Writes a file under a temporary name with `write(tmp_path)` and renames it, so readers never see a partial
+	file."""
+	tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+	try:
+		write(tmp_path)
+		os.replace(tmp_path, path)
+	finally:
+		tmp_path.unlink(missing_ok=True)
+
+
+def load_checkpoint(directory: Path, instance_name: str) -> CheckpointState | None:
+	"""Reads the checkpoint of an instance, or returns None if there is none."""
+	path = checkpoint_path(directory, instance_name)
+	if not path.exists():
+		return None
+	with open(path, 'r') as f:
+		state = json.load(f)
+	return CheckpointState(state['stage'], state['elapsed'], state['vehicle_elapsed'],
+	                       state.get('vehicle_stopped_early', False), state['vehicle_objective'],
+	                       state.get('vehicle_cost', state['vehicle_objective']), state['loader_objective'],
+	                       directory / state['solution'],
+	                       [LoaderRoute(route['order_ids'], route['shift_length']) for route in state['loader_routes']],
+	                       [(vehicle_type, trips) for vehicle_type, trips in state['vehicle_trips']]
+	                       if 'vehicle_trips' in state else None)
+
+
+def same_vehicle_visits(state: CheckpointState, vehicle_routes: list[VehicleRoute]) -> bool:
+	"""Returns whether vehicle routes visit the same orders at the same times as the solution of a checkpoint, so that
+	its loader schedule is valid for them."""
+	solution = export_solution.read_solution(state.solution_path)
+	return export_solution.solution_to_dict(vehicle_routes, [])['vehicles'] == solution['vehicles']
+
+
+class Checkpoint:
+	"""
+	Keeps the best combined solution of a run on disk, so that a killed run leaves its incumbent behind and can be
+	resumed.
+
+	The incumbent is written with `export_solution.write_solution` to the regular solution file, and a small JSON
+	checkpoint next to it records its objective, the loader schedule and the time spent. Both files are replaced
+	atomically.
+	Stages report the current vehicle routes with `set_vehicle_routes` and offer loader schedules with `offer`; a
+	schedule is written if the combined objective, as evaluated for the results CSV, improves. Periodic offers from the
+	optimizers are only accepted every `interval` seconds.
+
+	Args:
+		instance (Instance): The problem instance.
+		directory (Path): The output directory.
+		instance_name (str): The name of the instance, used in the file names.
+		interval (float): The minimum time between periodic writes, in seconds.
+		elapsed_before (float): Solver time spent by an earlier run that is resumed, in seconds.
+		incumbent_objective (float): The combined objective of the solution already on disk, which is only replaced
+			by better ones.
+		solution_format (str): The format of the solution file, one of `export_solution.SOLUTION_FORMATS`.
+	"""
+
+	def __init__(self,
+	             instance: Instance,
+	             directory: Path,
+	             instance_name: str,
+	             interval: float,
+	             elapsed_before: float = 0.0,
+	             incumbent_objective: float = math.inf,
+	             solution_format: str = 'json'):
+		self.instance = instance
+		self.solution_format = solution_format
+		self.directory = directory
+		self.instance_name = instance_name
+		self.interval = interval
+		self.start_time = time.time() - elapsed_before
+		self.last_write = -math.inf
+		self.best = incumbent_objective
+		self.writes = 0
+		self.vehicle_elapsed = 0.0
+		self.vehicle_stopped_early = False
+		self.vehicle_routes: list[VehicleRoute] = []
+		self.vehicle_trips: SolutionTrips = []
+		self.vehicle_objective = 0
+		self.vehicle_cost = 0.0
+
+	def set_vehicle_routes(self,
+	                       vehicle_routes: list[VehicleRoute],
+	                       vehicle_trips: SolutionTrips,
+	                       vehicle_objective: int,
+	                       vehicle_cost: float,
+	                       vehicle_elapsed: float,
+	                       vehicle_stopped_early: bool = False):
+		"""Sets the vehicle routes that offered loader schedules belong to, and offers them with the greedy loader
+		schedule minimizing waiting time, so that a complete solution is saved as soon as the vehicle stage ends. The
+		trips are saved so that a resumed run restores exactly these routes."""
+		self.vehicle_routes = vehicle_routes
+		self.vehicle_trips = vehicle_trips
+		self.vehicle_objective = vehicle_objective
+		self.vehicle_cost = vehicle_cost
+		self.vehicle_elapsed = vehicle_elapsed
+		self.vehicle_stopped_early = vehicle_stopped_early
+		jobs = loader_schedule.collect_loader_jobs(self.instance, (route.clients for route in vehicle_routes))
+		jobs.sort(key=lambda job: job.earliest_time)
+		self.offer(loader_schedule.build_loader_schedule(self.instance, jobs), stage='vehicle')
+
+	def due(self) -> bool:
+		"""Returns whether a periodic offer would be accepted now."""
+		return time.time() - self.last_write >= self.interval
+
+	def offer(self, loader_routes: list[LoaderRoute], periodic: bool = False, stage: str = 'loader') -> bool:
+		"""
+		Writes the current vehicle routes with the given loader schedule if they improve the incumbent.
+
+		Args:
+			loader_routes (list[LoaderRoute]): The loader schedule for the current vehicle routes.
+			periodic (bool): Whether the offer comes from an optimizer improvement, which is rate limited.
+			stage (str): The stage that produced the offer, recorded in the checkpoint.
+
+		Returns:
+			bool: Whether the checkpoint was written.
+		"""
+		if periodic and not self.due():
+			return False
+		loader_objective = objective.calculate_loader_objective_wrong(self.instance, loader_routes)
+		if self.vehicle_objective + loader_objective >= self.best:
+			return False
+		self.best = self.vehicle_objective + loader_objective
+
+		sol_path = solution_path(self.directory, self.instance_name, self.solution_format)
+		_write_atomically(
+		    sol_path, lambda path: export_solution.write_solution(
+		        self.vehicle_routes, loader_routes, path, self.solution_format, verbose=False))
+		state = {
+		    'instance': self.instance_name,
+		    'stage': stage,
+		    'elapsed': time.time() - self.start_time,
+		    'vehicle_elapsed': self.vehicle_elapsed,
+		    'vehicle_stopped_early': self.vehicle_stopped_early,
+		    'vehicle_objective': self.vehicle_objective,
+		    'vehicle_cost': self.vehicle_cost,
+		    'vehicle_trips': self.vehicle_trips,
+		    'loader_objective': loader_objective,
+		    'solution': sol_path.name,
+		    'loader_routes': [{
+		        'order_ids': route.order_ids,
+		        'shift_length': route.shift_length
+		    } for route in loader_routes],
+		}
+
+		def write_state(path: Path):
+			with open(path, 'w') as f:
+				json.dump(state, f, indent=4)
+
+		_write_atomically(checkpoint_path(self.directory, self.instance_name), write_state)
+		self.last_write = time.time()
+		self.writes += 1
+		return True
+
+	def remove(self):
+		"""Removes the checkpoint once the final results are saved."""
+		checkpoint_path(self.directory, self.instance_name).unlink(missing_ok=True)
@@ -1,25 +1,23 @@
+import gzip
 import json
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 from pathlib import Path
-from typing import Any
+from typing import Any, TextIO
 
 from loader_schedule import LoaderRoute
 from pyvrp_model import VehicleRoute
 
+# Formats of solution files: indented JSON as read by the validator, or compact JSON Lines with one route per line,
+# optionally compressed with gzip
+SOLUTION_FORMATS = ('json', 'jsonl', 'jsonl.gz')
 
-def export_solution_to_json(vehicle_routes: Iterable[VehicleRoute], loader_schedules: Iterable[LoaderRoute],
-                            output_path: Path):
-	"""
-Export the solution to a JSON file.
 
-This function takes the found vehicle and loader routes and saves them in a specified JSON format.
+def solution_file_name(instance_name: str, solution_format: str = 'json') -> str:
+	return f'sol_{instance_name}.{solution_format}'
 
-Args:
-    instance (Instance): The problem instance containing all relevant data.
-    vehicle_routes (list[VehicleRoute]): List of vehicle routes where each route contains a sequence of clients
-    loader_schedules (list[LoaderAssignment]): List of loader assignments where each assignment contains a sequence
-    output_path (str): The file path where the JSON solution will be saved.
-"""
+
+def solution_to_dict(vehicle_routes: Iterable[VehicleRoute], loader_schedules: Iterable[LoaderRoute]) -> dict[str, Any]:
+	"""Converts a solution to the dictionary written by `export_solution_to_json`."""
 	vehicles: list[dict[str, Any]] = []
 	for idx, route in enumerate(vehicle_routes):
 		route_ids = [order_id for order_id, _ in route.clients]
@@ -35,8 +33,133 @@ Args:
 	for idx, schedule in enumerate(loader_schedules):
 		loaders.append({"id": idx + 1, "route": [assignment for assignment in schedule.order_ids]})
 
-	solution = {"vehicles": vehicles, "loaders": loaders}
+	return {"vehicles": vehicles, "loaders": loaders}
+
+
+def export_solution_to_json(vehicle_routes: Iterable[VehicleRoute], loader_schedules: Iterable[LoaderRoute],
+                            output_path: Path,
+                            verbose: bool = True):
+	"""
+Export the solution to a JSON file.
+
+This function takes the found vehicle and loader routes and saves them in a specified JSON format.
+
+Args:
+    instance (Instance): The problem instance containing all relevant data.
+    vehicle_routes (list[VehicleRoute]): List of vehicle routes where each route contains a sequence of clients
+    loader_schedules (list[LoaderAssignment]): List of loader assignments where each assignment contains a sequence
+    output_path (str): The file path where the JSON solution will be saved.
+    verbose (bool): Whether to print the path of the written file.
+"""
+	solution = solution_to_dict(vehicle_routes, loader_schedules)
 	with output_path.open('w') as f:
 		json.dump(solution, f, indent=4)
 
-	print(f"Solution written to {output_path}")
+	if verbose:
+		print(f"Solution written to {output_path}")
+
+
+def _open_text(path: Path, mode: str, compressed: bool) -> TextIO:
+	if compressed:
+		return gzip.open(path, mode + 't')  # type: ignore[return-value]
+	return open(path, mode)
+
+
+class SolutionWriter:
+	"""
+	Streams a solution to a compact JSON Lines file as its routes are produced, one route per line.
+
+	Every line holds an object with either a `vehicle` or a `loader` route. Routes keep the fields of `VehicleRoute`
+	and `LoaderRoute` with times as scaled integers, so reading the file with `read_solution_jsonl` gives the same
+	routes.
+
+	Args:
+		path (Path): The path of the file.
+		compressed (bool): Whether the file is compressed with gzip.
+	"""
+
+	def __init__(self, path: Path, compressed: bool = False):
+		self._file = _open_text(path, 'w', compressed)
+
+	def write_vehicle_route(self, route: VehicleRoute):
+		self._write({'vehicle': {'clients': route.clients, 'distance': route.distance, 'shift_length': route.shift_length}})
+
+	def write_loader_route(self, route: LoaderRoute):
+		self._write({'loader': {'order_ids': route.order_ids, 'shift_length': route.shift_length}})
+
+	def _write(self, record: dict[str, Any]):
+		self._file.write(json.dumps(record, separators=(',', ':')))
+		self._file.write('\n')
+
+	def close(self):
+		self._file.close()
+
+	def __enter__(self) -> 'SolutionWriter':
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+
+def export_solution_to_jsonl(vehicle_routes: Iterable[VehicleRoute],
+                             loader_schedules: Iterable[LoaderRoute],
+                             output_path: Path,
+                             compressed: bool = False,
+                             verbose: bool = True):
+	"""Writes a solution with `SolutionWriter`, consuming the routes one at a time."""
+	with SolutionWriter(output_path, compressed) as writer:
+		for route in vehicle_routes:
+			writer.write_vehicle_route(route)
+		for schedule in loader_schedules:
+			writer.write_loader_route(schedule)
+
+	if verbose:
+		print(f"Solution written to {output_path}")
+
+
+def iter_solution_jsonl(path: Path) -> Iterator[VehicleRoute | LoaderRoute]:
+	"""Reads the routes of a file written by `SolutionWriter` one at a time. Files ending with `.gz` are
+	decompressed."""
+	with _open_text(path, 'r', path.suffix == '.gz') as f:
+		for line in f:
+			record = json.loads(line)
+			if 'vehicle' in record:
+				route = record['vehicle']
+				yield VehicleRoute([(order_id, time) for order_id, time in route['clients']], route['distance'],
+				                   route['shift_length'])
+			else:
+				yield LoaderRoute(record['loader']['order_ids'], record['loader']['shift_length'])
+
+
+def read_solution_jsonl(path: Path) -> tuple[list[VehicleRoute], list[LoaderRoute]]:
+	"""Reads the vehicle and loader routes of a file written by `SolutionWriter`."""
+	vehicle_routes: list[VehicleRoute] = []
+	loader_routes: list[LoaderRoute] = []
+	for route in iter_solution_jsonl(path):
+		if isinstance(route, VehicleRoute):
+			vehicle_routes.append(route)
+		else:
+			loader_routes.append(route)
+	return vehicle_routes, loader_routes
+
+
+def write_solution(vehicle_routes: Iterable[VehicleRoute],
+                   loader_schedules: Iterable[LoaderRoute],
+                   output_path: Path,
+                   solution_format: str = 'json',
+                   verbose: bool = True):
+	"""Writes a solution file in one of `SOLUTION_FORMATS`."""
+	if solution_format == 'json':
+		export_solution_to_json(vehicle_routes, loader_schedules, output_path, verbose)
+	elif solution_format in ('jsonl', 'jsonl.gz'):
+		export_solution_to_jsonl(vehicle_routes, loader_schedules, output_path, solution_format == 'jsonl.gz', verbose)
+	else:
+		raise ValueError(f"Unknown solution format: {solution_format}")
+
+
+def read_solution(path: Path) -> dict[str, Any]:
+	"""Reads a solution file of any of `SOLUTION_FORMATS` into the dictionary written by `export_solution_to_json`."""
+	if path.suffix == '.json':
+		with open(path, 'r') as f:
+			return json.load(f)
+	return solution_to_dict(*read_solution_jsonl(path))
@@ -1,10 +1,16 @@
 import json
 import math
+import sys
+from array import array
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
 
+import numpy as np
 
-@dataclass
+
+@dataclass(slots=True)
 class Depot:
 	"""A structure representing the depot of the problem instance. Load time is multipled by 100 to avoid floating-point
     precision issues."""
@@ -13,7 +19,7 @@ class Depot:
 	load_time: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Order:
 	"""A structure representing an order in the problem instance. Times are multiplied by 100 to avoid floating-point
     precision issues."""
@@ -29,7 +35,7 @@ class Order:
 	optional: int  # 0 or 1
 
 
-@dataclass
+@dataclass(slots=True)
 class Weights:
 	"""A structure representing the weights used in the problem instance. Values are multipleid by appropriate factors
     to avoid floating-point precision issues."""
@@ -40,10 +46,95 @@ class Weights:
 	optional_order_penalty: int
 
 
+class LazyMatrix:
+	"""
+	A travel matrix of a sparse instance, computed from the coordinates when it is accessed.
+
+	Values are rounded like `build_matrices`, and the most recently used rows are cached as arrays of 64-bit integers,
+	so the matrix is indexed as `matrix[i][j]` like a dense one without ever being stored completely.
+
+	Args:
+		xs (np.ndarray): The x coordinates of the depot and the orders, indexed like the dense matrices.
+		ys (np.ndarray): The y coordinates of the depot and the orders.
+		speed (float | None): The speed converting distances to travel times, or None for the distance matrix.
+		cached_rows (int): The number of rows kept in the cache.
+	"""
+
+	def __init__(self, xs: np.ndarray, ys: np.ndarray, speed: float | None = None, cached_rows: int = 256):
+		self.xs = xs
+		self.ys = ys
+		self.speed = speed
+		self.cached_rows = cached_rows
+		self._rows: OrderedDict[int, array] = OrderedDict()
+
+	def __getstate__(self):
+		# The cache is not sent to worker processes
+		state = self.__dict__.copy()
+		state['_rows'] = OrderedDict()
+		return state
+
+	def __len__(self) -> int:
+		return len(self.xs)
+
+	def __getitem__(self, i: int) -> array:
+		row = self._rows.get(i)
+		if row is None:
+			row = array('q', self.block([i], slice(None))[0].tobytes())
+			self._rows[i] = row
+			if len(self._rows) > self.cached_rows:
+				self._rows.popitem(last=False)
+		else:
+			self._rows.move_to_end(i)
+		return row
+
+	def block(self, rows, cols) -> np.ndarray:
+		"""Computes the submatrix of the given rows and columns (index lists or slices) as an int64 array."""
+		dx = self.xs[rows][:, np.newaxis] - self.xs[cols][np.newaxis, :]
+		dy = self.ys[rows][:, np.newaxis] - self.ys[cols][np.newaxis, :]
+		distances = integer_round_array(np.sqrt(dx * dx + dy * dy))
+		if self.speed is None:
+			return distances
+		return integer_round_array(distances / self.speed / 100)
+
+	def pairs(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+		"""Computes the entries `matrix[rows[k]][cols[k]]` for index arrays of equal length as an int64 array."""
+		dx = self.xs[rows] - self.xs[cols]
+		dy = self.ys[rows] - self.ys[cols]
+		distances = integer_round_array(np.sqrt(dx * dx + dy * dy))
+		if self.speed is None:
+			return distances
+		return integer_round_array(distances / self.speed / 100)
+
+	def to_array(self, chunk_size: int = 256) -> np.ndarray:
+		"""Computes the dense matrix as an int64 array, in blocks of rows to limit temporary memory."""
+		size = len(self)
+		array = np.empty((size, size), dtype=np.int64)
+		for start in range(0, size, chunk_size):
+			array[start:start + chunk_size] = self.block(slice(start, start + chunk_size), slice(None))
+		return array
+
+	def row_max(self, chunk_size: int = 256) -> np.ndarray:
+		"""Computes the maximum of every row."""
+		size = len(self)
+		return np.concatenate([
+		    self.block(slice(start, start + chunk_size), slice(None)).max(axis=1)
+		    for start in range(0, size, chunk_size)
+		])
+
+	@property
+	def nbytes(self) -> int:
+		"""The memory used by the coordinates and the cached rows."""
+		return self.xs.nbytes + self.ys.nbytes + sum(sys.getsizeof(row) for row in self._rows.values())
+
+
+Matrix = list[list[int]] | np.ndarray | LazyMatrix
+
+
 @dataclass
 class Instance:
 	"""A structure representing the instance of the problem. Floating-point values are multiplied by 100 and rounded to
-    integers to avoid floating-point precision issues."""
+    integers to avoid floating-point precision issues. Matrices are either nested lists, contiguous NumPy arrays for
+    compact instances or `LazyMatrix` objects for sparse instances; all are indexed as `matrix[i][j]`."""
 	vehicle_capacity: int
 	vehicle_speed: float
 	loader_speed: float
@@ -52,13 +143,24 @@ class Instance:
 	depot: Depot
 	orders: list[Order]
 	weights: Weights
-	distances: list[list[int]]
-	vehicle_times: list[list[int]]
-	loader_times: list[list[int]]
+	distances: Matrix
+	vehicle_times: Matrix
+	loader_times: Matrix
+	# Sparse instances only: row `i - 1` holds the inner IDs of the nearest neighbours of the order with inner ID `i`
+	neighbours: np.ndarray | None = None
 
 	@classmethod
-	def from_json(cls, json_path: Path):
-		"""Load an instance from a JSON file."""
+	def from_json(cls, json_path: Path, compact: bool = False, neighbours: int | None = None):
+		"""
+		Load an instance from a JSON file.
+
+		Args:
+			json_path (Path): Path to the instance file.
+			compact (bool): If True, matrices are kept as contiguous NumPy arrays of the smallest sufficient integer
+				type instead of nested lists of Python integers.
+			neighbours (int | None): If given, the instance is sparse: matrices are computed lazily from the
+				coordinates and only this many nearest neighbours of every order are stored. Overrides `compact`.
+		"""
 		with open(json_path, 'r') as f:
 			data = json.load(f)
 
@@ -83,20 +185,22 @@ class Instance:
 		weights.optional_order_penalty = integer_round(weights.optional_order_penalty) * 100
 		weights.vehicle_salary = integer_round(weights.vehicle_salary) * 100
 		weights.loader_salary = integer_round(weights.loader_salary) * 100
-		distances: list[list[int]] = []
-		row = [0]
-		for order in orders:
-			row.append(integer_round(math.sqrt((depot.x - order.x)**2 + (depot.y - order.y)**2)))
-		distances.append(row)
-		for order1 in orders:
-			row = [integer_round(math.sqrt((depot.x - order1.x)**2 + (depot.y - order1.y)**2))]
-			row += [integer_round(math.sqrt((order1.x - order2.x)**2 + (order1.y - order2.y)**2)) for order2 in orders]
-			distances.append(row)
-		# Calculate vehicle_times and load_times
-		vehicle_times = [
-		    [integer_round(distance / data['vehicle_speed'] / 100) for distance in row] for row in distances
-		]
-		loader_times = [[integer_round(distance / data['loader_speed'] / 100) for distance in row] for row in distances]
+		matrices: tuple[Matrix, Matrix, Matrix]
+		nearest = None
+		if neighbours is not None:
+			xs, ys = coordinates(depot, orders)
+			matrices = (LazyMatrix(xs, ys), LazyMatrix(xs, ys, data['vehicle_speed']),
+			            LazyMatrix(xs, ys, data['loader_speed']))
+			nearest = build_neighbours(orders, weights, matrices[0], matrices[1], neighbours)
+		else:
+			distances, vehicle_times, loader_times = build_matrices(depot, orders, data['vehicle_speed'],
+			                                                        data['loader_speed'])
+			if compact:
+				largest = max(matrix.max(initial=0) for matrix in (distances, vehicle_times, loader_times))
+				dtype = np.int32 if largest <= np.iinfo(np.int32).max else np.int64
+				matrices = (distances.astype(dtype), vehicle_times.astype(dtype), loader_times.astype(dtype))
+			else:
+				matrices = (distances.tolist(), vehicle_times.tolist(), loader_times.tolist())
 
 		return cls(vehicle_capacity=data['vehicle_capacity'],
 		           vehicle_speed=data['vehicle_speed'],
@@ -106,10 +210,162 @@ class Instance:
 		           depot=depot,
 		           orders=orders,
 		           weights=weights,
-		           distances=distances,
-		           vehicle_times=vehicle_times,
-		           loader_times=loader_times)
+		           distances=matrices[0],
+		           vehicle_times=matrices[1],
+		           loader_times=matrices[2],
+		           neighbours=nearest)
+
+	@cached_property
+	def order_by_id(self) -> dict[int, Order]:
+		"""Index of orders by their external ID."""
+		return {order.id: order for order in self.orders}
+
+	@cached_property
+	def inner_id_by_id(self) -> dict[int, int]:
+		"""Index of internal IDs by external order ID."""
+		return {order.id: order.inner_id for order in self.orders}
+
+	@cached_property
+	def max_loader_times(self) -> list[int]:
+		"""The longest loader travel time from each location, used to bound the search for the next loader job."""
+		if isinstance(self.loader_times, LazyMatrix):
+			return self.loader_times.row_max().tolist()
+		return np.asarray(self.loader_times).max(axis=1).tolist()
+
+	def memory_usage(self) -> dict[str, int]:
+		"""Returns an estimate of the memory used by the instance data in bytes, split by component."""
+		usage = {
+		    'distances': matrix_nbytes(self.distances),
+		    'vehicle_times': matrix_nbytes(self.vehicle_times),
+		    'loader_times': matrix_nbytes(self.loader_times),
+		    'orders': sys.getsizeof(self.orders) + sum(
+		        sys.getsizeof(order) + sys.getsizeof(order.time_window) for order in self.orders),
+		}
+		if self.neighbours is not None:
+			usage['neighbours'] = self.neighbours.nbytes
+		usage['total'] = sum(usage.values())
+		return usage
 
 
 def integer_round(nums: float):
 	return int(math.floor(nums * 100 + 0.5))
+
+
+def matrix_nbytes(matrix: Matrix) -> int:
+	"""Estimates the memory used by a matrix, including boxed integers not shared through the small integer cache."""
+	if isinstance(matrix, (np.ndarray, LazyMatrix)):
+		return matrix.nbytes
+	size = sys.getsizeof(matrix)
+	for row in matrix:
+		size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row if not -5 <= value <= 256)
+	return size
+
+
+def integer_round_array(nums: np.ndarray) -> np.ndarray:
+	"""Vectorized version of `integer_round` producing an int64 array."""
+	return np.floor(nums * 100 + 0.5).astype(np.int64)
+
+
+def matrix_to_array(matrix: Matrix) -> np.ndarray:
+	"""Returns a matrix of any representation as a dense int64 array."""
+	if isinstance(matrix, LazyMatrix):
+		return matrix.to_array()
+	return np.array(matrix, dtype=np.int64)
+
+
+def coordinates(depot: Depot, orders: list[Order]) -> tuple[np.ndarray, np.ndarray]:
+	"""Returns the x and y coordinates of the depot and the orders as arrays indexed like the matrices."""
+	xs = np.array([depot.x] + [order.x for order in orders])
+	ys = np.array([depot.y] + [order.y for order in orders])
+	return xs, ys
+
+
+def build_matrices(depot: Depot, orders: list[Order], vehicle_speed: float, loader_speed: float):
+	"""
+	Builds the distance, vehicle time and loader time matrices in one vectorized pass.
+
+	Index 0 corresponds to the depot and index `i` to the order with `inner_id == i`. The rounding is identical to
+	applying `integer_round` to every cell.
+
+	Args:
+		depot (Depot): The depot of the instance.
+		orders (list[Order]): The orders of the instance, ordered by `inner_id`.
+		vehicle_speed (float): Speed of the vehicles.
+		loader_speed (float): Speed of the loaders.
+
+	Returns:
+		tuple: Distance, vehicle time and loader time matrices as int64 arrays of shape (n + 1, n + 1).
+	"""
+	xs, ys = coordinates(depot, orders)
+	dx = xs[:, np.newaxis] - xs[np.newaxis, :]
+	dy = ys[:, np.newaxis] - ys[np.newaxis, :]
+	distances = integer_round_array(np.sqrt(dx * dx + dy * dy))
+	# Same operation order as the scalar version to get bit-identical rounding
+	vehicle_times = integer_round_array(distances / vehicle_speed / 100)
+	loader_times = integer_round_array(distances / loader_speed / 100)
+	return distances, vehicle_times, loader_times
+
+
+def build_neighbours(orders: list[Order],
+                     weights: Weights,
+                     distances: LazyMatrix,
+                     vehicle_times: LazyMatrix,
+                     num_neighbours: int,
+                     weight_wait_time: float = 0.2,
+                     weight_time_warp: float = 1.0,
+                     chunk_size: int = 256) -> np.ndarray:
+	"""
+	Finds the nearest neighbours of every order for sparse instances.
+
+	Proximity is computed like the granular neighbourhood of `pyvrp.search.compute_neighbours` with its default
+	parameters: the fuel cost of the edge minus the prize of the neighbour, plus penalties for the minimum waiting time
+	and time warp of visiting the orders one after the other, taken symmetrically. Orders whose time windows do not fit
+	together are therefore never near. Proximities are computed in blocks of rows, so memory stays linear in the number
+	of orders.
+
+	Args:
+		orders (list[Order]): The orders, ordered by `inner_id`.
+		weights (Weights): The weights of the instance.
+		distances (LazyMatrix): The distance matrix.
+		vehicle_times (LazyMatrix): The vehicle travel time matrix.
+		num_neighbours (int): The number of neighbours per order.
+		weight_wait_time (float): The weight of the minimum waiting time.
+		weight_time_warp (float): The weight of the minimum time warp.
+		chunk_size (int): The number of orders processed at once.
+
+	Returns:
+		np.ndarray: An int32 array of shape (n, k) whose row `i - 1` holds the inner IDs of the neighbours of the order
+			with inner ID `i`, nearest first.
+	"""
+	num_orders = len(orders)
+	num_neighbours = min(num_neighbours, num_orders - 1)
+	early = np.array([order.time_window[0] for order in orders], dtype=float)
+	late = np.array([order.time_window[1] for order in orders], dtype=float)
+	service = np.array([order.vehicle_service_time for order in orders], dtype=float)
+	prize = np.array([weights.optional_order_penalty if order.optional else 0 for order in orders], dtype=float)
+	clients = slice(1, num_orders + 1)
+
+	nearest = np.empty((num_orders, num_neighbours), dtype=np.int32)
+	for start in range(0, num_orders, chunk_size):
+		rows = slice(start, min(start + chunk_size, num_orders))
+		matrix_rows = slice(rows.start + 1, rows.stop + 1)
+		edge_costs = (weights.fuel_cost * distances.block(matrix_rows, clients)).astype(float)
+		durations = vehicle_times.block(matrix_rows, clients)
+		# Row `i` of the block is the order visited first, in the transposed direction it is visited second
+		min_wait = early[np.newaxis, :] - durations - service[rows, np.newaxis] - late[rows, np.newaxis]
+		min_tw = early[rows, np.newaxis] + service[rows, np.newaxis] + durations - late[np.newaxis, :]
+		proximity = (edge_costs - prize[np.newaxis, :] + weight_wait_time * np.maximum(min_wait, 0) +
+		             weight_time_warp * np.maximum(min_tw, 0))
+		min_wait = early[rows, np.newaxis] - durations - service[np.newaxis, :] - late[np.newaxis, :]
+		min_tw = early[np.newaxis, :] + service[np.newaxis, :] + durations - late[rows, np.newaxis]
+		reverse = (edge_costs - prize[rows, np.newaxis] + weight_wait_time * np.maximum(min_wait, 0) +
+		           weight_time_warp * np.maximum(min_tw, 0))
+		np.minimum(proximity, reverse, out=proximity)
+		proximity[np.arange(rows.stop - rows.start), np.arange(rows.start, rows.stop)] = np.inf
+		# Only the orders up to the k-th smallest proximity are sorted, which keeps the stable order of a full sort
+		kth = np.partition(proximity, num_neighbours - 1, axis=1)[:, num_neighbours - 1]
+		for row, (values, bound) in enumerate(zip(proximity, kth)):
+			candidates = np.flatnonzero(values <= bound)
+			best = candidates[np.argsort(values[candidates], kind='stable')[:num_neighbours]]
+			nearest[rows.start + row] = best + 1
+	return nearest
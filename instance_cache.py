@@ -0,0 +1,99 @@
+import dataclasses
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import instance as instance_module
+from instance import Depot, Instance, Order, Weights
+
+# Increment when the cached layout changes. Changes of the preprocessing code are detected automatically.
+CACHE_VERSION = 1
+
+MATRIX_NAMES = ('distances', 'vehicle_times', 'loader_times')
+
+
+def preprocessing_fingerprint() -> str:
+	"""Returns a hash of the code that turns the JSON input into an `Instance`, so that changes of the rounding rules
+	invalidate existing cache entries."""
+	digest = hashlib.sha256(str(CACHE_VERSION).encode())
+	for obj in (instance_module.integer_round, instance_module.integer_round_array, instance_module.coordinates,
+	            instance_module.build_matrices, Instance.from_json):
+		digest.update(inspect.getsource(obj).encode())
+	return digest.hexdigest()
+
+
+def cache_key(json_path: Path) -> str:
+	"""Computes the cache key from the content of the instance file and the preprocessing code."""
+	digest = hashlib.sha256(preprocessing_fingerprint().encode())
+	with open(json_path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def save_instance(instance: Instance, entry_dir: Path):
+	"""
+	Stores a preprocessed instance in the given directory. The directory is written atomically: it is assembled under
+	a temporary name and renamed when complete, so concurrent readers never see a partial entry.
+	"""
+	entry_dir.parent.mkdir(parents=True, exist_ok=True)
+	tmp_dir = Path(tempfile.mkdtemp(prefix=entry_dir.name + '.', dir=entry_dir.parent))
+	try:
+		for name in MATRIX_NAMES:
+			np.save(tmp_dir / f'{name}.npy', np.asarray(getattr(instance, name)))
+		meta = {
+		    field.name: getattr(instance, field.name)
+		    for field in dataclasses.fields(instance)
+		    if field.name not in MATRIX_NAMES
+		}
+		meta['depot'] = dataclasses.asdict(instance.depot)
+		meta['orders'] = [dataclasses.asdict(order) for order in instance.orders]
+		meta['weights'] = dataclasses.asdict(instance.weights)
+		with open(tmp_dir / 'meta.json', 'w') as f:
+			json.dump(meta, f)
+		try:
+			os.rename(tmp_dir, entry_dir)
+		except OSError:
+			# Another process has stored the same entry in the meantime
+			if not entry_dir.exists():
+				raise
+	finally:
+		if tmp_dir.exists():
+			shutil.rmtree(tmp_dir)
+
+
+def load_cached_instance(entry_dir: Path) -> Instance:
+	"""Loads an instance from a cache entry. Matrices are memory-mapped read-only, so processes loading the same entry
+	share the pages."""
+	with open(entry_dir / 'meta.json', 'r') as f:
+		meta = json.load(f)
+	meta['depot'] = Depot(**meta['depot'])
+	meta['orders'] = [Order(**order) for order in meta['orders']]
+	meta['weights'] = Weights(**meta['weights'])
+	for name in MATRIX_NAMES:
+		meta[name] = np.load(entry_dir / f'{name}.npy', mmap_mode='r')
+	return Instance(**meta)
+
+
+def load_instance(json_path: Path, cache_dir: Path) -> Instance:
+	"""
+	Loads an instance through the on-disk cache. On a cache miss the instance is preprocessed with
+	`Instance.from_json` and stored before being returned from the cache.
+
+	Args:
+		json_path (Path): Path to the instance JSON file.
+		cache_dir (Path): Directory containing the cache entries.
+
+	Returns:
+		Instance: The compact instance with memory-mapped matrices.
+	"""
+	entry_dir = cache_dir / cache_key(json_path)
+	if not entry_dir.exists():
+		save_instance(Instance.from_json(json_path, compact=True), entry_dir)
+	return load_cached_instance(entry_dir)
@@ -0,0 +1,100 @@
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any
+
+
+def generate_instance(num_orders: int,
+                      seed: int = 43,
+                      num_clusters: int | None = None,
+                      optional_share: float = 0.1,
+                      loader_share: float = 0.7) -> dict[str, Any]:
+	"""
+	Generates a random instance in the JSON input format.
+
+	Orders are placed around cluster centres spread over the service area, time windows start during the working day,
+	and a share of orders is optional or needs loaders. Equal arguments always give the same instance.
+
+	Args:
+		num_orders (int): The number of orders.
+		seed (int): The seed of the random number generator.
+		num_clusters (int | None): The number of order clusters. Defaults to one cluster per 50 orders.
+		optional_share (float): The expected share of optional orders.
+		loader_share (float): The expected share of orders needing at least one loader.
+
+	Returns:
+		dict[str, Any]: The instance data, ready to be written with `json.dump`.
+	"""
+	rng = random.Random(seed)
+	area_size = 20_000
+	if num_clusters is None:
+		num_clusters = max(1, num_orders // 50)
+	centres = [(rng.randint(-area_size // 2, area_size // 2), rng.randint(-area_size // 2, area_size // 2))
+	           for _ in range(num_clusters)]
+
+	orders: list[dict[str, Any]] = []
+	for order_id in range(1, num_orders + 1):
+		centre_x, centre_y = rng.choice(centres)
+		x = min(max(round(rng.gauss(centre_x, area_size / 20)), -area_size), area_size)
+		y = min(max(round(rng.gauss(centre_y, area_size / 20)), -area_size), area_size)
+		window_start = rng.randrange(0, 420, 10)
+		window_length = rng.choice([30, 60, 90, 120, 180])
+		loader_cnt = rng.choice([1, 1, 1, 2, 2, 3]) if rng.random() < loader_share else 0
+		orders.append({
+		    "id": order_id,
+		    "x": x,
+		    "y": y,
+		    "volume": rng.randint(1, 6),
+		    "time_window": [window_start, window_start + window_length],
+		    "vehicle_service_time": rng.randint(5, 20),
+		    "loader_cnt": loader_cnt,
+		    "loader_service_time": rng.randint(5, 30) if loader_cnt else 0,
+		    "optional": int(rng.random() < optional_share),
+		})
+
+	return {
+	    "vehicle_capacity": 20,
+	    "vehicle_speed": 500.0,
+	    "loader_speed": 200.0,
+	    "vehicle_shift_size": 480,
+	    "loader_shift_size": 480,
+	    "depot": {
+	        "x": 0,
+	        "y": 0,
+	        "load_time": 15.0
+	    },
+	    "orders": orders,
+	    "weights": {
+	        "vehicle_salary": 300.0,
+	        "loader_salary": 150.0,
+	        "fuel_cost": 0.01,
+	        "loader_work": 0.5,
+	        "optional_order_penalty": 500.0
+	    },
+	}
+
+
+def write_instance(path: Path, num_orders: int, seed: int = 43):
+	"""Generates an instance and writes it to a JSON file."""
+	with open(path, 'w') as f:
+		json.dump(generate_instance(num_orders, seed), f)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Generate random instances.")
+	parser.add_argument("sizes", type=int, nargs='+', help="Numbers of orders of the generated instances.")
+	parser.add_argument("-s", "--seed", type=int, default=43, help="Seed of the random number generator.")
+	parser.add_argument("-o", "--output", type=str, default=".", help="Output directory (default: current directory).")
+	args = parser.parse_args()
+
+	output_dir = Path(args.output)
+	output_dir.mkdir(parents=True, exist_ok=True)
+	for size in args.sizes:
+		path = output_dir / f'generated_{size}_{args.seed}.json'
+		write_instance(path, size, args.seed)
+		print(f"Instance written to {path}")
+
+
+if __name__ == "__main__":
+	main()
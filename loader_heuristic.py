@@ -1,15 +1,232 @@
+import hashlib
+import math
+import random
 import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+from concurrent.futures import ProcessPoolExecutor
 
-import nevergrad as ng  # type: ignore
 import numpy as np
 
 from instance import Instance
-from loader_schedule import LoaderJob, build_loader_schedule, LoaderRoute, select_job_next
-from objective import calculate_loader_objective
+from loader_schedule import LoaderJob, LoaderScheduleEvaluator, LoaderTrace
+import telemetry
+from stopping import StagnationStop
 
+# Called with the job order and the objective of every new best solution found by an optimizer
+ImprovementCallback = Callable[[list[int], float], None]
 
-def optimize_loader_schedule_with_nevergrad(instance: Instance, jobs: list[LoaderJob],
-                                            time_limit: float) -> list[LoaderJob]:
+# Default number of permutations whose objective is kept by `PermutationCache`
+PERMUTATION_CACHE_SIZE = 100_000
+
+# Evaluator of a worker process, created once by `_init_worker` so that the instance is not sent with every candidate
+_worker_evaluator: LoaderScheduleEvaluator | None = None
+
+
+def import_nevergrad():
+	"""Returns the Nevergrad module. Importing it takes about two seconds, so it is imported on first use rather than
+	with this module. The CMA package, which Nevergrad only imports when NGOpt first asks for a candidate, is imported
+	as well, so that its half a second is not taken from the time limit of the first optimizer."""
+	import cma  # type: ignore # noqa: F401
+	import nevergrad  # type: ignore
+	return nevergrad
+
+
+class PermutationCache:
+	"""
+	A bounded LRU cache of the objective values of job permutations.
+
+	Many vectors proposed by Nevergrad decode to the same permutation. Permutations are keyed by a 128-bit BLAKE2 hash
+	of their array, so an entry takes constant memory regardless of the number of jobs.
+
+	Args:
+		max_size (int): The maximum number of cached permutations.
+	"""
+
+	def __init__(self, max_size: int = PERMUTATION_CACHE_SIZE):
+		self.max_size = max_size
+		self._values: OrderedDict[bytes, float] = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def key(permutation: np.ndarray) -> bytes:
+		return hashlib.blake2b(permutation.tobytes(), digest_size=16).digest()
+
+	def get(self, key: bytes) -> float | None:
+		"""Returns the cached value of a permutation, or None if it has not been evaluated."""
+		value = self._values.get(key)
+		if value is None:
+			self.misses += 1
+			return None
+		self._values.move_to_end(key)
+		self.hits += 1
+		return value
+
+	def put(self, key: bytes, value: float):
+		self._values[key] = value
+		if len(self._values) > self.max_size:
+			self._values.popitem(last=False)
+
+	def statistics(self) -> dict[str, Any]:
+		lookups = self.hits + self.misses
+		return {
+		    'hits': self.hits,
+		    'misses': self.misses,
+		    'hit_rate': self.hits / lookups if lookups else 0.0,
+		    'size': len(self._values),
+		}
+
+
+def _init_worker(instance: Instance, jobs: list[LoaderJob]):
+	global _worker_evaluator
+	_worker_evaluator = LoaderScheduleEvaluator(instance, jobs)
+
+
+def _evaluate_in_worker(x: np.ndarray[tuple[int], np.dtype[np.float64]]) -> float:
+	assert _worker_evaluator is not None
+	return _worker_evaluator.evaluate(np.argsort(x).tolist())
+
+
+def minimize_job_order(instance: Instance,
+                       jobs: list[LoaderJob],
+                       time_limit: float,
+                       num_workers: int = 1,
+                       patience: float | None = None,
+                       initial_order: list[int] | None = None,
+                       on_improvement: ImprovementCallback | None = None,
+                       optimizer_name: str = 'NGOpt',
+                       seed: int = 43,
+                       cancelled: Callable[[], bool] | None = None,
+                       cache: PermutationCache | None = None) -> tuple[list[int], int]:
+	"""
+	Searches for the order of loader jobs minimizing the loader objective using Nevergrad.
+
+	The order of jobs is determined by sorting the values of a real-valued vector, and Nevergrad optimizes this vector
+	within the given time limit. With several workers, candidates are asked in batches of `num_workers`, evaluated in a
+	process pool and told in the order they were asked, so the result is reproducible for a given worker count. With a
+	cache, permutations that were already evaluated are told their cached value without building a schedule.
+
+	Args:
+		instance (Instance): The problem instance containing relevant data for scheduling.
+		jobs (list[LoaderJob]): A list of loader jobs to be scheduled.
+		time_limit (float): The maximum time (in seconds) allowed for the optimization process.
+		num_workers (int): The number of processes evaluating candidates.
+		patience (float | None): If given, the search stops once the best value has not improved for this time, in
+			seconds.
+		initial_order (list[int] | None): A permutation of job indices suggested as the first candidate.
+		on_improvement (ImprovementCallback | None): Called with the permutation and value of every new best candidate.
+		optimizer_name (str): The name of the Nevergrad optimizer in its registry.
+		seed (int): The seed of the parametrization.
+		cancelled (Callable[[], bool] | None): If given, the search stops as soon as this returns True.
+		cache (PermutationCache | None): The cache of evaluated permutations.
+
+	Returns:
+		tuple:
+			- permutation (list[int]): The best found order as a permutation of job indices.
+			- evaluations (int): The number of candidates told to the optimizer, including cache hits.
+	"""
+	ng = import_nevergrad()
+	stop = StagnationStop(time_limit, patience, cancelled)
+
+	# Create the optimization variable - array of size equal to number of jobs
+	# Each element can be any real number, argsort will create the permutation
+	num_jobs = len(jobs)
+	parametrization = ng.p.Array(shape=(num_jobs,))
+	parametrization.random_state.seed(seed)
+
+	# Create the optimizer
+	budget = max(1000000, int(time_limit * 200))
+	optimizer = ng.optimizers.registry[optimizer_name](parametrization=parametrization,
+	                                                   budget=budget,
+	                                                   num_workers=num_workers)
+	if initial_order is not None:
+		# Vector whose argsort is the initial order
+		ranks = np.empty(num_jobs)
+		ranks[initial_order] = np.arange(num_jobs) - num_jobs / 2
+		optimizer.suggest(ranks)
+
+	best_value = math.inf
+	if num_workers == 1:
+		evaluator = LoaderScheduleEvaluator(instance, jobs)
+
+		def objective_function(x: np.ndarray[tuple[int], np.dtype[np.float64]]) -> float:
+			nonlocal best_value
+			# Use argsort to convert the array values into a permutation and evaluate the schedule built from it
+			ranks = np.argsort(x)
+			if cache is not None:
+				key = cache.key(ranks)
+				cached_value = cache.get(key)
+				if cached_value is not None:
+					return cached_value
+			permutation = ranks.tolist()
+			value = evaluator.evaluate(permutation)
+			if cache is not None:
+				cache.put(key, value)
+			if value < best_value:
+				best_value = value
+				if on_improvement is not None:
+					on_improvement(permutation, value)
+			return value
+
+		callback = ng.callbacks.EarlyStopping(lambda opt: stop(best_value))
+		optimizer.register_callback('ask', callback)
+		res = optimizer.minimize(objective_function, verbosity=0)
+	else:
+		with ProcessPoolExecutor(num_workers, initializer=_init_worker, initargs=(instance, jobs)) as executor:
+			while optimizer.num_ask < budget and not stop(best_value):
+				candidates = [optimizer.ask() for _ in range(num_workers)]
+				if cache is None:
+					values = list(executor.map(_evaluate_in_worker, [candidate.value for candidate in candidates]))
+				else:
+					values = _evaluate_batch_with_cache(executor, cache, candidates)
+				for candidate, value in zip(candidates, values):
+					optimizer.tell(candidate, value)
+					if value < best_value:
+						best_value = value
+						if on_improvement is not None:
+							on_improvement(np.argsort(candidate.value).tolist(), value)
+		res = optimizer.provide_recommendation()
+
+	telemetry.add_curve('nevergrad', stop.improvements)
+	if optimizer.num_tell == 0:
+		# The time limit ended before the first evaluation, so the recommendation is not a permutation
+		return list(range(num_jobs)), 0
+	return np.argsort(res.value).tolist(), optimizer.num_tell
+
+
+def _evaluate_batch_with_cache(executor: ProcessPoolExecutor, cache: PermutationCache,
+                               candidates: list[Any]) -> list[float]:
+	"""Evaluates a batch of candidates in the process pool, looking up their permutations in the cache first and
+	evaluating permutations repeated within the batch once."""
+	keys = [cache.key(np.argsort(candidate.value)) for candidate in candidates]
+	values: dict[bytes, float] = {}
+	missing: dict[bytes, np.ndarray] = {}
+	for key, candidate in zip(keys, candidates):
+		if key in values or key in missing:
+			cache.hits += 1
+			continue
+		cached_value = cache.get(key)
+		if cached_value is None:
+			missing[key] = candidate.value
+		else:
+			values[key] = cached_value
+	for key, value in zip(missing, executor.map(_evaluate_in_worker, missing.values())):
+		cache.put(key, value)
+		values[key] = value
+	return [values[key] for key in keys]
+
+
+def optimize_loader_schedule_with_nevergrad(instance: Instance,
+                                            jobs: list[LoaderJob],
+                                            time_limit: float,
+                                            num_workers: int = 1,
+                                            patience: float | None = None,
+                                            initial_order: list[int] | None = None,
+                                            on_improvement: ImprovementCallback | None = None,
+                                            cache_size: int = PERMUTATION_CACHE_SIZE,
+                                            cancelled: Callable[[], bool] | None = None) -> list[LoaderJob]:
 	"""
 	Optimizes the scheduling of loader jobs using the Nevergrad optimization library.
 
@@ -22,44 +239,136 @@ def optimize_loader_schedule_with_nevergrad(instance: Instance, jobs: list[Loade
 		instance (Instance): The problem instance containing relevant data for scheduling.
 		jobs (list[LoaderJob]): A list of loader jobs to be scheduled.
 		time_limit (float): The maximum time (in seconds) allowed for the optimization process.
+		num_workers (int): The number of processes evaluating candidates in parallel.
+		patience (float | None): If given, the optimization stops once the best value has not improved for this time,
+			in seconds.
+		initial_order (list[int] | None): A permutation of job indices suggested as the first candidate.
+		on_improvement (ImprovementCallback | None): Called with the permutation and value of every new best candidate.
+		cache_size (int): The number of evaluated permutations kept in the cache, or 0 to disable the cache.
+		cancelled (Callable[[], bool] | None): If given, the optimization stops as soon as this returns True.
 
 	Returns:
 		list[LoaderJob]: The list of jobs reordered according to the optimized schedule.
 	"""
+	print("Running Nevergrad for building loader schedule")
+	start_time = time.time()
+	cache = PermutationCache(cache_size) if cache_size > 0 else None
+	best_permutation, evaluations = minimize_job_order(instance,
+	                                                 jobs,
+	                                                 time_limit,
+	                                                 num_workers,
+	                                                 patience,
+	                                                 initial_order,
+	                                                 on_improvement,
+	                                                 cancelled=cancelled,
+	                                                 cache=cache)
+	elapsed = time.time() - start_time
+	print(f"Nevergrad evaluated {evaluations} candidates in {elapsed:.1f}s ({evaluations / elapsed:.1f}/s)")
+	telemetry.record('nevergrad_evaluations', evaluations)
+	telemetry.record('nevergrad_evaluations_per_second', evaluations / elapsed)
+	if cache is not None:
+		statistics = cache.statistics()
+		print(f"Permutation cache: {statistics['hits']} hits, {statistics['misses']} misses "
+		      f"({statistics['hit_rate']:.1%} of candidates were duplicates)")
+		telemetry.record('nevergrad_cache', statistics)
+	return [jobs[i] for i in best_permutation]
 
-	def objective_function(x: np.ndarray[tuple[int], np.dtype[np.float64]]) -> float:
-		# Use argsort to convert the array values into a permutation
-		permutation = np.argsort(x)
 
-		# Reorder jobs according to the permutation
-		ordered_jobs = [jobs[i] for i in permutation]  # type: ignore
+def _apply_move(order: list[int], rng: random.Random) -> tuple[list[int], int]:
+	"""
+	Applies a random swap, insertion or or-opt move to a job order.
 
-		# Build the loader schedule and calculate objective
-		loader_schedules: list[LoaderRoute] = build_loader_schedule(
-		    instance,
-		    ordered_jobs,  # type: ignore
-		    select_job_next)
-		objective_value = calculate_loader_objective(instance, loader_schedules)
+	Returns:
+		tuple:
+			- new_order (list[int]): The modified copy of the order.
+			- first_changed (int): The first position that differs from the original order.
+	"""
+	num_jobs = len(order)
+	i = rng.randrange(num_jobs)
+	j = rng.randrange(num_jobs - 1)
+	if j >= i:
+		j += 1
+	move = rng.randrange(3)
+	if move == 0:  # Swap
+		new_order = order.copy()
+		new_order[i], new_order[j] = new_order[j], new_order[i]
+		return new_order, min(i, j)
+	# Insertion moves a single job, or-opt moves a segment of two or three jobs
+	length = 1 if move == 1 else min(rng.randint(2, 3), num_jobs - i)
+	segment = order[i:i + length]
+	rest = order[:i] + order[i + length:]
+	j = min(j, len(rest))
+	new_order = rest[:j] + segment + rest[j:]
+	return new_order, min(i, j)
 
-		return objective_value
 
-	# Create the optimization variable - array of size equal to number of jobs
-	# Each element can be any real number, argsort will create the permutation
-	num_jobs = len(jobs)
-	parametrization = ng.p.Array(shape=(num_jobs,))
-	parametrization.random_state.seed(43)
+def optimize_loader_schedule_with_local_search(instance: Instance,
+                                               jobs: list[LoaderJob],
+                                               time_limit: float,
+                                               history_length: int = 50,
+                                               seed: int = 43,
+                                               patience: float | None = None,
+                                               on_improvement: ImprovementCallback | None = None,
+                                               cancelled: Callable[[], bool] | None = None) -> list[LoaderJob]:
+	"""
+	Optimizes the order of loader jobs with late acceptance hill climbing over job permutations.
 
-	# Create the optimizer
-	budget = max(1000000, int(time_limit * 200))
-	optimizer = ng.optimizers.NGOpt(parametrization=parametrization, budget=budget)
+	Starting from the given order, the search applies random swap, insertion and or-opt moves. A move is accepted if it
+	is not worse than the current solution or than the solution `history_length` iterations ago. Orders are evaluated
+	incrementally: loaders built only from jobs in front of the first changed position are reused from the current
+	solution, and only the remaining loaders are simulated again.
+
+	Args:
+		instance (Instance): The problem instance containing relevant data for scheduling.
+		jobs (list[LoaderJob]): A list of loader jobs to be scheduled.
+		time_limit (float): The maximum time (in seconds) allowed for the optimization process.
+		history_length (int): The length of the late acceptance history.
+		seed (int): The seed of the random number generator.
+		patience (float | None): If given, the search stops once the best value has not improved for this time, in
+			seconds.
+		on_improvement (ImprovementCallback | None): Called with the order and cost of every new best solution.
+		cancelled (Callable[[], bool] | None): If given, the search stops as soon as this returns True.
+
+	Returns:
+		list[LoaderJob]: The list of jobs reordered according to the optimized schedule.
+	"""
 	start_time = time.time()
-	callback = ng.callbacks.EarlyStopping(lambda opt: time.time() - start_time > time_limit)
-	optimizer.register_callback('ask', callback)
+	stop = StagnationStop(time_limit, patience, cancelled)
+	if len(jobs) < 2:
+		return list(jobs)
+	print("Running local search for building loader schedule")
+	rng = random.Random(seed)
+	evaluator = LoaderScheduleEvaluator(instance, jobs)
 
-	# Optimize
-	print("Running Nevergrad for building loader schedule")
-	res = optimizer.minimize(objective_function, verbosity=0)
+	order = list(range(len(jobs)))
+	loaders: list[LoaderTrace] = evaluator.simulate(order, [])
+	cost = sum(loader.cost for loader in loaders)
+	best_order, best_cost = order, cost
+	history = [cost] * history_length
 
-	# Convert the best parameters to permutation and return ordered jobs
-	best_permutation = np.argsort(res.value)
-	return [jobs[i] for i in best_permutation]
+	iteration = 0
+	while iteration % 16 != 0 or not stop(best_cost):
+		new_order, first_changed = _apply_move(order, rng)
+		kept = 0
+		while kept < len(loaders) and loaders[kept].last_position < first_changed:
+			kept += 1
+		new_loaders = evaluator.simulate(new_order, loaders[:kept])
+		new_cost = sum(loader.cost for loader in new_loaders)
+
+		slot = iteration % history_length
+		if new_cost <= cost or new_cost <= history[slot]:
+			order, loaders, cost = new_order, new_loaders, new_cost
+			if cost < best_cost:
+				best_order, best_cost = order, cost
+				if on_improvement is not None:
+					on_improvement(best_order, best_cost)
+		if cost < history[slot]:
+			history[slot] = cost
+		iteration += 1
+
+	elapsed = time.time() - start_time
+	print(f"Local search evaluated {iteration} moves in {elapsed:.1f}s ({iteration / elapsed:.1f}/s)")
+	telemetry.record('local_search_moves', iteration)
+	telemetry.record('local_search_moves_per_second', iteration / elapsed)
+	telemetry.add_curve('local_search', stop.improvements)
+	return [jobs[i] for i in best_order]
@@ -0,0 +1,241 @@
+import numpy as np
+
+from instance import Instance, LazyMatrix
+from loader_schedule import LoaderJob, LoaderRoute
+
+# Default number of successors kept per job, preferring the shortest waits. Larger values bring the number of loaders
+# closer to the minimum at the cost of a larger matching problem.
+MAX_SUCCESSORS = 64
+
+
+def successor_candidates(instance: Instance,
+                         jobs: list[LoaderJob],
+                         max_successors: int | None = MAX_SUCCESSORS,
+                         chunk_size: int = 256) -> list[list[int]]:
+	"""
+	Lists for every job the jobs a loader can serve directly after it.
+
+	A loader starts a job at its earliest time and must arrive at the next job before its earliest time, so job `j`
+	can follow job `i` if `i` finishes and the loader travels to `j` by the earliest time of `j`, and `j` finishes
+	within one shift of the start of `i`. Jobs are compared by earliest time and then by position, so the successors
+	form a directed acyclic graph even for jobs without service time.
+
+	Args:
+		instance (Instance): The problem instance.
+		jobs (list[LoaderJob]): The loader jobs.
+		max_successors (int | None): If given, only this many successors with the shortest waits are kept per job.
+		chunk_size (int): The number of jobs whose travel times are computed at once.
+
+	Returns:
+		list[list[int]]: The positions of the successors of every job, ordered by waiting time and then by position.
+	"""
+	num_jobs = len(jobs)
+	earliest = np.array([job.earliest_time for job in jobs], dtype=np.int64)
+	ready = earliest + np.array([job.loader_service_time for job in jobs], dtype=np.int64)
+	inner_ids = np.array([job.order.inner_id for job in jobs], dtype=np.int64)
+	rank = np.empty(num_jobs, dtype=np.int64)
+	rank[np.lexsort((np.arange(num_jobs), earliest))] = np.arange(num_jobs)
+	loader_times = instance.loader_times
+	dense_times = None if isinstance(loader_times, LazyMatrix) else np.asarray(loader_times)
+
+	successors: list[list[int]] = []
+	for start in range(0, num_jobs, chunk_size):
+		rows = np.arange(start, min(start + chunk_size, num_jobs))
+		if dense_times is None:
+			assert isinstance(loader_times, LazyMatrix)
+			travel = loader_times.block(inner_ids[rows], inner_ids)
+		else:
+			travel = dense_times[np.ix_(inner_ids[rows], inner_ids)]
+		wait = earliest[np.newaxis, :] - ready[rows, np.newaxis] - travel
+		feasible = (wait >= 0) & (rank[np.newaxis, :] > rank[rows, np.newaxis])
+		feasible &= ready[np.newaxis, :] - earliest[rows, np.newaxis] <= instance.loader_shift_size
+		wait = np.where(feasible, wait, np.iinfo(np.int64).max)
+		for row, job_wait, job_feasible in zip(rows, wait, feasible):
+			candidates = np.flatnonzero(job_feasible)
+			if max_successors is not None and len(candidates) > max_successors:
+				candidates = np.argpartition(job_wait, max_successors - 1)[:max_successors]
+			# Stable sort of the positions by waiting time
+			candidates = np.sort(candidates)
+			successors.append(candidates[np.argsort(job_wait[candidates], kind='stable')].tolist())
+	return successors
+
+
+def _maximum_matching(adjacency: list[list[int]], num_right: int) -> list[int]:
+	"""
+	Computes a maximum matching of a bipartite graph with the Hopcroft-Karp algorithm.
+
+	The matching is initialized greedily with the first free neighbour of every left vertex, so that the order of the
+	adjacency lists is preferred, and then augmented along shortest augmenting paths.
+
+	Args:
+		adjacency (list[list[int]]): The right neighbours of every left vertex.
+		num_right (int): The number of right vertices.
+
+	Returns:
+		list[int]: The right vertex matched to every left vertex, or -1.
+	"""
+	num_left = len(adjacency)
+	match_left = [-1] * num_left
+	match_right = [-1] * num_right
+	for u, neighbours in enumerate(adjacency):
+		for v in neighbours:
+			if match_right[v] == -1:
+				match_left[u] = v
+				match_right[v] = u
+				break
+
+	while True:
+		# Layer the left vertices by their distance from a free left vertex along alternating paths
+		dist = [-1] * num_left
+		queue = [u for u in range(num_left) if match_left[u] == -1]
+		for u in queue:
+			dist[u] = 0
+		found = False
+		head = 0
+		while head < len(queue):
+			u = queue[head]
+			head += 1
+			for v in adjacency[u]:
+				w = match_right[v]
+				if w == -1:
+					found = True
+				elif dist[w] == -1:
+					dist[w] = dist[u] + 1
+					queue.append(w)
+		if not found:
+			return match_left
+
+		# Augment along vertex-disjoint shortest paths with an iterative depth-first search
+		pointer = [0] * num_left
+		for root in range(num_left):
+			if match_left[root] != -1:
+				continue
+			stack = [root]
+			while stack:
+				u = stack[-1]
+				neighbours = adjacency[u]
+				while pointer[u] < len(neighbours):
+					w = match_right[neighbours[pointer[u]]]
+					if w == -1 or dist[w] == dist[u] + 1:
+						break
+					pointer[u] += 1
+				if pointer[u] == len(neighbours):
+					dist[u] = -1  # No augmenting path through this vertex in this phase
+					stack.pop()
+					if stack:
+						pointer[stack[-1]] += 1
+					continue
+				w = match_right[neighbours[pointer[u]]]
+				if w != -1:
+					stack.append(w)
+					continue
+				# Every vertex on the stack takes the right vertex its pointer points to
+				for x in stack:
+					v = adjacency[x][pointer[x]]
+					match_left[x] = v
+					match_right[v] = x
+					dist[x] = -1
+				stack.clear()
+
+
+def minimum_path_cover(jobs: list[LoaderJob], successors: list[list[int]]) -> list[list[int]]:
+	"""
+	Covers the loader slots of all jobs with the minimum number of chains in the successor graph.
+
+	Every job is expanded into one copy per loader it needs. A maximum matching between the copies, where a copy is
+	matched to the copy that follows it in its chain, leaves `number of copies - matching size` chains, which is the
+	minimum. Successors with shorter waits are preferred where the matching leaves a choice.
+
+	Args:
+		jobs (list[LoaderJob]): The loader jobs.
+		successors (list[list[int]]): The successors of every job from `successor_candidates`.
+
+	Returns:
+		list[list[int]]: The chains as lists of job positions.
+	"""
+	copy_job: list[int] = []
+	first_copy: list[int] = []
+	for position, job in enumerate(jobs):
+		first_copy.append(len(copy_job))
+		copy_job.extend([position] * job.loader_cnt)
+	adjacency = [[first_copy[j] + k for j in successors[position] for k in range(jobs[j].loader_cnt)]
+	             for position in copy_job]
+	match = _maximum_matching(adjacency, len(copy_job))
+
+	has_predecessor = [False] * len(copy_job)
+	for v in match:
+		if v != -1:
+			has_predecessor[v] = True
+	chains = []
+	for start in range(len(copy_job)):
+		if has_predecessor[start]:
+			continue
+		chain = []
+		copy = start
+		while copy != -1:
+			chain.append(copy_job[copy])
+			copy = match[copy]
+		chains.append(chain)
+	return chains
+
+
+def build_path_cover_schedule(instance: Instance,
+                              jobs: list[LoaderJob],
+                              max_successors: int | None = MAX_SUCCESSORS) -> list[LoaderRoute]:
+	"""
+	Builds a loader schedule from a minimum path cover of the loader jobs.
+
+	Chains of the path cover are split where the return to the first job of the loader would exceed the shift size,
+	so the schedule may use more loaders than the path cover.
+
+	Args:
+		instance (Instance): The problem instance.
+		jobs (list[LoaderJob]): The loader jobs.
+		max_successors (int | None): The number of successors considered per job, see `successor_candidates`.
+
+	Returns:
+		list[LoaderRoute]: The loader routes, with shift lengths computed as by `build_loader_schedule`.
+	"""
+	chains = minimum_path_cover(jobs, successor_candidates(instance, jobs, max_successors))
+	chains.sort(key=lambda chain: (jobs[chain[0]].earliest_time, chain[0]))
+	loader_times = instance.loader_times
+	shift_size = instance.loader_shift_size
+
+	def return_time(first: LoaderJob, job: LoaderJob) -> int:
+		return job.earliest_time + job.loader_service_time + loader_times[first.order_id][job.order_id]
+
+	pieces: list[list[LoaderJob]] = []
+	for chain in chains:
+		route_jobs = [jobs[chain[0]]]
+		for position in chain[1:]:
+			job = jobs[position]
+			if return_time(route_jobs[0], job) - route_jobs[0].earliest_time > shift_size:
+				pieces.append(route_jobs)
+				route_jobs = []
+			route_jobs.append(job)
+		pieces.append(route_jobs)
+
+	# Append pieces to loaders that can reach their first job in time and return within the shift
+	loaders: list[list[LoaderJob]] = []
+	for piece in sorted(pieces, key=lambda piece: piece[0].earliest_time):
+		head = piece[0]
+		best_loader, best_wait = None, None
+		for loader in loaders:
+			last = loader[-1]
+			wait = head.earliest_time - last.earliest_time - last.loader_service_time - loader_times[
+			    last.order_id][head.order_id]
+			if wait < 0 or (best_wait is not None and wait >= best_wait):
+				continue
+			if all(return_time(loader[0], job) - loader[0].earliest_time <= shift_size for job in piece):
+				best_loader, best_wait = loader, wait
+		if best_loader is None:
+			loaders.append(piece)
+		else:
+			best_loader.extend(piece)
+
+	routes: list[LoaderRoute] = []
+	for loader in loaders:
+		first, last = loader[0], loader[-1]
+		finish_time = last.earliest_time + last.loader_service_time + loader_times[last.order.id][first.order_id]
+		routes.append(LoaderRoute([job.order_id for job in loader], int(finish_time - first.earliest_time)))
+	return routes
@@ -0,0 +1,126 @@
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any
+
+import loader_heuristic
+import loader_path_cover
+import loader_schedule
+import objective
+from instance import Instance
+from loader_schedule import LoaderRoute
+from pyvrp_model import VehicleRoute
+
+
+@dataclass
+class Candidate:
+	"""A vehicle incumbent of the pipeline with the best loader schedule found for it."""
+	vehicle_routes: list[VehicleRoute] = field(repr=False)
+	vehicle_objective: int
+	vehicle_cost: float  # PyVRP cost of the incumbent, see `pyvrp_model.solution_cost`
+	loader_objective: int  # Loader objective of the validator, as selected by `main.evaluate_schedules`
+	loader_schedule: list[LoaderRoute] = field(repr=False)
+	submitted: float  # Wall-clock time at which the incumbent was found
+	runtime: float  # Time spent on the loader schedules, in seconds
+
+	@property
+	def total_objective(self) -> int:
+		return self.vehicle_objective + self.loader_objective
+
+	def statistics(self) -> dict[str, Any]:
+		return {
+		    'submitted': self.submitted,
+		    'runtime': self.runtime,
+		    'vehicle_objective': self.vehicle_objective,
+		    'vehicle_cost': self.vehicle_cost,
+		    'loader_objective': self.loader_objective,
+		}
+
+
+# Instance of a worker process, set by `_init_worker`
+_worker_instance: Instance | None = None
+
+
+def _init_worker(instance: Instance):
+	global _worker_instance
+	_worker_instance = instance
+
+
+def _schedule_loaders(vehicle_routes: list[VehicleRoute], vehicle_cost: float, time_limit: float,
+                      path_cover_successors: int, submitted: float) -> Candidate:
+	"""Builds the greedy and path cover schedules for the jobs of the vehicle routes and improves the due time schedule
+	with the local search for the rest of the time limit."""
+	assert _worker_instance is not None
+	instance = _worker_instance
+	start_time = time.time()
+	jobs = loader_schedule.collect_loader_jobs(instance, (route.clients for route in vehicle_routes))
+	jobs.sort(key=lambda job: job.earliest_time)
+	schedules = [
+	    loader_schedule.build_loader_schedule(instance, jobs),
+	    loader_schedule.build_loader_schedule(instance, jobs, loader_schedule.select_job_next),
+	]
+	if path_cover_successors > 0:
+		schedules.append(loader_path_cover.build_path_cover_schedule(instance, jobs, path_cover_successors))
+	local_search_jobs = loader_heuristic.optimize_loader_schedule_with_local_search(
+	    instance, jobs, time_limit - (time.time() - start_time))
+	schedules.append(loader_schedule.build_loader_schedule(instance, local_search_jobs, loader_schedule.select_job_next))
+
+	loader_objective, schedule = min(
+	    ((objective.calculate_loader_objective_wrong(instance, schedule), schedule) for schedule in schedules),
+	    key=lambda evaluation: evaluation[0])
+	return Candidate(vehicle_routes, objective.calculate_vehicle_objective(instance, vehicle_routes), vehicle_cost,
+	                 loader_objective, schedule, submitted, time.time() - start_time)
+
+
+class LoaderPipeline:
+	"""
+	Schedules loaders for the vehicle incumbents of a running vehicle search on worker processes.
+
+	Every incumbent passed to `submit` gets the greedy schedules, the path cover schedule and the local search for at
+	most `time_limit` seconds, ending by the deadline. Nevergrad is left to the final loader stage, as importing it
+	takes most of a short time limit. An incumbent still waiting for a worker is dropped when a newer one arrives.
+
+	Args:
+		instance (Instance): The problem instance.
+		num_workers (int): The number of incumbents scheduled at the same time.
+		time_limit (float): The time limit of the loader schedules of one incumbent, in seconds.
+		deadline (float): The wall-clock time by which all loader schedules end.
+		path_cover_successors (int): The successors per job of the path cover schedule, or 0 to skip it.
+	"""
+
+	def __init__(self,
+	             instance: Instance,
+	             num_workers: int,
+	             time_limit: float,
+	             deadline: float,
+	             path_cover_successors: int = loader_path_cover.MAX_SUCCESSORS):
+		self.time_limit = time_limit
+		self.deadline = deadline
+		self.path_cover_successors = path_cover_successors
+		self.dropped = 0
+		self._futures: list[Future[Candidate]] = []
+		self._executor = ProcessPoolExecutor(num_workers, initializer=_init_worker, initargs=(instance,))
+
+	def submit(self, vehicle_routes: list[VehicleRoute], vehicle_cost: float):
+		"""Starts scheduling loaders for a vehicle incumbent, dropping incumbents that have not started yet."""
+		now = time.time()
+		time_limit = min(self.time_limit, self.deadline - now)
+		if time_limit <= 0:
+			return
+		for future in self._futures:
+			if future.cancel():
+				self.dropped += 1
+		self._futures = [future for future in self._futures if not future.cancelled()]
+		self._futures.append(
+		    self._executor.submit(_schedule_loaders, vehicle_routes, vehicle_cost, time_limit, self.path_cover_successors,
+		                          now))
+
+	def finish(self) -> list[Candidate]:
+		"""Waits for the incumbents being scheduled and returns the candidates of all scheduled incumbents."""
+		for future in self._futures:
+			if future.cancel():
+				self.dropped += 1
+		futures = [future for future in self._futures if not future.cancelled()]
+		wait(futures)
+		self._executor.shutdown()
+		return [future.result() for future in futures]
@@ -0,0 +1,240 @@
+import math
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any
+
+import loader_heuristic
+import loader_schedule
+import objective
+from instance import Instance
+from loader_heuristic import PERMUTATION_CACHE_SIZE
+from loader_schedule import LoaderJob, LoaderRoute
+
+# A running strategy is cancelled once it has used this fraction of its time budget if its best value is worse than
+# the best value of the portfolio by more than DOMINANCE_MARGIN
+MIN_RUNTIME_SHARE = 0.25
+DOMINANCE_MARGIN = 0.05
+
+# Interval at which the progress of running strategies is checked, in seconds
+POLL_INTERVAL = 0.1
+
+SELECTORS = {
+    'min_wait': loader_schedule.select_job_min_wait,
+    'next': loader_schedule.select_job_next,
+}
+
+
+@dataclass
+class Strategy:
+	"""A loader scheduling strategy of the portfolio."""
+	name: str
+	kind: str  # 'greedy', 'nevergrad' or 'local_search'
+	selector: str = 'next'  # Job selector building the schedule from the job order, a key of SELECTORS
+	ordering: str = 'earliest'  # Initial job order, 'earliest' by earliest time or 'warm_start' from a previous run
+	optimizer: str = 'NGOpt'  # Nevergrad optimizer of 'nevergrad' strategies
+	seed: int = 43
+
+
+@dataclass
+class StrategyResult:
+	"""The best job order found by a strategy and its statistics."""
+	name: str
+	value: float  # Loader objective of the best order, as minimized by the optimizers
+	runtime: float  # In seconds
+	budget: float  # Time limit given to the strategy, in seconds
+	improvements: int
+	cancelled: bool
+	cache_hits: int  # Candidates of Nevergrad strategies whose permutation was already evaluated
+	order: list[int] = field(repr=False)  # Permutation of the jobs
+
+	def statistics(self) -> dict[str, Any]:
+		return {
+		    'name': self.name,
+		    'value': self.value,
+		    'runtime': self.runtime,
+		    'budget': self.budget,
+		    'improvements': self.improvements,
+		    'cancelled': self.cancelled,
+		    'cache_hits': self.cache_hits,
+		}
+
+
+def default_strategies(warm_start: bool = False) -> list[Strategy]:
+	"""Returns the default portfolio: both greedy selectors, three Nevergrad optimizers and the local search with two
+	seeds. With a warm start, the optimizers start from the previous order and its greedy schedule is added."""
+	ordering = 'warm_start' if warm_start else 'earliest'
+	strategies = [
+	    Strategy('min_wait', 'greedy', selector='min_wait'),
+	    Strategy('due_time', 'greedy'),
+	    Strategy('nevergrad_ngopt', 'nevergrad', ordering=ordering),
+	    Strategy('nevergrad_two_points_de', 'nevergrad', ordering=ordering, optimizer='TwoPointsDE'),
+	    Strategy('nevergrad_one_plus_one', 'nevergrad', ordering=ordering, optimizer='OnePlusOne'),
+	    Strategy('local_search_43', 'local_search', ordering=ordering, seed=43),
+	    Strategy('local_search_44', 'local_search', ordering=ordering, seed=44),
+	]
+	if warm_start:
+		strategies.insert(0, Strategy('warm_start', 'greedy', ordering='warm_start'))
+	return strategies
+
+
+# State of a worker process, set by `_init_worker`: the instance, the jobs, the best value of every strategy and the
+# cancellation flags of the strategies
+_worker_state: tuple[Instance, list[LoaderJob], Any, Any] | None = None
+
+
+def _init_worker(instance: Instance, jobs: list[LoaderJob], best_values: Any, cancel_flags: Any):
+	global _worker_state
+	_worker_state = (instance, jobs, best_values, cancel_flags)
+	# Import Nevergrad before any strategy starts its clock, so that the import does not take time from the first
+	# Nevergrad strategy of each worker when workers do not inherit the module from the parent
+	loader_heuristic.import_nevergrad()
+
+
+def _run_strategy(index: int, strategy: Strategy, time_limit: float, patience: float | None,
+                  initial_order: list[int] | None, cache_size: int) -> StrategyResult:
+	"""Runs a strategy in a worker process, publishing its best value in the shared array of best values."""
+	assert _worker_state is not None
+	instance, jobs, best_values, cancel_flags = _worker_state
+	start_time = time.time()
+	improvements = 0
+	cache = loader_heuristic.PermutationCache(cache_size) if cache_size > 0 else None
+
+	def on_improvement(permutation: list[int], value: float):
+		nonlocal improvements
+		improvements += 1
+		best_values[index] = value
+
+	def cancelled() -> bool:
+		return cancel_flags[index] != 0
+
+	if strategy.ordering == 'warm_start' and initial_order is not None:
+		start_order = initial_order
+	else:
+		start_order = list(range(len(jobs)))
+
+	if strategy.kind == 'greedy':
+		order = start_order
+		schedule = loader_schedule.build_loader_schedule(instance, [jobs[i] for i in order],
+		                                                 SELECTORS[strategy.selector])
+		on_improvement(order, objective.calculate_loader_objective(instance, schedule))
+	elif strategy.kind == 'nevergrad':
+		order, _ = loader_heuristic.minimize_job_order(instance,
+		                                               jobs,
+		                                               time_limit,
+		                                               patience=patience,
+		                                               initial_order=start_order,
+		                                               on_improvement=on_improvement,
+		                                               optimizer_name=strategy.optimizer,
+		                                               seed=strategy.seed,
+		                                               cancelled=cancelled,
+		                                               cache=cache)
+	elif strategy.kind == 'local_search':
+		start_jobs = [jobs[i] for i in start_order]
+		optimized_jobs = loader_heuristic.optimize_loader_schedule_with_local_search(instance,
+		                                                                             start_jobs,
+		                                                                             time_limit,
+		                                                                             seed=strategy.seed,
+		                                                                             patience=patience,
+		                                                                             on_improvement=on_improvement,
+		                                                                             cancelled=cancelled)
+		# The local search reorders the starting jobs, map them back to their positions in `jobs`
+		positions = {id(job): i for i, job in enumerate(jobs)}
+		order = [positions[id(job)] for job in optimized_jobs]
+	else:
+		raise ValueError(f"Unknown strategy kind: {strategy.kind}")
+
+	value = best_values[index]
+	if improvements == 0:
+		# The strategy stopped before its first evaluation
+		value = loader_schedule.LoaderScheduleEvaluator(instance, jobs).evaluate(order)
+		best_values[index] = value
+	return StrategyResult(strategy.name, value, time.time() - start_time, time_limit, improvements, cancelled(),
+	                      cache.hits if cache is not None else 0, order)
+
+
+def race(instance: Instance,
+         jobs: list[LoaderJob],
+         strategies: list[Strategy],
+         time_limit: float,
+         num_workers: int = 1,
+         patience: float | None = None,
+         initial_order: list[int] | None = None,
+         cache_size: int = PERMUTATION_CACHE_SIZE,
+         target: float | None = None) -> tuple[list[list[LoaderRoute]], list[StrategyResult]]:
+	"""
+	Races a portfolio of loader scheduling strategies over a pool of processes under a shared deadline.
+
+	Greedy strategies are started first. Every other strategy gets an equal share of the time left when it is started,
+	given the number of strategies that still have to run on the `num_workers` processes, so time not used by a
+	strategy goes to the ones started after it. Strategies publish their best value in shared memory, and a running
+	strategy that has used `MIN_RUNTIME_SHARE` of its budget and is worse than the best strategy by more than
+	`DOMINANCE_MARGIN` is cancelled.
+
+	Args:
+		instance (Instance): The problem instance containing relevant data for scheduling.
+		jobs (list[LoaderJob]): A list of loader jobs to be scheduled, sorted by earliest time.
+		strategies (list[Strategy]): The strategies of the portfolio.
+		time_limit (float): The shared time limit of all strategies, in seconds.
+		num_workers (int): The number of strategies run at the same time.
+		patience (float | None): If given, a strategy stops once its best value has not improved for this time, in
+			seconds.
+		initial_order (list[int] | None): The permutation of jobs used by strategies with 'warm_start' ordering.
+		cache_size (int): The size of the permutation cache of each Nevergrad strategy, or 0 to disable it.
+		target (float | None): If given, all strategies are cancelled and no more are started once one of them finds
+			an order with a value of at most this value.
+
+	Returns:
+		tuple:
+			- schedules (list[list[LoaderRoute]]): The schedule of every strategy that was started, in the order of
+			  `strategies`.
+			- results (list[StrategyResult]): The result and statistics of these strategies.
+	"""
+	deadline = time.time() + time_limit
+	num_strategies = len(strategies)
+	best_values = multiprocessing.RawArray('d', [math.inf] * num_strategies)
+	cancel_flags = multiprocessing.RawArray('b', num_strategies)
+	results: list[StrategyResult | None] = [None] * num_strategies
+	pending = sorted(range(num_strategies), key=lambda i: strategies[i].kind != 'greedy')
+	running: dict[Future[StrategyResult], tuple[int, float, float]] = {}  # Index, start time and budget
+
+	with ProcessPoolExecutor(num_workers,
+	                         initializer=_init_worker,
+	                         initargs=(instance, jobs, best_values, cancel_flags)) as executor:
+		while pending or running:
+			while pending and len(running) < num_workers:
+				index = pending.pop(0)
+				num_rounds = math.ceil((sum(strategies[i].kind != 'greedy' for i in pending) + 1) / num_workers)
+				now = time.time()
+				budget = max(deadline - now, 0.0) / num_rounds
+				future = executor.submit(_run_strategy, index, strategies[index], budget, patience, initial_order,
+				                         cache_size)
+				running[future] = (index, now, budget)
+
+			done, _ = wait(running, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+			for future in done:
+				index, _, _ = running.pop(future)
+				results[index] = future.result()
+
+			best_value = min(best_values)
+			if target is not None and best_value <= target:
+				cancel_flags[:] = [1] * num_strategies
+				pending.clear()
+			now = time.time()
+			for index, start_time, budget in running.values():
+				dominated = best_values[index] > best_value * (1 + DOMINANCE_MARGIN)
+				if dominated and now - start_time >= MIN_RUNTIME_SHARE * budget:
+					cancel_flags[index] = 1
+
+	schedules = []
+	for strategy, result in zip(strategies, results):
+		if result is None:
+			continue  # Not started because the target was reached
+		schedules.append(
+		    loader_schedule.build_loader_schedule(instance, [jobs[i] for i in result.order],
+		                                          SELECTORS[strategy.selector]))
+		status = "cancelled" if result.cancelled else "finished"
+		print(f"Strategy {result.name}: {result.value / 10_000:.2f} in {result.runtime:.1f}s of {result.budget:.1f}s, "
+		      f"{result.improvements} improvements, {result.cache_hits} cache hits, {status}")
+	return schedules, [result for result in results if result is not None]
@@ -1,9 +1,11 @@
-import copy
-from collections.abc import Callable, Iterable
+import bisect
+from collections.abc import Callable, Iterable, Iterator
 from dataclasses import dataclass
 import math
 
-from instance import Instance, Order
+import numpy as np
+
+from instance import Instance, LazyMatrix, Matrix, Order
 
 
 @dataclass
@@ -33,11 +35,12 @@ def collect_loader_jobs(instance: Instance, vehicle_routes: Iterable[Iterable[tu
 		that require loader services.
 	"""
 	jobs: list[LoaderJob] = []
+	order_by_id = instance.order_by_id
 	for route in vehicle_routes:
 		for order_id, arrival_time in route:
 			if order_id == 0:
 				continue  # depot
-			order = next(o for o in instance.orders if o.id == order_id)
+			order = order_by_id[order_id]
 			if order.loader_cnt > 0:
 				jobs.append(LoaderJob(order.inner_id, arrival_time, order.loader_service_time, order.loader_cnt, order))
 	return jobs
@@ -50,15 +53,82 @@ class LoaderRoute:
 	shift_length: int
 
 
-def select_job_min_wait(instance: Instance, job_pool: list[LoaderJob], finish_time: int, prev_order: Order,
+class JobPool:
+	"""
+	The loader jobs not yet fully assigned, indexed by earliest time.
+
+	Jobs are identified by their position in the list passed to the constructor, and ties between equally good jobs
+	are broken by this position, as when the pool was a list. Removed jobs are skipped through path-compressed pointers
+	to the next remaining job, both in the original order and in the order of earliest times, so taking a job costs
+	amortized near-constant time and listing the jobs in a time window costs a binary search plus one step per
+	remaining job in the window.
+
+	Args:
+		jobs (list[LoaderJob]): The loader jobs. They are not modified.
+	"""
+
+	def __init__(self, jobs: list[LoaderJob]):
+		self.jobs = jobs
+		num_jobs = len(jobs)
+		self.size = num_jobs
+		self.remaining = [job.loader_cnt for job in jobs]
+		self.by_time = sorted(range(num_jobs), key=lambda position: jobs[position].earliest_time)
+		self.times = [int(jobs[position].earliest_time) for position in self.by_time]
+		self.rank = [0] * num_jobs
+		for rank, position in enumerate(self.by_time):
+			self.rank[position] = rank
+		# Index `num_jobs` is the end marker of both pointer lists
+		self._next_in_order = list(range(num_jobs + 1))
+		self._next_in_time = list(range(num_jobs + 1))
+
+	def __len__(self) -> int:
+		return self.size
+
+	@staticmethod
+	def _find(pointers: list[int], index: int) -> int:
+		root = index
+		while pointers[root] != root:
+			root = pointers[root]
+		while pointers[index] != root:
+			pointers[index], index = root, pointers[index]
+		return root
+
+	def first(self) -> int:
+		"""Returns the position of the first remaining job in the original order."""
+		return self._find(self._next_in_order, 0)
+
+	def take(self, position: int):
+		"""Assigns one loader to the job at the given position and removes the job once it needs no more loaders."""
+		self.remaining[position] -= 1
+		if self.remaining[position] == 0:
+			self._next_in_order[position] = position + 1
+			rank = self.rank[position]
+			self._next_in_time[rank] = rank + 1
+			self.size -= 1
+
+	def window(self, earliest_from: int, earliest_to: int) -> Iterator[int]:
+		"""Yields the positions of the remaining jobs with an earliest time within the given bounds, ordered by earliest
+		time and then by position."""
+		times = self.times
+		end = len(times)
+		rank = self._find(self._next_in_time, bisect.bisect_left(times, earliest_from))
+		while rank < end and times[rank] <= earliest_to:
+			yield self.by_time[rank]
+			rank = self._find(self._next_in_time, rank + 1)
+
+
+def select_job_min_wait(instance: Instance, job_pool: JobPool, finish_time: int, prev_order: Order,
                         first_order_id: int, begin_time: int):
 	"""
 	Selects the job from the job pool that minimizes the waiting time for the loader,
 	while adhering to constraints such as arrival time and shift size.
 
+	Only jobs with an earliest time between `finish_time` and the end of the shift can be reached in time, and the
+	scan stops once a job would wait longer than the best one even after the longest trip from `prev_order`.
+
 	Args:
 		instance (Instance): The problem instance containing loader times and shift size.
-		job_pool (list[LoaderJob]): A list of loader jobs to choose from.
+		job_pool (JobPool): The loader jobs to choose from.
 		finish_time (int): The time at which the previous job finishes.
 		prev_order (Order): The previous order completed by the loader.
 		first_order_id (int): The ID of the first order in the sequence.
@@ -66,7 +136,7 @@ def select_job_min_wait(instance: Instance, job_pool: list[LoaderJob], finish_ti
 
 	Returns:
 		tuple:
-			- best_job_idx (int or None): The index of the job in the job pool that minimizes waiting time,
+			- best_job_idx (int or None): The position of the job in the job pool that minimizes waiting time,
 			  or None if no valid job is found.
 			- best_arrival_time (int or None): The arrival time for the selected job,
 			  or None if no valid job is found.
@@ -74,34 +144,41 @@ def select_job_min_wait(instance: Instance, job_pool: list[LoaderJob], finish_ti
 	best_job_idx = None
 	min_wait = math.inf
 	best_arrival_time = None
-	for job_idx, candidate_job in enumerate(job_pool):
+	max_travel_time = instance.max_loader_times[prev_order.inner_id]
+	# Travel times are symmetric, so return trips are read from the row of the first order
+	return_row = instance.loader_times[first_order_id]
+	for job_idx in job_pool.window(finish_time, begin_time + instance.loader_shift_size):
+		candidate_job = job_pool.jobs[job_idx]
+		if candidate_job.earliest_time - finish_time - max_travel_time > min_wait:
+			break  # Jobs further in the window start even later
+
 		# Calculate travel time and arrival
 		travel_time = instance.loader_times[prev_order.inner_id][candidate_job.order.inner_id]
 		arrival_time = finish_time + travel_time
 		candidate_start = max(arrival_time, candidate_job.earliest_time)
 		candidate_finish = candidate_start + candidate_job.loader_service_time
-		return_time = candidate_finish + instance.loader_times[candidate_job.order.inner_id][first_order_id]
+		return_time = candidate_finish + return_row[candidate_job.order.inner_id]
 
 		# Check constraints
 		if arrival_time > candidate_job.earliest_time or return_time - begin_time > instance.loader_shift_size:
 			continue
 
 		wait_time = candidate_job.earliest_time - arrival_time
-		if wait_time < min_wait:
+		if wait_time < min_wait or (wait_time == min_wait and job_idx < best_job_idx):
 			min_wait = wait_time
 			best_job_idx = job_idx
 			best_arrival_time = arrival_time
 	return best_job_idx, best_arrival_time
 
 
-def select_job_next(instance: Instance, job_pool: list[LoaderJob], finish_time: int, prev_order: Order,
-                    first_order_id: int, begin_time: int):
+def select_job_next(instance: Instance, job_pool: JobPool, finish_time: int, prev_order: Order, first_order_id: int,
+                    begin_time: int):
 	"""
 	Selects the next job for a loader based from the ordered job pool.
 
 	Args:
 		instance (Instance): The problem instance containing loader times and shift size.
-		job_pool (list[LoaderJob]): A list of loader jobs available for selection.
+		job_pool (JobPool): The loader jobs available for selection.
 		finish_time (int): The finish time of the previous job.
 		prev_order (Order): The previous order completed by the loader.
 		first_order_id (int): The ID of the first order in the sequence.
@@ -109,28 +186,38 @@ def select_job_next(instance: Instance, job_pool: list[LoaderJob], finish_time:
 
 	Returns:
 		tuple:
-			- job_idx (int or None): The index of the selected job in the job pool, or None if no job is selected.
+			- job_idx (int or None): The position of the first feasible job in the job pool, or None if no job is
+			  selected.
 			- arrival_time (int or None): The arrival time at the selected job, or None if no job is selected.
 	"""
-	for job_idx, candidate_job in enumerate(job_pool):
+	best_job_idx = None
+	best_arrival_time = None
+	# Travel times are symmetric, so return trips are read from the row of the first order
+	return_row = instance.loader_times[first_order_id]
+	for job_idx in job_pool.window(finish_time, begin_time + instance.loader_shift_size):
+		if best_job_idx is not None and job_idx > best_job_idx:
+			continue
+		candidate_job = job_pool.jobs[job_idx]
+
 		# Calculate travel time and arrival
 		travel_time = instance.loader_times[prev_order.inner_id][candidate_job.order.inner_id]
 		arrival_time = finish_time + travel_time
 		candidate_start = max(arrival_time, candidate_job.earliest_time)
 		candidate_finish = candidate_start + candidate_job.loader_service_time
-		return_time = candidate_finish + instance.loader_times[candidate_job.order.inner_id][first_order_id]
+		return_time = candidate_finish + return_row[candidate_job.order.inner_id]
 
 		# Check constraints
 		if arrival_time > candidate_job.earliest_time or return_time - begin_time > instance.loader_shift_size:
 			continue
 
-		return job_idx, arrival_time
-	return None, None
+		best_job_idx = job_idx
+		best_arrival_time = arrival_time
+	return best_job_idx, best_arrival_time
 
 
 def build_loader_schedule(instance: Instance,
                           jobs: list[LoaderJob],
-                          job_selector: Callable[[Instance, list[LoaderJob], int, Order, int, int],
+                          job_selector: Callable[[Instance, JobPool, int, Order, int, int],
                                                  tuple[int | None, int | None]] = select_job_min_wait):
 	"""
 	Greedily constructs a schedule for loaders based on the given order of jobs and next job selection function.
@@ -138,13 +225,13 @@ def build_loader_schedule(instance: Instance,
 	Args:
 		instance (Instance): The problem instance containing configuration and constraints.
 		jobs (list[LoaderJob]): A list of loader jobs to be scheduled.
-		job_selector (Callable[[Instance, list[LoaderJob], int, Order, int, int], tuple[int | None, int | None]]):
+		job_selector (Callable[[Instance, JobPool, int, Order, int, int], tuple[int | None, int | None]]):
 			A function to select the next job for the loader. Defaults to `select_job_min_wait`.
 
 	Returns:
 		list[LoaderRoute]: A list of LoaderRoute objects representing the routes and schedules for the loaders.
 	"""
-	job_pool = [copy.copy(job) for job in jobs]
+	job_pool = JobPool(jobs)
 	routes: list[LoaderRoute] = []
 
 	while job_pool:
@@ -152,7 +239,8 @@ def build_loader_schedule(instance: Instance,
 		finish_time = 0
 
 		# Pick the next available job
-		current_job = job_pool[0]
+		position = job_pool.first()
+		current_job = jobs[position]
 
 		current_time = current_job.earliest_time
 		first_order_id = current_job.order_id
@@ -160,9 +248,7 @@ def build_loader_schedule(instance: Instance,
 
 		while job_pool:
 			# Assign current job to loader
-			current_job.loader_cnt -= 1
-			if current_job.loader_cnt == 0:
-				job_pool.remove(current_job)
+			job_pool.take(position)
 
 			start_time = max(current_time, current_job.earliest_time)
 			finish_time = start_time + current_job.loader_service_time
@@ -178,11 +264,209 @@ def build_loader_schedule(instance: Instance,
 
 			# Move to the next job
 			assert best_arrival_time is not None  # This should never be None if best_job_idx is not None
-			current_job = job_pool[best_job_idx]
+			position = best_job_idx
+			current_job = jobs[position]
 			current_time = best_arrival_time
 
 		if loader_schedule:
 			finish_time = finish_time + instance.loader_times[current_job.order.id][first_order_id]
-			routes.append(LoaderRoute(loader_schedule, finish_time - begin_time))
+			routes.append(LoaderRoute(loader_schedule, int(finish_time - begin_time)))
 
 	return routes
+
+
+@dataclass
+class LoaderTrace:
+	"""A loader recorded by `LoaderScheduleEvaluator.simulate`."""
+	jobs: list[int]  # Indices of the assigned jobs
+	last_position: int  # Largest position of an assigned job in the evaluated order
+	cost: int
+
+
+class LoaderScheduleEvaluator:
+	"""
+	Computes the loader objective of `build_loader_schedule` with `select_job_next` for different orders of the same
+	jobs, without building the routes.
+
+	All job data is copied into preallocated integer lists indexed by the position of the job in the original list, and
+	the job pool is kept as a doubly linked list in these arrays, so an evaluation neither copies jobs nor allocates
+	route objects.
+
+	Args:
+		instance (Instance): The problem instance.
+		jobs (list[LoaderJob]): The loader jobs. Orders passed to `evaluate` are permutations of their indices.
+	"""
+
+	def __init__(self, instance: Instance, jobs: list[LoaderJob]):
+		self.instance = instance
+		self.jobs = jobs
+		num_jobs = len(jobs)
+		self.earliest = [int(job.earliest_time) for job in jobs]
+		self.ready = [int(job.earliest_time + job.loader_service_time) for job in jobs]
+		self.service = [int(job.loader_service_time) for job in jobs]
+		self.count = [job.loader_cnt for job in jobs]
+		self.return_rows = [job.order.id for job in jobs]
+		inner_ids = [job.order.inner_id for job in jobs]
+		self.inner_ids = inner_ids
+		self.travel: Matrix
+		self.travel_back: Matrix
+		if isinstance(instance.loader_times, LazyMatrix):
+			# Travel times between the jobs are computed on demand as well; they are symmetric
+			loader_times = instance.loader_times
+			self.travel = LazyMatrix(loader_times.xs[inner_ids], loader_times.ys[inner_ids], loader_times.speed)
+			self.travel_back = self.travel
+		else:
+			travel = np.asarray(instance.loader_times)[np.ix_(inner_ids, inner_ids)]
+			self.travel = travel.tolist()
+			self.travel_back = travel.T.tolist()
+		self.loader_times = instance.loader_times
+		self.shift_size = instance.loader_shift_size
+		self.loader_work = instance.weights.loader_work
+		self.loader_salary = instance.weights.loader_salary
+
+		# Preallocated working memory. Index `num_jobs` is the sentinel of the linked list.
+		self._remaining = [0] * num_jobs
+		self._next = [0] * (num_jobs + 1)
+		self._prev = [0] * (num_jobs + 1)
+		self._positions = [0] * num_jobs
+
+	def evaluate(self, order: Iterable[int]) -> int:
+		"""
+		Evaluates a job order.
+
+		Args:
+			order (Iterable[int]): A permutation of job indices.
+
+		Returns:
+			int: The value of `calculate_loader_objective` for the schedule built from the reordered jobs.
+		"""
+		earliest = self.earliest
+		ready = self.ready
+		service = self.service
+		travel = self.travel
+		travel_back = self.travel_back
+		remaining = self._remaining
+		nxt = self._next
+		prv = self._prev
+		shift_size = self.shift_size
+
+		remaining[:] = self.count
+		sentinel = len(remaining)
+		last = sentinel
+		for job in order:
+			nxt[last] = job
+			prv[job] = last
+			last = job
+		nxt[last] = sentinel
+		prv[sentinel] = last
+
+		total = 0
+		while nxt[sentinel] != sentinel:
+			current = nxt[sentinel]
+			first = current
+			begin_time = earliest[current]
+			back = travel_back[first]
+			latest_ready = begin_time + shift_size
+
+			while True:
+				remaining[current] -= 1
+				if remaining[current] == 0:
+					nxt[prv[current]] = nxt[current]
+					prv[nxt[current]] = prv[current]
+
+				# A job is only selected when the loader arrives before its earliest time, so it starts at that time
+				finish_time = ready[current]
+				row = travel[current]
+				candidate = nxt[sentinel]
+				while candidate != sentinel:
+					if finish_time + row[candidate] <= earliest[candidate] and ready[candidate] + back[
+					    candidate] <= latest_ready:
+						break
+					candidate = nxt[candidate]
+				if candidate == sentinel:
+					break
+				current = candidate
+
+			finish_time += self.loader_times[self.return_rows[current]][self.inner_ids[first]]
+			total += int(finish_time - begin_time) * self.loader_work + self.loader_salary
+		return total
+
+	def simulate(self, order: list[int], kept_loaders: list[LoaderTrace]) -> list[LoaderTrace]:
+		"""
+		Builds the schedule for a job order like `evaluate`, but records every loader so that a later evaluation of a
+		similar order can skip the loaders it leaves unchanged.
+
+		A loader only depends on the jobs in front of the last job it picked, so if two orders agree on all positions
+		up to the largest position used by the first `k` loaders, these loaders are identical. They are passed as
+		`kept_loaders` and only replayed to remove their jobs from the pool.
+
+		Args:
+			order (list[int]): A permutation of job indices.
+			kept_loaders (list[LoaderTrace]): Loaders from a previous simulation that are unchanged by the new order.
+
+		Returns:
+			list[LoaderTrace]: The loaders of the schedule, starting with `kept_loaders`.
+		"""
+		earliest = self.earliest
+		ready = self.ready
+		travel = self.travel
+		travel_back = self.travel_back
+		remaining = self._remaining
+		nxt = self._next
+		prv = self._prev
+		shift_size = self.shift_size
+		positions = self._positions
+
+		remaining[:] = self.count
+		sentinel = len(remaining)
+		last = sentinel
+		for position, job in enumerate(order):
+			positions[job] = position
+			nxt[last] = job
+			prv[job] = last
+			last = job
+		nxt[last] = sentinel
+		prv[sentinel] = last
+
+		for loader in kept_loaders:
+			for job in loader.jobs:
+				remaining[job] -= 1
+				if remaining[job] == 0:
+					nxt[prv[job]] = nxt[job]
+					prv[nxt[job]] = prv[job]
+
+		loaders = list(kept_loaders)
+		while nxt[sentinel] != sentinel:
+			current = nxt[sentinel]
+			first = current
+			begin_time = earliest[current]
+			back = travel_back[first]
+			latest_ready = begin_time + shift_size
+			assigned: list[int] = []
+			last_position = 0
+
+			while True:
+				assigned.append(current)
+				if positions[current] > last_position:
+					last_position = positions[current]
+				remaining[current] -= 1
+				if remaining[current] == 0:
+					nxt[prv[current]] = nxt[current]
+					prv[nxt[current]] = prv[current]
+
+				finish_time = ready[current]
+				row = travel[current]
+				candidate = nxt[sentinel]
+				while candidate != sentinel:
+					if finish_time + row[candidate] <= earliest[candidate] and ready[candidate] + back[
+					    candidate] <= latest_ready:
+						break
+					candidate = nxt[candidate]
+				if candidate == sentinel:
+					break
+				current = candidate
+
+			finish_time += self.loader_times[self.return_rows[current]][self.inner_ids[first]]
+			cost = int(finish_time - begin_time) * self.loader_work + self.loader_salary
+			loaders.append(LoaderTrace(assigned, last_position, cost))
+		return loaders
@@ -0,0 +1,180 @@
+import math
+
+import numpy as np
+
+import loader_path_cover
+from instance import Instance, LazyMatrix, Matrix
+from loader_schedule import LoaderJob
+
+# Largest number of loader jobs for which the minimum number of loaders is computed exactly with a path cover over all
+# successors. The successor graph grows quadratically, so larger job sets only use the bound from overlapping jobs.
+EXACT_LOADER_COUNT_JOBS = 1000
+
+
+def gap(value: float, bound: float) -> float:
+	"""Returns the relative gap `(value - bound) / value` between an objective value and its lower bound."""
+	if value <= 0:
+		return 0.0
+	return max(value - bound, 0) / value
+
+
+def target(bound: float, relative_gap: float) -> float:
+	"""Returns the largest objective value whose gap to the lower bound is at most `relative_gap`."""
+	return bound / (1 - relative_gap) if relative_gap < 1 else math.inf
+
+
+def _min_incoming(matrix: Matrix, rows: np.ndarray, cols: np.ndarray, chunk_size: int = 256) -> np.ndarray:
+	"""
+	Returns for every column of the submatrix `matrix[rows][cols]` its minimum over the rows whose index differs from
+	the index of the column.
+
+	Args:
+		matrix (Matrix): A square matrix.
+		rows (np.ndarray): The row indices.
+		cols (np.ndarray): The column indices.
+		chunk_size (int): The number of rows computed at once.
+
+	Returns:
+		np.ndarray: The minimum of every column, or the largest int64 value if all rows are excluded.
+	"""
+	dense = None if isinstance(matrix, LazyMatrix) else np.asarray(matrix)
+	minimum = np.full(len(cols), np.iinfo(np.int64).max, dtype=np.int64)
+	for start in range(0, len(rows), chunk_size):
+		chunk = rows[start:start + chunk_size]
+		if dense is None:
+			assert isinstance(matrix, LazyMatrix)
+			block = matrix.block(chunk, cols)
+		else:
+			block = dense[np.ix_(chunk, cols)].astype(np.int64)
+		block[chunk[:, np.newaxis] == cols[np.newaxis, :]] = np.iinfo(np.int64).max
+		np.minimum(minimum, block.min(axis=0), out=minimum)
+	return minimum
+
+
+def vehicle_lower_bound(instance: Instance) -> int:
+	"""
+	Computes a lower bound on `calculate_vehicle_objective` for the instance.
+
+	The distance of the mandatory orders is bounded in two ways. Every visited order is entered by exactly one edge, so
+	it is at least the sum of their shortest incoming distances plus the shortest return to the depot for each of the
+	trips needed to carry their volume. A trip is also at least twice as long as the distance from the depot to its
+	farthest order, so it is at least the radial bound, the sum of twice the depot distance of every order weighted by
+	its share of the vehicle capacity. An optional order adds at least the smaller of its shortest incoming fuel cost
+	and its penalty. The working time of all vehicles, bounded in the same two ways plus service and loading times,
+	bounds the number of vehicles. An allowance for the rounding of the matrices is subtracted from the radial bounds.
+
+	Args:
+		instance (Instance): The problem instance.
+
+	Returns:
+		int: The lower bound, on the scale of `calculate_vehicle_objective` and of the PyVRP cost.
+	"""
+	orders = instance.orders
+	if not orders:
+		return 0
+	nodes = np.arange(len(orders) + 1)
+	clients = nodes[1:]
+	mandatory = np.array([not order.optional for order in orders], dtype=bool)
+	min_distance = _min_incoming(instance.distances, nodes, clients)
+	min_time = _min_incoming(instance.vehicle_times, nodes, clients)
+	min_return_distance = int(_min_incoming(instance.distances, clients, np.array([0]))[0])
+	min_return_time = int(_min_incoming(instance.vehicle_times, clients, np.array([0]))[0])
+	weights = instance.weights
+
+	bound = 0
+	for order, distance in zip(orders, min_distance.tolist()):
+		if order.optional:
+			bound += min(distance * weights.fuel_cost, weights.optional_order_penalty)
+	if mandatory.any():
+		mandatory_clients = clients[mandatory]
+		volumes = np.array([order.volume for order in orders if not order.optional], dtype=np.float64)
+		trips = max(math.ceil(volumes.sum() / instance.vehicle_capacity), 1)
+		rounding = len(mandatory_clients) + 2 * trips
+		shares = 2 * volumes / instance.vehicle_capacity
+		depot_distance = _min_incoming(instance.distances, np.array([0]), mandatory_clients)
+		depot_time = _min_incoming(instance.vehicle_times, np.array([0]), mandatory_clients)
+		distance = max(
+		    int(min_distance[mandatory].sum()) + trips * min_return_distance,
+		    math.floor(float(shares @ depot_distance)) - rounding,
+		)
+		travel_time = max(
+		    int(min_time[mandatory].sum()) + trips * min_return_time,
+		    math.floor(float(shares @ depot_time)) - rounding,
+		)
+		work_time = sum(order.vehicle_service_time for order in orders if not order.optional)
+		work_time += travel_time + trips * instance.depot.load_time
+		vehicles = max(math.ceil(work_time / (instance.vehicle_shift_size + instance.depot.load_time)), 1)
+		bound += distance * weights.fuel_cost + vehicles * weights.vehicle_salary
+	return int(bound)
+
+
+def min_loaders(instance: Instance, jobs: list[LoaderJob]) -> int:
+	"""
+	Computes a lower bound on the number of loaders needed for the jobs.
+
+	A loader that serves a job cannot serve another job starting before the first one is finished and the loader has
+	travelled to the nearest other job, so the jobs whose extended intervals overlap at any time need distinct loaders.
+	For up to `EXACT_LOADER_COUNT_JOBS` jobs, the minimum path cover over all successors gives the exact minimum
+	without the shift size, which is never smaller.
+
+	Args:
+		instance (Instance): The problem instance.
+		jobs (list[LoaderJob]): The loader jobs.
+
+	Returns:
+		int: The lower bound on the number of loaders.
+	"""
+	if not jobs:
+		return 0
+	if len(jobs) <= EXACT_LOADER_COUNT_JOBS:
+		successors = loader_path_cover.successor_candidates(instance, jobs, None)
+		return len(loader_path_cover.minimum_path_cover(jobs, successors))
+
+	inner_ids = np.array([job.order.inner_id for job in jobs])
+	min_travel = _min_incoming(instance.loader_times, inner_ids, inner_ids)  # Symmetric, so also the shortest exit
+	events = []
+	for job, travel in zip(jobs, min_travel.tolist()):
+		end = job.earliest_time + job.loader_service_time + (travel if len(jobs) > 1 else 0)
+		events.append((job.earliest_time, job.loader_cnt))
+		events.append((end, -job.loader_cnt))
+	# Intervals are half-open, so ends are processed before starts at the same time
+	events.sort()
+	busy = best = 0
+	for _, change in events:
+		busy += change
+		best = max(best, busy)
+	return best
+
+
+def loader_lower_bound(instance: Instance, jobs: list[LoaderJob]) -> int:
+	"""
+	Computes a lower bound on `calculate_loader_objective` for the jobs.
+
+	Shifts contain the service time of every loader slot. Every slot except the first one of a loader is reached from
+	another job, which takes at least the shortest travel time to the job. With `L` loaders, at most the `L` largest
+	of these travel times are saved, so the bound is minimized over the number of loaders from `min_loaders` up.
+
+	Args:
+		instance (Instance): The problem instance.
+		jobs (list[LoaderJob]): The loader jobs.
+
+	Returns:
+		int: The lower bound, on the scale of `calculate_loader_objective`.
+	"""
+	if not jobs:
+		return 0
+	weights = instance.weights
+	inner_ids = np.array([job.order.inner_id for job in jobs])
+	if len(jobs) > 1:
+		min_travel = _min_incoming(instance.loader_times, inner_ids, inner_ids)
+	else:
+		min_travel = np.zeros(1, dtype=np.int64)
+	counts = np.array([job.loader_cnt for job in jobs])
+	service = sum(job.loader_service_time * job.loader_cnt for job in jobs)
+	slot_travel = np.sort(np.repeat(min_travel, counts))[::-1]
+	saved_travel = np.concatenate(([0], np.cumsum(slot_travel)))
+	total_travel = int(saved_travel[-1])
+
+	loaders = np.arange(min_loaders(instance, jobs), len(slot_travel) + 1)
+	costs = loaders * weights.loader_salary + (service + total_travel - saved_travel[loaders]) * weights.loader_work
+	return int(costs.min())
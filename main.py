@@ -1,31 +1,142 @@
 import math
 import argparse
+import time
 from collections.abc import Iterable
 from pathlib import Path
 
+import checkpoint as checkpoint_module
 import export_solution
+import instance_cache
 import loader_heuristic
+import loader_path_cover
+import loader_pipeline
+import loader_portfolio
+import lower_bounds
 import loader_schedule
 import objective
 import pyvrp_model
+import results_store
+import telemetry
+import warm_start
+from checkpoint import Checkpoint
 from instance import Instance
 from loader_schedule import LoaderJob, LoaderRoute
 from pyvrp_model import VehicleRoute
 
 
-def generate_loader_schedules(instance: Instance, loader_jobs: list[LoaderJob], time_limit: float):
-	"""Generates different variants of loader schedules."""
+# Minimum time between checkpoints written on optimizer improvements if only --resume is given, in seconds
+CHECKPOINT_INTERVAL = 30.0
+
+
+def generate_loader_schedules(instance: Instance,
+                              loader_jobs: list[LoaderJob],
+                              time_limit: float,
+                              num_workers: int = 1,
+                              patience: float | None = None,
+                              previous_loader_routes: list[list[int]] | None = None,
+                              checkpoint: Checkpoint | None = None,
+                              portfolio: bool = False,
+                              cache_size: int = loader_heuristic.PERMUTATION_CACHE_SIZE,
+                              path_cover_successors: int = loader_path_cover.MAX_SUCCESSORS,
+                              target: float | None = None):
+	"""Generates different variants of loader schedules. Previous loader routes are used as the starting point of the
+	optimizers. Every variant and, at the checkpoint interval, improvements of the optimizers are offered to the
+	checkpoint. With `portfolio`, the variants come from racing the default strategies of `loader_portfolio` on
+	`num_workers` processes instead. Nevergrad keeps the values of `cache_size` evaluated permutations. The schedule
+	from the minimum path cover of the jobs is added unless `path_cover_successors` is 0. Once a schedule with a
+	loader objective of at most `target` is found, the remaining optimizers are skipped or stopped."""
+	best_value = math.inf
+
+	def reached_target() -> bool:
+		return target is not None and best_value <= target
+
+	def offer(schedule: list[LoaderRoute]):
+		nonlocal best_value
+		best_value = min(best_value, objective.calculate_loader_objective(instance, schedule))
+		if checkpoint is not None:
+			checkpoint.offer(schedule)
+
+	def improvement_callback(jobs: list[LoaderJob]) -> loader_heuristic.ImprovementCallback | None:
+		if checkpoint is None and target is None:
+			return None
+
+		def on_improvement(permutation: list[int], value: float):
+			nonlocal best_value
+			best_value = min(best_value, value)
+			if checkpoint is not None and checkpoint.due():
+				schedule = loader_schedule.build_loader_schedule(instance, [jobs[i] for i in permutation],
+				                                                 loader_schedule.select_job_next)
+				checkpoint.offer(schedule, periodic=True)
+
+		return on_improvement
+
+	start_time = time.time()
 	loader_jobs.sort(key=lambda job: job.earliest_time)
+	initial_order = None
+	initial_jobs = loader_jobs
+	variants = []
+	if previous_loader_routes is not None:
+		initial_order = warm_start.loader_job_order(loader_jobs, previous_loader_routes)
+		initial_jobs = [loader_jobs[i] for i in initial_order]
+	# Schedule from a minimum path cover of the jobs
+	if path_cover_successors > 0:
+		with telemetry.phase('loader_path_cover'):
+			variants.append(loader_path_cover.build_path_cover_schedule(instance, loader_jobs, path_cover_successors))
+		telemetry.record('path_cover_loaders', len(variants[-1]))
+		offer(variants[-1])
+	if portfolio:
+		if reached_target():
+			print("Path cover schedule is within the gap, skipping the portfolio")
+			return variants
+		strategies = loader_portfolio.default_strategies(initial_order is not None)
+		with telemetry.phase('loader_portfolio'):
+			schedules, results = loader_portfolio.race(instance, loader_jobs, strategies,
+			                                           time_limit - (time.time() - start_time), num_workers, patience,
+			                                           initial_order, cache_size, target)
+		telemetry.record('loader_portfolio', [result.statistics() for result in results])
+		for schedule in schedules:
+			offer(schedule)
+		return variants + schedules
+	if initial_order is not None:
+		with telemetry.phase('loader_warm_start'):
+			variants.append(loader_schedule.build_loader_schedule(instance, initial_jobs,
+			                                                      loader_schedule.select_job_next))
+		offer(variants[-1])
 	# Schedule minimizing waiting time
-	schedule_basic = loader_schedule.build_loader_schedule(instance, loader_jobs)
+	with telemetry.phase('loader_min_wait'):
+		schedule_basic = loader_schedule.build_loader_schedule(instance, loader_jobs)
+	offer(schedule_basic)
 	# Schedule by due time
-	schedule_sorted = loader_schedule.build_loader_schedule(instance, loader_jobs, loader_schedule.select_job_next)
-	# Optimize schedule using Nevergrad
-	optimized_jobs = loader_heuristic.optimize_loader_schedule_with_nevergrad(instance, loader_jobs, time_limit)
-	schedule_optimized = loader_schedule.build_loader_schedule(instance, optimized_jobs,
-	                                                           loader_schedule.select_job_next)
+	with telemetry.phase('loader_due_time'):
+		schedule_sorted = loader_schedule.build_loader_schedule(instance, loader_jobs, loader_schedule.select_job_next)
+	offer(schedule_sorted)
+	if reached_target():
+		print("Loader schedule is within the gap, skipping the optimizers")
+		return variants + [schedule_basic, schedule_sorted]
+	cancelled = reached_target if target is not None else None
+	# Optimize schedule using Nevergrad and local search, sharing the time limit. Time not used by Nevergrad is given
+	# to the local search.
+	with telemetry.phase('loader_nevergrad'):
+		optimized_jobs = loader_heuristic.optimize_loader_schedule_with_nevergrad(instance, loader_jobs, time_limit / 2,
+		                                                                         num_workers, patience, initial_order,
+		                                                                         improvement_callback(loader_jobs),
+		                                                                         cache_size, cancelled)
+		schedule_optimized = loader_schedule.build_loader_schedule(instance, optimized_jobs,
+		                                                           loader_schedule.select_job_next)
+	offer(schedule_optimized)
+	with telemetry.phase('loader_local_search'):
+		local_search_jobs = loader_heuristic.optimize_loader_schedule_with_local_search(
+		    instance,
+		    initial_jobs,
+		    time_limit - (time.time() - start_time),
+		    patience=patience,
+		    on_improvement=improvement_callback(initial_jobs),
+		    cancelled=cancelled)
+		schedule_local_search = loader_schedule.build_loader_schedule(instance, local_search_jobs,
+		                                                              loader_schedule.select_job_next)
+	offer(schedule_local_search)
 
-	return [schedule_basic, schedule_sorted, schedule_optimized]
+	return variants + [schedule_basic, schedule_sorted, schedule_optimized, schedule_local_search]
 
 
 def evaluate_schedules(instance: Instance, loader_schedules: Iterable[Iterable[LoaderRoute]]):
@@ -38,26 +149,81 @@ def evaluate_schedules(instance: Instance, loader_schedules: Iterable[Iterable[L
 	return best_evaluation
 
 
-def save_results(directory: Path, instance: Instance, instance_name: str, vehicle_routes: Iterable[VehicleRoute],
-                 best_schedule: Iterable[LoaderRoute], best_objective: int, vehicle_objective: int):
-	"""Saves results to solution file and CSV."""
-	output_file = directory / f'sol_{instance_name}.json'
-	export_solution.export_solution_to_json(vehicle_routes, best_schedule, output_file)
+def solve_loader_stage(instance: Instance,
+                       vehicle_routes: list[VehicleRoute],
+                       time_limit: float,
+                       num_workers: int = 1,
+                       patience: float | None = None,
+                       previous_loader_routes: list[list[int]] | None = None,
+                       checkpoint: Checkpoint | None = None,
+                       portfolio: bool = False,
+                       cache_size: int = loader_heuristic.PERMUTATION_CACHE_SIZE,
+                       path_cover_successors: int = loader_path_cover.MAX_SUCCESSORS,
+                       gap: float | None = None) -> tuple[int, list[LoaderRoute], int | None]:
+	"""Builds loader schedules for the given vehicle routes and returns the best one with its objective. If `gap` is
+	given, the lower bound of `calculate_loader_objective` for the jobs is computed and returned as well, and the
+	optimizers stop once a schedule is within the gap."""
+	with telemetry.phase('collect_loader_jobs'):
+		loader_jobs = loader_schedule.collect_loader_jobs(instance, (route.clients for route in vehicle_routes))
+	telemetry.record('loader_jobs', len(loader_jobs))
+	bound = None
+	target = None
+	if gap is not None:
+		with telemetry.phase('loader_lower_bound'):
+			bound = lower_bounds.loader_lower_bound(instance, loader_jobs)
+		target = lower_bounds.target(bound, gap)
+		print(f"Loader lower bound: {bound / 10_000:.2f}")
+	loader_schedules = generate_loader_schedules(instance, loader_jobs, time_limit, num_workers, patience,
+	                                             previous_loader_routes, checkpoint, portfolio, cache_size,
+	                                             path_cover_successors, target)
+	with telemetry.phase('evaluation'):
+		best_objective, best_schedule = evaluate_schedules(instance, loader_schedules)
+	return best_objective, best_schedule, bound
+
+
+def save_results(directory: Path,
+                 instance: Instance,
+                 instance_name: str,
+                 vehicle_routes: Iterable[VehicleRoute],
+                 best_schedule: Iterable[LoaderRoute],
+                 best_objective: int,
+                 vehicle_objective: int,
+                 append_csv: bool = True,
+                 gaps: tuple[float, float] | None = None,
+                 solution_format: str = 'json') -> list[str | float]:
+	"""Saves results to solution file and CSV and returns the row. The vehicle and loader gaps to their lower bounds
+	are added to the row if given, see `append_results`."""
+	output_file = directory / export_solution.solution_file_name(instance_name, solution_format)
+	with telemetry.phase('export'):
+		export_solution.write_solution(vehicle_routes, best_schedule, output_file, solution_format)
 
 	loader_objective_wrong = objective.calculate_loader_objective_wrong(instance, best_schedule)
 
-	with open(directory / "results.csv", 'a') as f:
-		print(
-		    instance_name,
-		    round_two_digits(best_objective / 10_000),  # Divide by 10_000 to match the original objective scale
-		    round_two_digits((vehicle_objective + loader_objective_wrong) / 10_000),
-		    sep=',',
-		    file=f)
+	row: list[str | float] = [
+	    instance_name,
+	    round_two_digits(best_objective / 10_000),  # Divide by 10_000 to match the original objective scale
+	    round_two_digits((vehicle_objective + loader_objective_wrong) / 10_000),
+	]
+	if gaps is not None:
+		row += [round(gap, 4) for gap in gaps]
+	if append_csv:
+		append_results(directory / "results.csv", [row])
+	return row
 
 
-def main():
-	parser = argparse.ArgumentParser()
-	parser.add_argument("instance", type=str, help="Path to the input JSON file.")
+def append_results(results_path: Path, rows: Iterable[list[str | float]]):
+	"""Appends rows to the results CSV file, which other processes may append to at the same time. The gaps of rows
+	that have them are appended to `gaps.csv` next to it, so that all rows of the results file have the same
+	columns."""
+	rows = list(rows)
+	results_store.append_csv(results_path, [row[:3] for row in rows])
+	gap_rows = [[row[0], *row[3:]] for row in rows if len(row) > 3]
+	if gap_rows:
+		results_store.append_csv(results_path.with_name('gaps.csv'), gap_rows)
+
+
+def add_solver_arguments(parser: argparse.ArgumentParser):
+	"""Adds the options controlling how a single instance is solved."""
 	parser.add_argument("-t",
 	                    "--time",
 	                    type=float,
@@ -68,31 +234,295 @@ def main():
 	                    type=str,
 	                    default=".",
 	                    help="Output directory for results (default: current directory).")
-	args = parser.parse_args()
+	parser.add_argument("--compact",
+	                    action="store_true",
+	                    help="Store instance matrices as compact NumPy arrays to reduce memory usage.")
+	parser.add_argument("--neighbours",
+	                    type=int,
+	                    default=None,
+	                    help="Sparse mode: keep only this many nearest neighbours per order and compute other travel "
+	                    "times when needed instead of storing the instance matrices. PyVRP still receives dense "
+	                    "matrices, so the vehicle stage needs memory quadratic in the number of orders. Takes precedence "
+	                    "over --compact and --cache-dir.")
+	parser.add_argument("--cache-dir",
+	                    type=str,
+	                    default=None,
+	                    help="Directory for the preprocessed instance cache (default: no caching).")
+	parser.add_argument("-w",
+	                    "--workers",
+	                    type=int,
+	                    default=1,
+	                    help="Number of processes evaluating loader schedules in parallel (default: 1).")
+	parser.add_argument("--portfolio",
+	                    action="store_true",
+	                    help="Race a portfolio of greedy, Nevergrad and local search loader strategies on the --workers "
+	                    "processes, cancelling dominated ones, instead of running the optimizers one after another.")
+	parser.add_argument("--path-cover",
+	                    type=int,
+	                    default=loader_path_cover.MAX_SUCCESSORS,
+	                    help="Number of successors per loader job considered by the loader schedule built from a "
+	                    "minimum path cover of the jobs; 0 disables this schedule (default: "
+	                    f"{loader_path_cover.MAX_SUCCESSORS}).")
+	parser.add_argument("--permutation-cache",
+	                    type=int,
+	                    default=loader_heuristic.PERMUTATION_CACHE_SIZE,
+	                    help="Number of job permutations whose loader objective Nevergrad keeps, so candidates "
+	                    f"decoding to an evaluated permutation are not evaluated again; 0 disables the cache (default: "
+	                    f"{loader_heuristic.PERMUTATION_CACHE_SIZE}).")
+	parser.add_argument("--vehicle-seeds",
+	                    type=int,
+	                    default=1,
+	                    help="Number of PyVRP searches with different seeds run in parallel (default: 1).")
+	parser.add_argument("--exchange-interval",
+	                    type=float,
+	                    default=None,
+	                    help="Interval in seconds for exchanging the incumbent between PyVRP searches.")
+	parser.add_argument("--warm-start",
+	                    type=str,
+	                    default=None,
+	                    help="Solution file of a previous run used as the starting point of both stages.")
+	parser.add_argument("--checkpoint-interval",
+	                    type=float,
+	                    default=None,
+	                    help="Write the best solution found so far to the solution file and a checkpoint after each "
+	                    "stage and loader variant, and on optimizer improvements at most this often, in seconds.")
+	parser.add_argument("--resume",
+	                    action="store_true",
+	                    help="Continue from the checkpoint in the output directory with the rest of the time limit, if "
+	                    "there is one. Enables checkpoints.")
+	parser.add_argument("--solution-format",
+	                    choices=export_solution.SOLUTION_FORMATS,
+	                    default='json',
+	                    help="Format of the solution files: indented JSON, or compact JSON Lines with one route per line "
+	                    "written as the routes are produced, optionally compressed (default: json).")
+	parser.add_argument("--results-db",
+	                    type=str,
+	                    default=None,
+	                    help="SQLite database recording the costs and phase timings of every run, safe for concurrent "
+	                    "runs (default: none).")
+	parser.add_argument("--metrics",
+	                    type=str,
+	                    default=None,
+	                    help="Directory for per-run JSON files with phase timings and solver telemetry.")
+	parser.add_argument("--profile",
+	                    type=str,
+	                    default=None,
+	                    help="Directory for cProfile statistics of each run (default: no profiling).")
+	parser.add_argument("--stagnation",
+	                    type=float,
+	                    default=None,
+	                    help="Stop a stage when it has not improved for this fraction of the time limit and give the "
+	                    "remaining time to the other stage (default: fixed 5:2 split).")
+	parser.add_argument("--pipeline",
+	                    type=float,
+	                    default=None,
+	                    help="Build loader schedules for the PyVRP incumbents on the --workers processes while the "
+	                    "vehicle search continues, passing on the incumbent at this interval in seconds, and keep the "
+	                    "incumbent with the lowest total cost.")
+	parser.add_argument("--gap",
+	                    type=float,
+	                    default=None,
+	                    help="Stop a stage once its objective is within this relative gap of its lower bound, give the "
+	                    "remaining time to the loader stage and write both gaps to gaps.csv.")
+
+
+def load_instance(input_path: Path, args: argparse.Namespace) -> Instance:
+	"""Loads an instance in the representation selected by the options."""
+	if args.neighbours is not None:
+		return Instance.from_json(input_path, neighbours=args.neighbours)
+	if args.cache_dir is not None:
+		return instance_cache.load_instance(input_path, Path(args.cache_dir))
+	return Instance.from_json(input_path, compact=args.compact)
+
 
-	input_path = Path(args.instance)
-	instance = Instance.from_json(input_path)
+def solve_instance(input_path: Path,
+                   args: argparse.Namespace,
+                   append_csv: bool = True,
+                   instance: Instance | None = None) -> list[str | float]:
+	"""
+	Solves one instance with the given options and saves the solution.
+
+	Args:
+		input_path (Path): Path to the instance JSON file.
+		args (argparse.Namespace): Options added by `add_solver_arguments`.
+		append_csv (bool): Whether to append the results to `results.csv` in the output directory.
+		instance (Instance | None): The instance loaded from `input_path` with `load_instance`, if it is already in
+			memory.
+
+	Returns:
+		list[str | float]: The row of the results CSV.
+	"""
+	telemetry.start_run()
+	instance_name = input_path.stem
+	profile_path = Path(args.profile) / f'profile_{instance_name}.prof' if args.profile is not None else None
+	with telemetry.profile(profile_path):
+		row = _solve_instance(input_path, args, append_csv, instance)
+	if args.metrics is not None:
+		telemetry.write_metrics(Path(args.metrics) / f'metrics_{instance_name}.json',
+		                        instance=instance_name,
+		                        time_limit=args.time,
+		                        loader_cost=row[1],
+		                        total_cost=row[2])
+	if args.results_db is not None:
+		results_store.ResultsStore(Path(args.results_db)).append(instance_name, row, telemetry.phases(), args.time)
+	return row
+
+
+def _solve_instance(input_path: Path, args: argparse.Namespace, append_csv: bool,
+                    instance: Instance | None) -> list[str | float]:
+	if instance is None:
+		with telemetry.phase('load'):
+			instance = load_instance(input_path, args)
+	telemetry.record('orders', len(instance.orders))
 	total_time = args.time
-	vehicle_time = total_time * 5 / 7
-	loader_time = total_time * 2 / 7
 	out_path = Path(args.output)
 	instance_name = input_path.stem
+	state = checkpoint_module.load_checkpoint(out_path, instance_name) if args.resume else None
+	elapsed_before = state.elapsed if state is not None else 0.0
+	# Import Nevergrad before the run clock starts, like loading the instance, so that the import takes time neither
+	# from the loader stage nor from the time limit. It does nothing if the module is already loaded, as in the service.
+	with telemetry.phase('nevergrad_import'):
+		loader_heuristic.import_nevergrad()
+	# Time spent before a resumed checkpoint counts against the time limit
+	start_time = time.time() - elapsed_before
+	vehicle_time = total_time * 5 / 7
+	patience = args.stagnation * total_time if args.stagnation is not None else None
+	checkpoint = None
+	if args.checkpoint_interval is not None or args.resume:
+		interval = args.checkpoint_interval if args.checkpoint_interval is not None else CHECKPOINT_INTERVAL
+		incumbent_objective = state.vehicle_objective + state.loader_objective if state is not None else math.inf
+		checkpoint = Checkpoint(instance, out_path, instance_name, interval, elapsed_before, incumbent_objective,
+		                        args.solution_format)
+	if state is not None:
+		print(f"Resuming from checkpoint after {state.elapsed:.1f}s")
+		previous = warm_start.load_warm_start(instance, state.solution_path)
+	elif args.warm_start is not None:
+		previous = warm_start.load_warm_start(instance, Path(args.warm_start))
+	else:
+		previous = None
 
-	# Build vehicle schedule
-	vehicle_routes = pyvrp_model.build_vehicle_schedule(instance, vehicle_time)
+	vehicle_bound = None
+	vehicle_target = None
+	if args.gap is not None:
+		with telemetry.phase('vehicle_lower_bound'):
+			vehicle_bound = lower_bounds.vehicle_lower_bound(instance)
+		vehicle_target = lower_bounds.target(vehicle_bound, args.gap)
+		telemetry.record('vehicle_lower_bound', vehicle_bound)
+		print(f"Vehicle lower bound: {vehicle_bound / 10_000:.2f}")
 
-	# Collect and sort loader jobs
-	loader_jobs = loader_schedule.collect_loader_jobs(instance, (route.clients for route in vehicle_routes))
+	# Build vehicle schedule. A checkpoint is only written once the vehicle stage is complete, so its routes are used
+	# as they are.
+	candidates: list[loader_pipeline.Candidate] = []
+	if state is not None:
+		assert previous is not None
+		vehicle_trips = state.vehicle_trips if state.vehicle_trips is not None else previous.vehicle_trips
+		vehicle_routes = pyvrp_model.routes_from_trips(instance, vehicle_trips)
+		vehicle_cost = state.vehicle_cost
+		vehicle_elapsed = state.vehicle_elapsed
+		vehicle_stopped_early = state.vehicle_stopped_early
+	else:
+		# In the pipelined mode, loader schedules are built for the vehicle incumbents while the search continues
+		pipeline = None
+		if args.pipeline is not None:
+			pipeline = loader_pipeline.LoaderPipeline(instance, args.workers, args.pipeline, start_time + vehicle_time,
+			                                          args.path_cover)
+		with telemetry.phase('vehicle_stage'):
+			vehicle_schedule = pyvrp_model.build_vehicle_schedule(
+			    instance, vehicle_time, args.vehicle_seeds, args.exchange_interval, patience,
+			    previous.vehicle_trips if previous is not None else None, vehicle_target,
+			    pipeline.submit if pipeline is not None else None, args.pipeline)
+		vehicle_routes, vehicle_trips = vehicle_schedule.routes, vehicle_schedule.trips
+		vehicle_cost, vehicle_stopped_early = vehicle_schedule.cost, vehicle_schedule.stopped_early
+		if pipeline is not None:
+			with telemetry.phase('loader_pipeline'):
+				candidates = pipeline.finish()
+			telemetry.record('loader_pipeline', [candidate.statistics() for candidate in candidates])
+			telemetry.record('loader_pipeline_dropped', pipeline.dropped)
+		vehicle_elapsed = time.time() - start_time
+	vehicle_objective = objective.calculate_vehicle_objective(instance, vehicle_routes)
+	if checkpoint is not None:
+		checkpoint.set_vehicle_routes(vehicle_routes, vehicle_trips, vehicle_objective, vehicle_cost, vehicle_elapsed,
+		                              vehicle_stopped_early)
 
-	# Generate different loader schedules
-	loader_schedules = generate_loader_schedules(instance, loader_jobs, loader_time)
+	# Build loader schedules, using all time not used by the vehicle stage if stages stop early
+	stops_early = patience is not None or args.gap is not None
+	loader_time = total_time - vehicle_elapsed if stops_early else total_time * 2 / 7
+	loader_time = max(min(loader_time, total_time - (time.time() - start_time)), 0.0)
+	previous_loader_routes = previous.loader_routes if previous is not None else None
+	best_objective, best_schedule, loader_bound = solve_loader_stage(instance, vehicle_routes, loader_time, args.workers,
+	                                                                 patience, previous_loader_routes, checkpoint,
+	                                                                 args.portfolio, args.permutation_cache,
+	                                                                 args.path_cover, args.gap)
+	if state is not None and checkpoint_module.same_vehicle_visits(state, vehicle_routes):
+		# Keep the schedule of the checkpoint if the resumed loader stage did not improve it. It is only valid if the
+		# restored vehicle routes visit the orders at the same times.
+		incumbent_loader_objective = objective.calculate_loader_objective_wrong(instance, state.loader_routes)
+		if incumbent_loader_objective < best_objective:
+			best_objective, best_schedule = incumbent_loader_objective, state.loader_routes
 
-	# Evaluate and select the best schedule
-	best_objective, best_schedule = evaluate_schedules(instance, loader_schedules)
-	vehicle_objective = objective.calculate_vehicle_objective(instance, vehicle_routes)
+	# If the vehicle stage was stopped by its time limit rather than by stagnation, resume it with the time the loader
+	# stage did not use and keep the result if the total cost improves
+	remaining_time = total_time - (time.time() - start_time)
+	if patience is not None and not vehicle_stopped_early and remaining_time > patience:
+		print(f"Resuming vehicle stage for {remaining_time:.1f}s")
+		with telemetry.phase('vehicle_stage_resumed'):
+			resumed = pyvrp_model.build_vehicle_schedule(instance, remaining_time * 5 / 7, args.vehicle_seeds,
+			                                             args.exchange_interval, patience, vehicle_trips, vehicle_target)
+		resumed_routes = resumed.routes
+		resumed_objective = objective.calculate_vehicle_objective(instance, resumed_routes)
+		if resumed_objective < vehicle_objective:
+			if checkpoint is not None:
+				checkpoint.set_vehicle_routes(resumed_routes, resumed.trips, resumed_objective, resumed.cost,
+				                              time.time() - start_time, resumed.stopped_early)
+			resumed_loader_time = total_time - (time.time() - start_time)
+			loader_objective, loader_routes, resumed_bound = solve_loader_stage(
+			    instance, resumed_routes, resumed_loader_time, args.workers, patience, previous_loader_routes, checkpoint,
+			    args.portfolio, args.permutation_cache, args.path_cover, args.gap)
+			if resumed_objective + loader_objective < vehicle_objective + best_objective:
+				vehicle_routes, vehicle_objective, vehicle_cost = resumed_routes, resumed_objective, resumed.cost
+				vehicle_trips = resumed.trips
+				best_objective, best_schedule, loader_bound = loader_objective, loader_routes, resumed_bound
+
+	# Keep the best vehicle incumbent of the pipeline with its loader schedule if its total cost is lower
+	if candidates:
+		best_candidate = min(candidates, key=lambda candidate: candidate.total_objective)
+		print(f"Best pipelined incumbent: {best_candidate.total_objective / 10_000:.2f}, final: "
+		      f"{(vehicle_objective + best_objective) / 10_000:.2f}")
+		if best_candidate.total_objective < vehicle_objective + best_objective:
+			vehicle_routes, vehicle_objective = best_candidate.vehicle_routes, best_candidate.vehicle_objective
+			vehicle_cost = best_candidate.vehicle_cost
+			best_objective, best_schedule = best_candidate.loader_objective, best_candidate.loader_schedule
+			if loader_bound is not None:
+				loader_jobs = loader_schedule.collect_loader_jobs(instance, (route.clients for route in vehicle_routes))
+				loader_bound = lower_bounds.loader_lower_bound(instance, loader_jobs)
+
+	# Gaps to the lower bounds by the objectives minimized in each stage, which the stages also stop on: the PyVRP cost
+	# and the loader objective of the optimizers
+	gaps = None
+	if vehicle_bound is not None and loader_bound is not None:
+		loader_objective = objective.calculate_loader_objective(instance, best_schedule)
+		gaps = (lower_bounds.gap(vehicle_cost, vehicle_bound), lower_bounds.gap(loader_objective, loader_bound))
+		telemetry.record('loader_lower_bound', loader_bound)
+		telemetry.record('vehicle_gap', gaps[0])
+		telemetry.record('loader_gap', gaps[1])
+		print(f"Gaps to the lower bounds: vehicle {gaps[0]:.2%}, loader {gaps[1]:.2%}")
 
 	# Save results
-	save_results(out_path, instance, instance_name, vehicle_routes, best_schedule, best_objective, vehicle_objective)
+	row = save_results(out_path, instance, instance_name, vehicle_routes, best_schedule, best_objective,
+	                   vehicle_objective, append_csv, gaps, args.solution_format)
+	if checkpoint is not None:
+		telemetry.record('checkpoints', checkpoint.writes)
+		checkpoint.remove()
+	return row
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("instance", type=str, help="Path to the input JSON file.")
+	add_solver_arguments(parser)
+	args = parser.parse_args()
+
+	solve_instance(Path(args.instance), args)
 
 
 def round_two_digits(x: float):
@@ -1,60 +1,70 @@
-from collections.abc import Iterable
+import math
+import multiprocessing
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
 
-from pyvrp import Client, Depot, Model
-from pyvrp.stop import MaxRuntime
+import numpy as np
+from pyvrp import (Client, CostEvaluator, Depot, GeneticAlgorithm, PenaltyManager, Population, ProblemData,
+                   RandomNumberGenerator, Result, Route, Solution, SolveParams, Trip, VehicleType)
+from pyvrp.crossover import ordered_crossover, selective_route_exchange
+from pyvrp.diversity import broken_pairs_distance
+from pyvrp.search import LocalSearch, compute_neighbours
+from pyvrp.stop import StoppingCriterion
 
-from instance import Instance, dataclass
+from instance import Instance, dataclass, matrix_to_array
+import telemetry
+from stopping import StagnationStop
 
+# Routes of a solution as (vehicle type, visits of each trip), used to pass solutions between processes
+SolutionTrips = list[tuple[int, list[list[int]]]]
 
-def build_first_stage_model(instance: Instance):
+# Called with the vehicle routes and the PyVRP cost of every new feasible incumbent found by `build_vehicle_schedule`
+IncumbentCallback = Callable[[list['VehicleRoute'], float], None]
+
+
+def build_first_stage_data(instance: Instance) -> ProblemData:
 	"""
-	Builds the PyVRP model for vehicles only based on the given instance.
+	Builds the PyVRP problem data for vehicles only based on the given instance.
+
+	The distance and duration matrices are taken directly from the preprocessed instance matrices, with the depot load
+	time added to every edge returning to the depot. PyVRP needs dense matrices, so they are computed in full for
+	sparse instances; the sparse neighbourhood only restricts the search, see `search_neighbours`.
 
 	Args:
 		instance (Instance): An object containing the problem instance data
 
 	Returns:
-		Model: A configured PyVRP model.
+		ProblemData: The problem data with the depot at index 0 and the order with `inner_id == i` at index `i`.
 	"""
-	model = Model()
-	depot = model.add_depot(x=instance.depot.x, y=instance.depot.y)
-	model.add_vehicle_type(num_available=len(instance.orders),
-	                       start_depot=depot,
-	                       capacity=instance.vehicle_capacity,
-	                       fixed_cost=instance.weights.vehicle_salary,
-	                       max_duration=instance.vehicle_shift_size + instance.depot.load_time,
-	                       unit_distance_cost=instance.weights.fuel_cost,
-	                       reload_depots=[depot])
+	depot = Depot(x=instance.depot.x, y=instance.depot.y)
+	vehicle_type = VehicleType(num_available=len(instance.orders),
+	                           capacity=[instance.vehicle_capacity],
+	                           start_depot=0,
+	                           end_depot=0,
+	                           fixed_cost=instance.weights.vehicle_salary,
+	                           max_duration=instance.vehicle_shift_size + instance.depot.load_time,
+	                           unit_distance_cost=instance.weights.fuel_cost,
+	                           reload_depots=[0])
 	clients = [
-	    model.add_client(x=order.x,
-	                     y=order.y,
-	                     delivery=order.volume,
-	                     service_duration=order.vehicle_service_time,
-	                     tw_early=order.time_window[0],
-	                     tw_late=order.time_window[1],
-	                     required=False if order.optional else True,
-	                     prize=instance.weights.optional_order_penalty if order.optional else 0,
-	                     name=str(order.id)) for order in instance.orders
+	    Client(x=order.x,
+	           y=order.y,
+	           delivery=[order.volume],
+	           service_duration=order.vehicle_service_time,
+	           tw_early=order.time_window[0],
+	           tw_late=order.time_window[1],
+	           required=False if order.optional else True,
+	           prize=instance.weights.optional_order_penalty if order.optional else 0,
+	           name=str(order.id)) for order in instance.orders
 	]
-	# Add edges between depot and clients
-	for i, client in enumerate(clients):
-		model.add_edge(depot, client, distance=instance.distances[0][i + 1], duration=instance.vehicle_times[0][i + 1])
-		model.add_edge(client,
-		               depot,
-		               distance=instance.distances[i + 1][0],
-		               duration=(instance.vehicle_times[i + 1][0] + instance.depot.load_time))
-
-	# Add edges between clients
-	for i, client1 in enumerate(clients):
-		for j, client2 in enumerate(clients):
-			if i != j:
-				model.add_edge(
-				    client1,
-				    client2,
-				    distance=int(instance.distances[i + 1][j + 1]),
-				    duration=int(instance.vehicle_times[i + 1][j + 1]),
-				)
-	return model
+	distances = matrix_to_array(instance.distances)
+	durations = matrix_to_array(instance.vehicle_times)
+	# Returning to the depot includes loading the vehicle for the next trip
+	durations[1:, 0] += instance.depot.load_time
+	np.fill_diagonal(distances, 0)
+	np.fill_diagonal(durations, 0)
+	return ProblemData(clients, [depot], [vehicle_type], [distances], [durations])
 
 
 @dataclass
@@ -74,7 +84,7 @@ def calculate_detailed_route(instance: Instance, route: Iterable[Client | Depot]
 		instance (Instance): The problem instance containing data about clients,
 			depots, distances, and vehicle constraints.
 		route (Iterable[Client | Depot]): The sequence of nodes (clients and depots)
-			that the vehicle will visit obdained from the PyVRP model.
+			that the vehicle will visit obdained from the PyVRP problem data.
 		start_time (int): The starting time for the route.
 
 	Returns:
@@ -83,50 +93,382 @@ def calculate_detailed_route(instance: Instance, route: Iterable[Client | Depot]
 	result: list[tuple[int, int]] = []
 	time = start_time
 	distance = 0
-	# Create a mapping from client ID to client object for easy access
-	client_mapping = {str(client.id): client for client in instance.orders}
+	order_by_id = instance.order_by_id
 	prev_client = 0
+	# Matrix entries may be NumPy scalars for compact instances, so convert each one to avoid overflowing sums
 	for node in route:
 		if isinstance(node, Depot):
-			time += instance.vehicle_times[prev_client][0]
-			result.append((0, time))
+			# Reload at the depot between two trips
+			time += int(instance.vehicle_times[prev_client][0])
+			distance += int(instance.distances[prev_client][0])
+			result.append((0, int(time)))
 			time += instance.depot.load_time
+			prev_client = 0
 		else:
-			order = client_mapping[node.name]
-			time += instance.vehicle_times[prev_client][order.inner_id]
-			distance += instance.distances[prev_client][order.inner_id]
+			order = order_by_id[int(node.name)]
+			time += int(instance.vehicle_times[prev_client][order.inner_id])
+			distance += int(instance.distances[prev_client][order.inner_id])
 
 			# Check the time window constraints
 			assert time <= order.time_window[1]
 			if time < order.time_window[0]:
 				time = order.time_window[0]
 
-			result.append((order.id, time))
+			result.append((order.id, int(time)))
 			time += order.vehicle_service_time
 			prev_client = order.inner_id
 	# Add the return to depot
-	time += instance.vehicle_times[prev_client][0]
-	distance += instance.distances[prev_client][0]
+	time += int(instance.vehicle_times[prev_client][0])
+	distance += int(instance.distances[prev_client][0])
 	assert time - start_time <= instance.vehicle_shift_size
-	return VehicleRoute(result, distance, time - start_time)
+	return VehicleRoute(result, int(distance), int(time - start_time))
+
 
+def search_neighbours(instance: Instance) -> list[list[int]] | None:
+	"""Returns the granular neighbourhood of a sparse instance in the format of `pyvrp.search.compute_neighbours`, or
+	None for dense instances."""
+	if instance.neighbours is None:
+		return None
+	return [[]] + instance.neighbours.tolist()
 
-def build_vehicle_schedule(instance: Instance, time_limit: float):
+
+def solve_model(data: ProblemData,
+                stop: StoppingCriterion,
+                seed: int,
+                initial_solutions: Sequence[Solution] = (),
+                display: bool = False,
+                neighbours: list[list[int]] | None = None) -> Result:
 	"""
-	Build and solves the PyVRP model for the routing problem of vehicles only.
+	Solves the problem data like `pyvrp.solve`, but adds the given solutions to the initial population.
 
 	Args:
-		instance (Instance): The problem instance containing all necessary data for the model.
-		time_limit (float): The maximum allowed runtime for solving the model, in seconds.
+		data (ProblemData): The problem data to solve.
+		stop (StoppingCriterion): The stopping criterion.
+		seed (int): The seed of the random number generator.
+		initial_solutions (Sequence[Solution]): Solutions added to the randomly generated initial population. They are
+			also kept when the population is restarted.
+		display (bool): Whether to display the solver progress.
+		neighbours (list[list[int]] | None): The granular neighbourhood of the local search. Computed from the problem
+			data if None, which needs several dense temporary matrices.
+
+	Returns:
+		Result: The result of the genetic algorithm.
+	"""
+	params = SolveParams()
+	rng = RandomNumberGenerator(seed=seed)
+	if neighbours is None:
+		neighbours = compute_neighbours(data, params.neighbourhood)
+	local_search = LocalSearch(data, rng, neighbours)
+	for node_op in params.node_ops:
+		local_search.add_node_operator(node_op(data))
+	for route_op in params.route_ops:
+		local_search.add_route_operator(route_op(data))
+
+	penalty_manager = PenaltyManager.init_from(data, params.penalty)
+	population = Population(broken_pairs_distance, params.population)
+	init = list(initial_solutions)
+	init += [Solution.make_random(data, rng) for _ in range(params.population.min_pop_size)]
+	crossover = selective_route_exchange if data.num_vehicles > 1 else ordered_crossover
+	algorithm = GeneticAlgorithm(data, penalty_manager, rng, population, local_search, crossover, init,
+	                             params.genetic)  # type: ignore
+	return algorithm.run(stop, True, display)
+
+
+def solution_cost(solution: Solution) -> float:
+	"""Returns the cost of a PyVRP solution as `Result.cost()` does, infinite if it is infeasible. For a feasible
+	solution, it equals `objective.calculate_vehicle_objective` of the routes from `extract_routes`."""
+	if not solution.is_feasible():
+		return math.inf
+	return CostEvaluator([0], 0, 0).cost(solution)
+
+
+def solve_segments(instance: Instance,
+                   data: ProblemData,
+                   stop: StagnationStop,
+                   seed: int,
+                   interval: float,
+                   on_incumbent: IncumbentCallback,
+                   initial_solutions: Sequence[Solution] = ()) -> tuple[Solution, int]:
+	"""
+	Solves the problem data in segments of `interval` seconds, so that incumbents can be used before the search ends.
+
+	Every segment restarts the genetic algorithm from the best solution so far with the next seed. The stopping
+	criterion spans all segments, so its time limit and patience apply to the whole search.
+
+	Args:
+		instance (Instance): The problem instance of the data.
+		data (ProblemData): The problem data from `build_first_stage_data`.
+		stop (StagnationStop): The stopping criterion of the whole search.
+		seed (int): The seed of the first segment.
+		interval (float): The length of a segment, in seconds.
+		on_incumbent (IncumbentCallback): Called with the routes and the cost of the best solution after every segment
+			that improved it, if the solution is feasible.
+		initial_solutions (Sequence[Solution]): Solutions added to the initial population of the first segment.
 
 	Returns:
-		list[VehicleRoute]: A a list of `VehicleRoute` objects, each representing a route in a best-found solution.
+		tuple:
+			- best (Solution): The best solution found.
+			- iterations (int): The number of iterations of all segments.
 	"""
-	model = build_first_stage_model(instance)
-	solution = model.solve(stop=MaxRuntime(time_limit), seed=43)
-	routes = [
-	    calculate_detailed_route(instance, (model.locations[i]
-	                                        for i in route), route.start_time())
-	    for route in solution.best.routes()
+	neighbours = search_neighbours(instance)
+	initial = list(initial_solutions)
+	best_cost = math.inf
+	iterations = 0
+	while True:
+		segment_end = time.time() + interval
+		result = solve_model(data, lambda cost: stop(cost) or time.time() > segment_end, seed, initial,
+		                     neighbours=neighbours)
+		iterations += result.num_iterations
+		# The best solution of a segment is never worse than the one it started from
+		best = result.best
+		if best.is_feasible() and result.cost() < best_cost:
+			best_cost = result.cost()
+			print(f"PyVRP incumbent {best_cost / 10_000:.2f} after {time.time() - stop.start_time:.1f}s")
+			on_incumbent(extract_routes(instance, data, best), best_cost)
+		if stop.stopped:
+			return best, iterations
+		initial = [best]
+		seed += 1
+
+
+def solution_to_trips(solution: Solution) -> SolutionTrips:
+	"""Converts a solution to a picklable list of routes."""
+	return [(route.vehicle_type(), [trip.visits() for trip in route.trips()]) for route in solution.routes()]
+
+
+def solution_from_trips(data: ProblemData, routes: SolutionTrips) -> Solution:
+	"""Creates a solution from the routes produced by `solution_to_trips`."""
+	return Solution(data, [
+	    Route(data, [Trip(data, visits, vehicle_type) for visits in trips], vehicle_type)
+	    for vehicle_type, trips in routes
+	])
+
+
+def _route_locations(data: ProblemData, route: Route) -> Iterator[Client | Depot]:
+	"""Yields the visits of a route with the reload depot between every two trips. Iterating a route only yields its
+	clients."""
+	for index, trip in enumerate(route.trips()):
+		if index > 0:
+			yield data.location(trip.start_depot())
+		for client in trip.visits():
+			yield data.location(client)
+
+
+def extract_routes(instance: Instance, data: ProblemData, solution: Solution) -> list[VehicleRoute]:
+	"""Calculates the detailed vehicle routes of a PyVRP solution, including the reloads at the depot."""
+	return [
+	    calculate_detailed_route(instance, _route_locations(data, route), route.start_time())
+	    for route in solution.routes()
 	]
-	return routes
+
+
+def routes_from_trips(instance: Instance, trips: SolutionTrips) -> list[VehicleRoute]:
+	"""Calculates the detailed vehicle routes of a solution given as trips, for example restored from a file."""
+	data = build_first_stage_data(instance)
+	return extract_routes(instance, data, solution_from_trips(data, trips))
+
+
+@dataclass
+class VehicleSchedule:
+	"""A structure describing the best solution found by `build_vehicle_schedule`."""
+	routes: list[VehicleRoute]
+	trips: SolutionTrips  # The solution as PyVRP trips, for example to start another search from it
+	cost: float  # PyVRP cost of the solution, on the scale of the target, see `solution_cost`
+	stopped_early: bool  # Whether the search stopped on stagnation or its target before its time limit
+
+
+@dataclass
+class SeedResult:
+	"""A structure describing the outcome of a PyVRP search with one seed."""
+	seed: int
+	cost: float  # Infinite if no feasible solution was found
+	feasible: bool
+	stagnated: bool
+	runtime: float
+	iterations: int
+	improvements: list[tuple[float, float]]  # Wall-clock time and cost of every improvement
+	last_improvement: float  # Wall-clock time of the last improvement, or of the start if there was none
+	trips: SolutionTrips
+	routes: list[VehicleRoute]  # Empty if no feasible solution was found
+
+
+# Instance and problem data of a worker process, built once by `_init_worker`, and the flag shared by all workers
+# that is set once a search reaches the target cost
+_worker_instance: Instance | None = None
+_worker_data: ProblemData | None = None
+_worker_target_reached: Any = None
+
+
+def _init_worker(instance: Instance, target_reached: Any = None):
+	global _worker_instance, _worker_data, _worker_target_reached
+	_worker_instance = instance
+	_worker_data = build_first_stage_data(instance)
+	_worker_target_reached = target_reached
+
+
+def _solve_seed(seed: int, deadline: float, initial_trips: list[SolutionTrips], patience: float | None,
+                target: float | None, best_cost: float, last_improvement: float) -> SeedResult:
+	assert _worker_instance is not None and _worker_data is not None
+	data = _worker_data
+	initial_solutions = [solution_from_trips(data, trips) for trips in initial_trips]
+	target_reached = _worker_target_reached
+	cancelled = (lambda: target_reached.value != 0) if target_reached is not None else None
+	stop = StagnationStop(max(deadline - time.time(), 0.0), patience, cancelled, target, best_cost, last_improvement)
+	result = solve_model(data, stop, seed, initial_solutions, neighbours=search_neighbours(_worker_instance))
+	if stop.reached_target and target_reached is not None:
+		target_reached.value = 1
+	best = result.best
+	# Routes of an infeasible solution cannot be detailed, the caller falls back to its trips if no seed is feasible
+	routes = extract_routes(_worker_instance, data, best) if best.is_feasible() else []
+	return SeedResult(seed, result.cost(), best.is_feasible(), stop.stagnated, result.runtime, result.num_iterations,
+	                  stop.improvements, stop.last_improvement, solution_to_trips(best), routes)
+
+
+def solve_multi_seed(instance: Instance,
+                     time_limit: float,
+                     seeds: Sequence[int],
+                     exchange_interval: float | None = None,
+                     patience: float | None = None,
+                     initial_trips: SolutionTrips | None = None,
+                     target: float | None = None,
+                     on_incumbent: IncumbentCallback | None = None) -> list[SeedResult]:
+	"""
+	Runs independent PyVRP searches with different seeds in a process pool under a shared wall-clock deadline.
+
+	If `exchange_interval` is given, the searches are split into segments of that length. After each segment the best
+	solution found by any seed is added to the initial population of every search in the next segment. The seeds are
+	offset by the number of seeds in every segment, so that no segment repeats the random stream of an earlier one,
+	and the time of the last improvement of each search carries over, so that its patience spans all segments.
+
+	Args:
+		instance (Instance): The problem instance.
+		time_limit (float): The wall-clock time limit for all searches, in seconds.
+		seeds (Sequence[int]): The seeds; one process is used per seed.
+		exchange_interval (float | None): The interval between incumbent exchanges, in seconds.
+		patience (float | None): If given, a search stops when its best solution has not improved for this time, in
+			seconds. The searches end when all of them have stagnated.
+		initial_trips (SolutionTrips | None): A solution added to the initial population of every search.
+		target (float | None): If given, all searches end once one of them finds a solution costing at most this
+			value.
+		on_incumbent (IncumbentCallback | None): Called with the routes and the cost of the best solution of all seeds
+			after every segment that improved it, if the solution is feasible.
+
+	Returns:
+		list[SeedResult]: The result of each seed, in the order of `seeds`. Runtimes and iterations are summed over
+			all segments.
+	"""
+	start_time = time.time()
+	deadline = start_time + time_limit
+	results: list[SeedResult] = []
+	segment = 0
+	best_cost = math.inf
+	target_reached = multiprocessing.RawValue('b', 0) if target is not None else None
+	with ProcessPoolExecutor(len(seeds), initializer=_init_worker, initargs=(instance, target_reached)) as executor:
+		while True:
+			segment_end = deadline if exchange_interval is None else min(deadline, time.time() + exchange_interval)
+			if results:
+				best = min(results, key=lambda result: (not result.feasible, result.cost))
+				initial = [[best.trips, result.trips] for result in results]
+				costs = [result.cost for result in results]
+				last_improvements = [result.last_improvement for result in results]
+			else:
+				initial = [[initial_trips] if initial_trips is not None else [] for _ in seeds]
+				costs = [math.inf] * len(seeds)
+				last_improvements = [start_time] * len(seeds)
+			segment_seeds = [seed + segment * len(seeds) for seed in seeds]
+			segment += 1
+			previous = results
+			results = list(
+			    executor.map(_solve_seed, segment_seeds, [segment_end] * len(seeds), initial, [patience] * len(seeds),
+			                 [target] * len(seeds), costs, last_improvements))
+			for result, seed in zip(results, seeds):
+				result.seed = seed
+			for result, previous_result in zip(results, previous):
+				result.runtime += previous_result.runtime
+				result.iterations += previous_result.iterations
+				result.improvements = previous_result.improvements + result.improvements
+			best = min(results, key=lambda result: (not result.feasible, result.cost))
+			if on_incumbent is not None and best.feasible and best.cost < best_cost:
+				best_cost = best.cost
+				on_incumbent(best.routes, best.cost)
+			if segment_end >= deadline or all(result.stagnated for result in results):
+				return results
+			if target_reached is not None and target_reached.value:
+				return results
+
+
+def build_vehicle_schedule(instance: Instance,
+                           time_limit: float,
+                           num_seeds: int = 1,
+                           exchange_interval: float | None = None,
+                           patience: float | None = None,
+                           initial_trips: SolutionTrips | None = None,
+                           target: float | None = None,
+                           on_incumbent: IncumbentCallback | None = None,
+                           incumbent_interval: float | None = None) -> VehicleSchedule:
+	"""
+	Build and solves the PyVRP problem for the routing problem of vehicles only.
+
+	Args:
+		instance (Instance): The problem instance containing all necessary data for the problem.
+		time_limit (float): The maximum allowed runtime for solving the model, in seconds.
+		num_seeds (int): The number of independent searches with different seeds run in parallel processes. The best
+			solution among them is returned.
+		exchange_interval (float | None): If given, searches with several seeds exchange the incumbent solution at
+			this interval, in seconds.
+		patience (float | None): If given, the search stops once the best solution has not improved for this time, in
+			seconds.
+		initial_trips (SolutionTrips | None): A solution used as a starting point of the search, for example the trips
+			of an earlier `VehicleSchedule`.
+		target (float | None): If given, the search stops once the cost of the best solution is at most this value.
+		on_incumbent (IncumbentCallback | None): If given, called with the routes and the cost of new feasible
+			incumbents while the search runs. The search is split into segments of `incumbent_interval` seconds, at the
+			end of which the incumbent is passed on; with several seeds, incumbents are also exchanged at this interval.
+		incumbent_interval (float | None): The interval between incumbents passed to `on_incumbent`, in seconds.
+
+	Returns:
+		VehicleSchedule: The routes of a best-found solution with its trips and cost. With several seeds, the search
+			only stopped early if all of them stagnated or one reached `target`.
+	"""
+	if num_seeds == 1:
+		start_time = time.time()
+		with telemetry.phase('model_build'):
+			data = build_first_stage_data(instance)
+		build_time = time.time() - start_time
+		print(f"Built PyVRP problem data in {build_time:.2f}s")
+		initial_solutions = [solution_from_trips(data, initial_trips)] if initial_trips is not None else []
+		stop = StagnationStop(time_limit, patience, target=target)
+		with telemetry.phase('pyvrp_solve'):
+			if on_incumbent is not None and incumbent_interval is not None:
+				best, iterations = solve_segments(instance, data, stop, 43, incumbent_interval, on_incumbent,
+				                                  initial_solutions)
+			else:
+				result = solve_model(data, stop, 43, initial_solutions, display=True,
+				                     neighbours=search_neighbours(instance))
+				best, iterations = result.best, result.num_iterations
+		telemetry.record('pyvrp_iterations', iterations)
+		telemetry.add_curve('pyvrp', stop.improvements)
+		return VehicleSchedule(extract_routes(instance, data, best), solution_to_trips(best), solution_cost(best),
+		                       stop.stagnated or stop.reached_target)
+
+	if on_incumbent is not None and incumbent_interval is not None:
+		exchange_interval = min(exchange_interval or math.inf, incumbent_interval)
+	with telemetry.phase('pyvrp_solve'):
+		results = solve_multi_seed(instance, time_limit, [43 + i for i in range(num_seeds)], exchange_interval,
+		                           patience, initial_trips, target, on_incumbent)
+	for result in results:
+		print(f"Seed {result.seed}: cost {result.cost / 10_000:.2f}, feasible {result.feasible}, "
+		      f"{result.iterations} iterations in {result.runtime:.1f}s")
+	telemetry.record('pyvrp_seeds', [{
+	    'seed': result.seed,
+	    'cost': result.cost,
+	    'feasible': result.feasible,
+	    'iterations': result.iterations,
+	    'runtime': result.runtime
+	} for result in results])
+	telemetry.record('pyvrp_iterations', sum(result.iterations for result in results))
+	best = min(results, key=lambda result: (not result.feasible, result.cost))
+	telemetry.add_curve('pyvrp', best.improvements)
+	stopped_early = all(result.stagnated for result in results) or (target is not None and best.cost <= target)
+	routes = best.routes if best.feasible else routes_from_trips(instance, best.trips)
+	return VehicleSchedule(routes, best.trips, best.cost, stopped_early)
@@ -0,0 +1,116 @@
+import fcntl
+import sqlite3
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+# Time a writer waits for another process holding the database lock, in seconds
+BUSY_TIMEOUT = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    instance TEXT NOT NULL,
+    finished REAL NOT NULL,
+    time_limit REAL,
+    loader_cost REAL NOT NULL,
+    total_cost REAL NOT NULL,
+    vehicle_gap REAL,
+    loader_gap REAL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    start REAL NOT NULL,
+    wall_time REAL NOT NULL,
+    cpu_time REAL NOT NULL,
+    peak_rss_growth INTEGER NOT NULL
+);
+"""
+
+
+def append_csv(results_path: Path, rows: Iterable[list[str | float]]):
+	"""Appends rows to a results CSV file under an exclusive lock, so rows of concurrent processes are not
+	interleaved."""
+	text = ''.join(','.join(str(value) for value in row) + '\n' for row in rows)
+	with open(results_path, 'a') as f:
+		fcntl.flock(f, fcntl.LOCK_EX)
+		f.write(text)
+		f.flush()
+
+
+class ResultsStore:
+	"""
+	An SQLite database of the results of runs with the timings of their phases, safe for concurrent writers.
+
+	Every run is one row of `runs` with the costs of the results CSV, and every phase measured by `telemetry` is one
+	row of `phases` referencing it. A run is written in a single transaction, so readers never see a run without its
+	phases.
+
+	Args:
+		path (Path): The path of the database file, created if it does not exist.
+	"""
+
+	def __init__(self, path: Path):
+		self.path = path
+
+	def _connect(self) -> sqlite3.Connection:
+		connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+		connection.executescript(SCHEMA)
+		return connection
+
+	def append(self,
+	           instance_name: str,
+	           row: list[str | float],
+	           phases: list[dict[str, Any]],
+	           time_limit: float | None = None) -> int:
+		"""
+		Records a run.
+
+		Args:
+			instance_name (str): The name of the instance.
+			row (list[str | float]): The row returned by `main.save_results`, with the gaps if they were computed.
+			phases (list[dict[str, Any]]): The phases of the run as measured by `telemetry.phase`.
+			time_limit (float | None): The time limit of the run, in seconds.
+
+		Returns:
+			int: The ID of the run.
+		"""
+		gaps = row[3:5] if len(row) >= 5 else [None, None]
+		connection = self._connect()
+		try:
+			connection.execute('BEGIN IMMEDIATE')
+			cursor = connection.execute(
+			    'INSERT INTO runs (instance, finished, time_limit, loader_cost, total_cost, vehicle_gap, '
+			    'loader_gap) VALUES (?, ?, ?, ?, ?, ?, ?)', (instance_name, time.time(), time_limit, row[1], row[2], *gaps))
+			run_id = cursor.lastrowid
+			assert run_id is not None
+			connection.executemany(
+			    'INSERT INTO phases (run_id, name, start, wall_time, cpu_time, peak_rss_growth) VALUES (?, ?, ?, ?, ?, ?)',
+			    [(run_id, phase['name'], phase['start'], phase['wall_time'], phase['cpu_time'], phase['peak_rss_growth'])
+			     for phase in phases])
+			connection.execute('COMMIT')
+		except BaseException:
+			if connection.in_transaction:
+				connection.execute('ROLLBACK')
+			raise
+		finally:
+			connection.close()
+		return run_id
+
+	def runs(self) -> list[dict[str, Any]]:
+		"""Returns all runs, each with the total wall time of every phase name."""
+		connection = self._connect()
+		connection.row_factory = sqlite3.Row
+		try:
+			runs = [dict(run) for run in connection.execute('SELECT * FROM runs ORDER BY id')]
+			for run in runs:
+				run['phases'] = {
+				    name: wall_time for name, wall_time in connection.execute(
+				        'SELECT name, SUM(wall_time) FROM phases WHERE run_id = ? GROUP BY name ORDER BY MIN(start)',
+				        (run['id'],))
+				}
+		finally:
+			connection.close()
+		return runs
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, TextIO
+
+import export_solution
+import loader_heuristic
+import main as solver
+from instance import Instance
+
+
+class InstanceCache:
+	"""
+	Keeps the most recently used preprocessed instances in memory.
+
+	Entries are keyed by the resolved path, the modification time and size of the file, and the options that select
+	the instance representation, so an edited file or a request for another representation is loaded again.
+
+	Args:
+		max_instances (int): The number of instances kept in memory.
+	"""
+
+	def __init__(self, max_instances: int):
+		self.max_instances = max_instances
+		self._instances: OrderedDict[tuple[Any, ...], Instance] = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, input_path: Path, args: argparse.Namespace) -> tuple[Instance, bool]:
+		"""Returns the instance for the given file and options, and whether it was cached."""
+		stat = input_path.stat()
+		key = (str(input_path.resolve()), stat.st_mtime_ns, stat.st_size, args.compact, args.neighbours, args.cache_dir)
+		instance = self._instances.get(key)
+		if instance is not None:
+			self._instances.move_to_end(key)
+			self.hits += 1
+			return instance, True
+		self.misses += 1
+		instance = solver.load_instance(input_path, args)
+		self._instances[key] = instance
+		if len(self._instances) > self.max_instances:
+			self._instances.popitem(last=False)
+		return instance, False
+
+
+def request_arguments(defaults: argparse.Namespace, options: dict[str, Any]) -> argparse.Namespace:
+	"""Returns the solver options of a request: the defaults of the service overridden by the request options, whose
+	names are the option destinations such as `time` or `vehicle_seeds`."""
+	unknown = set(options) - set(vars(defaults))
+	if unknown:
+		raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+	return argparse.Namespace(**{**vars(defaults), **options})
+
+
+def handle_request(request: dict[str, Any], defaults: argparse.Namespace, cache: InstanceCache) -> dict[str, Any]:
+	"""
+	Solves one request and returns the response.
+
+	Args:
+		request (dict[str, Any]): The request with the path of the instance file in `instance`, and optionally an `id`
+			echoed in the response and solver `options` overriding the defaults of the service.
+		defaults (argparse.Namespace): The solver options of the service.
+		cache (InstanceCache): The cache of preprocessed instances.
+
+	Returns:
+		dict[str, Any]: The response with the costs and the solution.
+	"""
+	args = request_arguments(defaults, request.get('options', {}))
+	input_path = Path(request['instance'])
+	start_time = time.time()
+	instance, cached = cache.get(input_path, args)
+	load_time = time.time() - start_time
+	row = solver.solve_instance(input_path, args, instance=instance)
+	solution = export_solution.read_solution(
+	    Path(args.output) / export_solution.solution_file_name(input_path.stem, args.solution_format))
+	return {
+	    'instance': input_path.stem,
+	    'loader_cost': row[1],
+	    'total_cost': row[2],
+	    'cached': cached,
+	    'load_time': load_time,
+	    'solve_time': time.time() - start_time - load_time,
+	    'solution': solution,
+	}
+
+
+def serve(requests: TextIO, responses: TextIO, defaults: argparse.Namespace, cache: InstanceCache):
+	"""Answers JSON requests read line by line until the end of the input, writing one JSON response per line as soon
+	as each request is solved."""
+	for line in requests:
+		if not line.strip():
+			continue
+		request_id = None
+		try:
+			request = json.loads(line)
+			request_id = request.get('id')
+			response = {'id': request_id, 'status': 'ok', **handle_request(request, defaults, cache)}
+		except Exception as e:
+			traceback.print_exc()
+			response = {'id': request_id, 'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+		print(json.dumps(response), file=responses, flush=True)
+
+
+def main():
+	parser = argparse.ArgumentParser(
+	    description="Solve instances requested as JSON lines on standard input, keeping the libraries loaded and "
+	    "preprocessed instances cached between requests.")
+	parser.add_argument("--max-instances",
+	                    type=int,
+	                    default=8,
+	                    help="Number of preprocessed instances kept in memory (default: 8).")
+	solver.add_solver_arguments(parser)
+	defaults = parser.parse_args()
+	cache = InstanceCache(defaults.max_instances)
+	del defaults.max_instances
+
+	# Import Nevergrad now rather than during the first request
+	loader_heuristic.import_nevergrad()
+
+	# Responses use the original standard output. Everything else printed by the solver, including its worker
+	# processes and native code, goes to standard error.
+	responses = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+	sys.stdout.flush()
+	os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+	print("Solver service ready", file=sys.stderr, flush=True)
+	serve(sys.stdin, responses, defaults, cache)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,306 @@
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+import export_solution
+from instance import Instance, LazyMatrix, Matrix
+
+# Checks of `SolutionValidator.validate`, each counted per solution
+CHECKS = (
+    'unknown_orders',  # Route entries that are not order IDs of the instance
+    'route_ends',  # Vehicle routes not starting and ending at the depot
+    'time_count',  # Vehicle routes whose number of times differs from their number of orders
+    'missing_orders',  # Required orders not visited by any vehicle
+    'repeated_orders',  # Extra visits of orders visited more than once
+    'capacity',  # Trips carrying more than the vehicle capacity
+    'time_windows',  # Visits outside the time window of their order
+    'travel_times',  # Visits starting before the vehicle can arrive from the previous order
+    'vehicle_shifts',  # Vehicle routes longer than the vehicle shift
+    'loader_coverage',  # Visited orders whose number of loader visits differs from their loader count
+    'loader_travel',  # Loader visits starting before the loader can arrive from its previous job
+    'loader_shifts',  # Loader routes longer than the loader shift
+)
+
+
+@dataclass
+class ValidationResult:
+	"""The checks and objectives of a batch of solutions, as arrays indexed like the solutions."""
+	violations: dict[str, np.ndarray] = field(repr=False)  # Violations of every check in `CHECKS`
+	vehicle_objective: np.ndarray  # As `objective.calculate_vehicle_objective`
+	loader_objective: np.ndarray  # As `objective.calculate_loader_objective`
+	loader_objective_wrong: np.ndarray  # As `objective.calculate_loader_objective_wrong`
+
+	@property
+	def feasible(self) -> np.ndarray:
+		return sum(self.violations.values()) == 0
+
+	def solution(self, index: int) -> dict[str, Any]:
+		"""Returns the result of one solution, with the checks that failed."""
+		return {
+		    'feasible': bool(self.feasible[index]),
+		    'violations': {name: int(counts[index]) for name, counts in self.violations.items() if counts[index]},
+		    'vehicle_objective': int(self.vehicle_objective[index]),
+		    'loader_objective': int(self.loader_objective[index]),
+		    'loader_objective_wrong': int(self.loader_objective_wrong[index]),
+		}
+
+
+def _pairs(matrix: Matrix | np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+	"""Returns the entries `matrix[rows[k]][cols[k]]` as an int64 array."""
+	if isinstance(matrix, LazyMatrix):
+		return matrix.pairs(rows, cols)
+	assert isinstance(matrix, np.ndarray)
+	return matrix[rows, cols].astype(np.int64)
+
+
+def _run_bounds(groups: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+	"""Returns the first and last index of every run of equal values in a sorted array."""
+	if len(groups) == 0:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+	ends = np.r_[starts[1:] - 1, len(groups) - 1]
+	return starts, ends
+
+
+class SolutionValidator:
+	"""
+	Checks solutions in the format of `export_solution` and computes their objectives, batched over many solutions.
+
+	The instance data is copied into arrays once, and all routes of a batch are flattened into arrays of visits, so
+	every check is a handful of array operations over the whole batch regardless of the number of solutions. Times of
+	the solution files are the start times of the visits, so a loader job starts at the time of the vehicle visit of
+	its order, the shift of a vehicle route is measured from the latest departure that reaches its first order in
+	time, and a vehicle reloads at the depot visits written between its trips. Objectives of solutions that fail a check
+	are computed as they are.
+
+	Args:
+		instance (Instance): The problem instance of the solutions.
+	"""
+
+	def __init__(self, instance: Instance):
+		self.instance = instance
+		orders = instance.orders
+		self.num_nodes = len(orders) + 1
+		max_id = max((order.id for order in orders), default=0)
+		# Index 0 is the depot, unknown IDs map to -1
+		self.inner_by_id = np.full(max_id + 1, -1, dtype=np.int64)
+		self.inner_by_id[0] = 0
+		for order in orders:
+			self.inner_by_id[order.id] = order.inner_id
+
+		def node_array(values: list[int]) -> np.ndarray:
+			return np.array([0] + values, dtype=np.int64)
+
+		self.volume = node_array([order.volume for order in orders])
+		self.early = node_array([order.time_window[0] for order in orders])
+		self.late = node_array([order.time_window[1] for order in orders])
+		self.vehicle_service = node_array([order.vehicle_service_time for order in orders])
+		self.loader_service = node_array([order.loader_service_time for order in orders])
+		self.loader_cnt = node_array([order.loader_cnt for order in orders])
+		self.optional = node_array([order.optional for order in orders]).astype(bool)
+		self.required = ~self.optional
+		self.required[0] = False
+		# `calculate_loader_objective_wrong` reads the service time of the order at position `id - 1`
+		self.loader_service_by_position = np.array([order.loader_service_time for order in orders], dtype=np.int64)
+
+		self.distances, self.vehicle_times, self.loader_times = (
+		    matrix if isinstance(matrix, LazyMatrix) else np.asarray(matrix)
+		    for matrix in (instance.distances, instance.vehicle_times, instance.loader_times))
+
+	def _inner_ids(self, ids: np.ndarray) -> np.ndarray:
+		inside = (ids >= 0) & (ids < len(self.inner_by_id))
+		return np.where(inside, self.inner_by_id[np.where(inside, ids, 0)], -1)
+
+	def validate(self, solutions: list[dict[str, Any]]) -> ValidationResult:
+		"""
+		Checks a batch of solutions and computes their objectives.
+
+		Args:
+			solutions (list[dict[str, Any]]): Solutions as read from the files written by `export_solution`.
+
+		Returns:
+			ValidationResult: The violations of every check and the objectives of every solution.
+		"""
+		instance = self.instance
+		weights = instance.weights
+		num_solutions = len(solutions)
+		violations = {name: np.zeros(num_solutions, dtype=np.int64) for name in CHECKS}
+
+		def count(name: str, solution_of_violation: np.ndarray):
+			violations[name] += np.bincount(solution_of_violation, minlength=num_solutions)
+
+		# Flatten the vehicle routes. Times of routes with the wrong number of times are padded with NaN, which fails
+		# every time check.
+		nodes: list[int] = []
+		route_lengths: list[int] = []
+		route_solutions: list[int] = []
+		times: list[float] = []
+		loader_nodes: list[int] = []
+		loader_lengths: list[int] = []
+		loader_solutions: list[int] = []
+		time_count_solutions: list[int] = []
+		for index, solution in enumerate(solutions):
+			for vehicle in solution['vehicles']:
+				route = vehicle['route']
+				nodes.extend(route)
+				route_lengths.append(len(route))
+				route_solutions.append(index)
+				route_times = vehicle['time']
+				num_visits = len(route) - route.count(0)
+				if len(route_times) != num_visits:
+					time_count_solutions.append(index)
+					route_times = (route_times + [np.nan] * num_visits)[:num_visits]
+				times.extend(route_times)
+			for loader in solution['loaders']:
+				loader_nodes.extend(loader['route'])
+				loader_lengths.append(len(loader['route']))
+				loader_solutions.append(index)
+		count('time_count', np.array(time_count_solutions, dtype=np.int64))
+
+		node_ids = np.array(nodes, dtype=np.int64)
+		route_solution = np.array(route_solutions, dtype=np.int64)
+		route_length = np.array(route_lengths, dtype=np.int64)
+		node_route = np.repeat(np.arange(len(route_length)), route_length)
+		node_inner = self._inner_ids(node_ids)
+		count('unknown_orders', route_solution[node_route[node_inner < 0]])
+		node_inner[node_inner < 0] = 0
+		nonempty = route_length > 0
+		route_start = np.cumsum(route_length) - route_length
+		bad_ends = nonempty.copy()
+		bad_ends[nonempty] = ((node_inner[route_start[nonempty]] != 0) |
+		                      (node_inner[route_start[nonempty] + route_length[nonempty] - 1] != 0))
+		count('route_ends', route_solution[bad_ends])
+
+		# Vehicle objective: distance along the routes, salaries and penalties of unvisited optional orders
+		same_route = node_route[1:] == node_route[:-1]
+		edge_from = node_inner[:-1][same_route]
+		edge_to = node_inner[1:][same_route]
+		edge_cost = _pairs(self.distances, edge_from, edge_to) * weights.fuel_cost
+		vehicle_objective = np.bincount(route_solution[node_route[:-1][same_route]],
+		                                weights=edge_cost,
+		                                minlength=num_solutions).astype(np.int64)
+		vehicle_objective += np.bincount(route_solution, minlength=num_solutions) * weights.vehicle_salary
+
+		# Visits of every order by every solution
+		is_visit = node_inner != 0
+		visit_inner = node_inner[is_visit]
+		visit_route = node_route[is_visit]
+		visit_solution = route_solution[visit_route]
+		visit_time = np.rint(np.array(times, dtype=np.float64) * 100)  # Solution files divide times by 100
+		visit_counts = np.bincount(visit_solution * self.num_nodes + visit_inner,
+		                           minlength=num_solutions * self.num_nodes).reshape(num_solutions, self.num_nodes)
+		unvisited = visit_counts == 0
+		vehicle_objective += (unvisited & self.optional).sum(axis=1) * weights.optional_order_penalty
+		violations['missing_orders'] += (unvisited & self.required).sum(axis=1)
+		violations['repeated_orders'] += np.maximum(visit_counts - 1, 0).sum(axis=1)
+
+		# Time windows, and travel times between consecutive visits of a route, through the depot if it is visited in
+		# between. NaN times fail the comparisons.
+		in_window = (visit_time >= self.early[visit_inner]) & (visit_time <= self.late[visit_inner])
+		count('time_windows', visit_solution[~in_window])
+		visit_position = np.flatnonzero(is_visit)
+		follows = visit_route[1:] == visit_route[:-1]
+		previous, following = visit_inner[:-1][follows], visit_inner[1:][follows]
+		direct = (visit_position[1:] - visit_position[:-1] == 1)[follows]
+		finish = visit_time[:-1][follows] + self.vehicle_service[previous]
+		direct_ready = finish + _pairs(self.vehicle_times, previous, following)
+		reload_ready = (finish + _pairs(self.vehicle_times, previous, np.zeros_like(previous)) +
+		                instance.depot.load_time + _pairs(self.vehicle_times, np.zeros_like(following), following))
+		ready = np.where(direct, direct_ready, reload_ready)
+		count('travel_times', visit_solution[1:][follows][~(visit_time[1:][follows] >= ready)])
+
+		# Capacity of every trip, a new trip starts after every depot visit within a route
+		new_trip = np.ones(len(visit_inner), dtype=bool)
+		new_trip[1:][follows] = ~direct
+		visit_trip = np.cumsum(new_trip) - 1
+		trip_load = np.bincount(visit_trip, weights=self.volume[visit_inner])
+		trip_solution = np.zeros(len(trip_load), dtype=np.int64)
+		trip_solution[visit_trip] = visit_solution
+		count('capacity', trip_solution[trip_load > instance.vehicle_capacity])
+		first_visit, last_visit = _run_bounds(visit_route)
+		first_inner, last_inner = visit_inner[first_visit], visit_inner[last_visit]
+		departure = visit_time[first_visit] - _pairs(self.vehicle_times, np.zeros_like(first_inner), first_inner)
+		arrival = (visit_time[last_visit] + self.vehicle_service[last_inner] +
+		           _pairs(self.vehicle_times, last_inner, np.zeros_like(last_inner)))
+		count('vehicle_shifts', visit_solution[first_visit][~(arrival - departure <= instance.vehicle_shift_size)])
+
+		# Loaders start every job at the time of the vehicle visit of its order
+		loader_solution = np.array(loader_solutions, dtype=np.int64)
+		loader_length = np.array(loader_lengths, dtype=np.int64)
+		job_loader = np.repeat(np.arange(len(loader_length)), loader_length)
+		job_ids = np.array(loader_nodes, dtype=np.int64)
+		job_inner = self._inner_ids(job_ids)
+		job_solution = loader_solution[job_loader]
+		count('unknown_orders', job_solution[job_inner <= 0])
+		job_inner[job_inner < 0] = 0
+		start_times = np.full(num_solutions * self.num_nodes, np.nan)
+		start_times[visit_solution * self.num_nodes + visit_inner] = visit_time
+		job_time = start_times[job_solution * self.num_nodes + job_inner]
+		job_counts = np.bincount(job_solution * self.num_nodes + job_inner,
+		                         minlength=num_solutions * self.num_nodes).reshape(num_solutions, self.num_nodes)
+		needed = np.where(unvisited, 0, self.loader_cnt)
+		needed[:, 0] = job_counts[:, 0]  # Unknown IDs are counted above
+		violations['loader_coverage'] += (job_counts != needed).sum(axis=1)
+
+		follows = job_loader[1:] == job_loader[:-1]
+		previous, following = job_inner[:-1][follows], job_inner[1:][follows]
+		ready = job_time[:-1][follows] + self.loader_service[previous] + _pairs(self.loader_times, previous, following)
+		count('loader_travel', job_solution[1:][follows][~(job_time[1:][follows] >= ready)])
+		first_job, last_job = _run_bounds(job_loader)
+		first_inner, last_inner = job_inner[first_job], job_inner[last_job]
+		shift_length = (job_time[last_job] + self.loader_service[last_inner] +
+		                _pairs(self.loader_times, last_inner, first_inner) - job_time[first_job])
+		shift_solution = job_solution[first_job]
+		count('loader_shifts', shift_solution[~(shift_length <= instance.loader_shift_size)])
+		shift_length = np.nan_to_num(shift_length).astype(np.int64)
+		loader_objective = np.bincount(shift_solution,
+		                               weights=shift_length * weights.loader_work + weights.loader_salary,
+		                               minlength=num_solutions).astype(np.int64)
+		first_service = self.loader_service_by_position[np.clip(job_ids[first_job] - 1, 0, None)]
+		loader_objective_wrong = np.bincount(shift_solution,
+		                                     weights=first_service * weights.loader_work + weights.loader_salary,
+		                                     minlength=num_solutions).astype(np.int64)
+		return ValidationResult(violations, vehicle_objective, loader_objective, loader_objective_wrong)
+
+
+def load_solutions(paths: list[Path]) -> list[dict[str, Any]]:
+	"""Reads solution files written by `export_solution` in any format."""
+	return [export_solution.read_solution(path) for path in paths]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Check solution files of an instance and compute their objectives.")
+	parser.add_argument("instance", type=str, help="Path to the instance JSON file.")
+	parser.add_argument("solutions", type=str, nargs='+', help="Solution files written by main.py.")
+	parser.add_argument("-b",
+	                    "--batch-size",
+	                    type=int,
+	                    default=1000,
+	                    help="Number of solutions checked at once (default: 1000).")
+	args = parser.parse_args()
+
+	instance = Instance.from_json(Path(args.instance), compact=True)
+	validator = SolutionValidator(instance)
+	paths = [Path(path) for path in args.solutions]
+	print("solution,feasible,violations,vehicle_cost,loader_cost,validator_loader_cost")
+	start_time = time.time()
+	for start in range(0, len(paths), args.batch_size):
+		batch = paths[start:start + args.batch_size]
+		result = validator.validate(load_solutions(batch))
+		for index, path in enumerate(batch):
+			checks = result.solution(index)
+			failed = ' '.join(f'{name}={number}' for name, number in checks['violations'].items())
+			print(path.name, checks['feasible'], failed, checks['vehicle_objective'] / 10_000,
+			      checks['loader_objective'] / 10_000, checks['loader_objective_wrong'] / 10_000, sep=',')
+	elapsed = time.time() - start_time
+	print(f"Checked {len(paths)} solutions in {elapsed:.2f}s ({len(paths) / max(elapsed, 1e-9):.1f}/s)",
+	      file=sys.stderr)
+
+
+if __name__ == "__main__":
+	main()
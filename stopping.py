@@ -0,0 +1,63 @@
+import math
+import time
+from collections.abc import Callable
+
+
+class StagnationStop:
+	"""
+	A stopping criterion that stops after a maximum runtime or when the best value has not improved for a given time.
+
+	It can be passed to PyVRP as a stopping criterion and is called with the best found value by the loader optimizers.
+	Stagnation is only detected once a finite value has been found, so a search is not stopped before it has found a
+	feasible solution.
+
+	Args:
+		max_runtime (float): The maximum runtime in seconds.
+		patience (float | None): The time in seconds without improvement after which the search is stopped. Stagnation
+			is not detected if None.
+		cancelled (Callable[[], bool] | None): If given, the search is stopped as soon as this returns True.
+		target (float | None): If given, the search is stopped once the best value is at most this value, for example
+			when it is provably within a gap of the optimum.
+		best (float): The best value of an earlier search that this one continues.
+		last_improvement (float | None): The wall-clock time of the last improvement of an earlier search that this
+			one continues, so that its patience carries over. The start time of this criterion if None.
+	"""
+
+	def __init__(self,
+	             max_runtime: float,
+	             patience: float | None = None,
+	             cancelled: Callable[[], bool] | None = None,
+	             target: float | None = None,
+	             best: float = math.inf,
+	             last_improvement: float | None = None):
+		self.max_runtime = max_runtime
+		self.patience = patience
+		self.cancelled = cancelled
+		self.target = target
+		self.start_time = time.time()
+		self.best = best
+		self.last_improvement = last_improvement if last_improvement is not None else self.start_time
+		self.stagnated = False
+		self.reached_target = False
+		self.stopped = False  # Whether the criterion has returned True
+		self.improvements: list[tuple[float, float]] = []  # Wall-clock time and value of every improvement
+
+	def __call__(self, best_value: float) -> bool:
+		self.stopped = self._should_stop(best_value)
+		return self.stopped
+
+	def _should_stop(self, best_value: float) -> bool:
+		now = time.time()
+		if best_value < self.best:
+			self.best = best_value
+			self.last_improvement = now
+			self.improvements.append((now, best_value))
+		if self.target is not None and self.best <= self.target:
+			self.reached_target = True
+			return True
+		if self.patience is not None and self.best < math.inf and now - self.last_improvement > self.patience:
+			self.stagnated = True
+			return True
+		if self.cancelled is not None and self.cancelled():
+			return True
+		return now - self.start_time > self.max_runtime
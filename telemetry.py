@@ -0,0 +1,97 @@
+import contextlib
+import cProfile
+import json
+import resource
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+
+class Telemetry:
+	"""Collects timings of the solver phases, solver metrics and incumbent objective curves of one run."""
+
+	def __init__(self):
+		self.start_time = time.time()
+		self.phases: list[dict[str, Any]] = []
+		self.metrics: dict[str, Any] = {}
+		self.curves: dict[str, list[tuple[float, float]]] = {}
+
+	@contextlib.contextmanager
+	def phase(self, name: str) -> Iterator[None]:
+		"""Measures the wall and CPU time of a phase and how much it raised the peak memory of the process. The peak
+		resident set size only grows over the life of the process, so a phase that stays below an earlier peak records
+		no growth. Memory of worker processes is not included."""
+		wall_start = time.time()
+		cpu_start = time.process_time()
+		rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		try:
+			yield
+		finally:
+			self.phases.append({
+			    'name': name,
+			    'start': wall_start - self.start_time,
+			    'wall_time': time.time() - wall_start,
+			    'cpu_time': time.process_time() - cpu_start,
+			    'peak_rss_growth': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_start) * 1024,
+			})
+
+	def add_curve(self, name: str, points: Iterable[tuple[float, float]]):
+		"""Adds points given as wall-clock time and objective value to a curve."""
+		self.curves.setdefault(name, []).extend((timestamp - self.start_time, value) for timestamp, value in points)
+
+	def to_dict(self) -> dict[str, Any]:
+		return {'phases': self.phases, 'metrics': self.metrics, 'curves': self.curves}
+
+
+_current = Telemetry()
+
+
+def start_run() -> Telemetry:
+	"""Starts collecting telemetry of a new run."""
+	global _current
+	_current = Telemetry()
+	return _current
+
+
+def phase(name: str):
+	"""Measures a phase of the current run."""
+	return _current.phase(name)
+
+
+def record(name: str, value: Any):
+	"""Records a metric of the current run."""
+	_current.metrics[name] = value
+
+
+def add_curve(name: str, points: Iterable[tuple[float, float]]):
+	"""Adds points to an incumbent objective curve of the current run."""
+	_current.add_curve(name, points)
+
+
+def phases() -> list[dict[str, Any]]:
+	"""Returns the phases measured so far in the current run."""
+	return _current.phases
+
+
+def write_metrics(path: Path, **metadata: Any):
+	"""Writes the telemetry of the current run to a JSON file."""
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with open(path, 'w') as f:
+		json.dump(metadata | _current.to_dict(), f, indent=4)
+
+
+@contextlib.contextmanager
+def profile(path: Path | None) -> Iterator[None]:
+	"""Profiles the enclosed code with cProfile and writes the statistics to `path`. Does nothing if `path` is None."""
+	if path is None:
+		yield
+		return
+	profiler = cProfile.Profile()
+	profiler.enable()
+	try:
+		yield
+	finally:
+		profiler.disable()
+		path.parent.mkdir(parents=True, exist_ok=True)
+		profiler.dump_stats(path)
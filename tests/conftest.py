@@ -0,0 +1,39 @@
+import argparse
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import instance_generator  # noqa: E402
+import main  # noqa: E402
+import pyvrp_model  # noqa: E402
+from instance import Instance  # noqa: E402
+
+# Orders of the generated test instance. Its vehicle capacity makes most vehicles reload several times.
+NUM_ORDERS = 60
+
+
+@pytest.fixture(scope='session')
+def instance_path(tmp_path_factory) -> Path:
+	path = tmp_path_factory.mktemp('instances') / 'generated.json'
+	instance_generator.write_instance(path, NUM_ORDERS)
+	return path
+
+
+@pytest.fixture(scope='session')
+def instance(instance_path) -> Instance:
+	return Instance.from_json(instance_path)
+
+
+@pytest.fixture(scope='session')
+def vehicle_schedule(instance) -> pyvrp_model.VehicleSchedule:
+	return pyvrp_model.build_vehicle_schedule(instance, 1.0)
+
+
+def solver_args(*options: str) -> argparse.Namespace:
+	"""Parses the options of `main.py` for a run with the given options."""
+	parser = argparse.ArgumentParser()
+	main.add_solver_arguments(parser)
+	return parser.parse_args(list(options))
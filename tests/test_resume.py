@@ -0,0 +1,45 @@
+import dataclasses
+
+import checkpoint
+import export_solution
+import loader_schedule
+import main
+import objective
+import solution_validator
+from conftest import solver_args
+
+
+def _write_checkpoint(instance, vehicle_schedule, directory):
+	"""Writes the checkpoint a run leaves behind when it is killed in the loader stage."""
+	incumbent = checkpoint.Checkpoint(instance, directory, 'generated', interval=0.0)
+	routes = vehicle_schedule.routes
+	incumbent.set_vehicle_routes(routes, vehicle_schedule.trips, objective.calculate_vehicle_objective(instance, routes),
+	                             vehicle_schedule.cost, 1.0)
+	jobs = loader_schedule.collect_loader_jobs(instance, (route.clients for route in routes))
+	jobs.sort(key=lambda job: job.earliest_time)
+	incumbent.offer(loader_schedule.build_loader_schedule(instance, jobs, loader_schedule.select_job_next))
+
+
+def test_resumed_solution_is_valid(instance_path, instance, vehicle_schedule, tmp_path):
+	_write_checkpoint(instance, vehicle_schedule, tmp_path)
+	main.solve_instance(instance_path, solver_args('-t', '3', '-o', str(tmp_path), '--resume'))
+
+	solution = export_solution.read_solution(tmp_path / export_solution.solution_file_name('generated'))
+	result = solution_validator.SolutionValidator(instance).validate([solution])
+	assert result.feasible[0], result.solution(0)
+	assert solution['vehicles'] == export_solution.solution_to_dict(vehicle_schedule.routes, [])['vehicles']
+	assert not checkpoint.checkpoint_path(tmp_path, 'generated').exists()
+
+
+def test_checkpoint_restores_trips(instance, vehicle_schedule, tmp_path):
+	_write_checkpoint(instance, vehicle_schedule, tmp_path)
+	state = checkpoint.load_checkpoint(tmp_path, 'generated')
+	assert state is not None
+	assert state.vehicle_trips == [(vehicle_type, [list(trip) for trip in trips])
+	                               for vehicle_type, trips in vehicle_schedule.trips]
+	assert checkpoint.same_vehicle_visits(state, vehicle_schedule.routes)
+
+	route = vehicle_schedule.routes[0]
+	order_id, arrival_time = route.clients[-1]
+	moved = dataclasses.replace(route, clients=route.clients[:-1] + [(order_id, arrival_time + 100)])
+	assert not checkpoint.same_vehicle_visits(state, [moved] + vehicle_schedule.routes[1:])
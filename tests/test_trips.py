@@ -0,0 +1,43 @@
+import export_solution
+import pyvrp_model
+import solution_validator
+import warm_start
+
+
+def _route_ids(routes: list[pyvrp_model.VehicleRoute]) -> list[list[int]]:
+	return [vehicle['route'] for vehicle in export_solution.solution_to_dict(routes, [])['vehicles']]
+
+
+def _normalized(trips: pyvrp_model.SolutionTrips) -> pyvrp_model.SolutionTrips:
+	return [(vehicle_type, [list(trip) for trip in route_trips]) for vehicle_type, route_trips in trips]
+
+
+def test_schedule_has_reloads(vehicle_schedule):
+	assert sum(len(trips) for _, trips in vehicle_schedule.trips) > len(vehicle_schedule.routes)
+
+
+def test_exported_routes_keep_trips(instance, vehicle_schedule):
+	trips = warm_start.vehicle_trips_from_routes(instance, _route_ids(vehicle_schedule.routes))
+	assert _normalized(trips) == _normalized(vehicle_schedule.trips)
+
+
+def test_routes_from_trips_restore_routes(instance, vehicle_schedule):
+	assert pyvrp_model.routes_from_trips(instance, vehicle_schedule.trips) == vehicle_schedule.routes
+
+
+def test_routes_without_reloads_are_split_by_capacity(instance, vehicle_schedule):
+	routes = [[order_id for order_id in route if order_id != 0] for route in _route_ids(vehicle_schedule.routes)]
+	trips = warm_start.vehicle_trips_from_routes(instance, routes)
+	for (_, route_trips), route in zip(trips, routes):
+		assert [instance.orders[inner_id - 1].id for trip in route_trips for inner_id in trip] == route
+		for trip in route_trips:
+			assert sum(instance.orders[inner_id - 1].volume for inner_id in trip) <= instance.vehicle_capacity
+
+
+def test_validator_accepts_reloads(instance, vehicle_schedule):
+	validator = solution_validator.SolutionValidator(instance)
+	solution = export_solution.solution_to_dict(vehicle_schedule.routes, [])
+	result = validator.validate([solution])
+	for name in ('capacity', 'travel_times', 'time_windows', 'vehicle_shifts', 'missing_orders'):
+		assert result.violations[name][0] == 0, name
+	assert result.vehicle_objective[0] == vehicle_schedule.cost
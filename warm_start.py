@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+import export_solution
+from instance import Instance
+from loader_schedule import LoaderJob
+from pyvrp_model import SolutionTrips
+
+
+@dataclass
+class WarmStart:
+	"""A structure holding a previous solution in the form used to initialize both stages."""
+	vehicle_trips: SolutionTrips
+	loader_routes: list[list[int]]  # Order IDs of each loader route as written by `export_solution`
+
+
+def vehicle_trips_from_routes(instance: Instance, vehicle_routes: list[list[int]]) -> SolutionTrips:
+	"""
+	Converts vehicle routes of a solution file to PyVRP routes and repairs them for the current instance.
+
+	Routes are split into trips at their depot visits. Orders that no longer exist and repeated visits are removed, a
+	new trip is started wherever the load of a trip would exceed the vehicle capacity, for example in files written
+	without reloads or after order volumes changed, and required orders missing from the routes are served by new
+	single-order routes. Remaining violations of time windows or shifts are left to PyVRP, which penalizes and repairs
+	them during the search.
+
+	Args:
+		instance (Instance): The problem instance.
+		vehicle_routes (list[list[int]]): Routes as lists of order IDs, where 0 stands for the depot.
+
+	Returns:
+		SolutionTrips: The repaired routes.
+	"""
+	order_by_id = instance.order_by_id
+	visited: set[int] = set()
+	solution_routes: SolutionTrips = []
+	for route in vehicle_routes:
+		trips: list[list[int]] = [[]]
+		load = 0
+		for order_id in route:
+			if order_id == 0:
+				trips.append([])
+				load = 0
+			elif order_id in order_by_id and order_id not in visited:
+				visited.add(order_id)
+				order = order_by_id[order_id]
+				if trips[-1] and load + order.volume > instance.vehicle_capacity:
+					trips.append([])
+					load = 0
+				trips[-1].append(order.inner_id)
+				load += order.volume
+		trips = [trip for trip in trips if trip]
+		if trips:
+			solution_routes.append((0, trips))
+
+	for order in instance.orders:
+		if not order.optional and order.id not in visited:
+			solution_routes.append((0, [[order.inner_id]]))
+	return solution_routes
+
+
+def load_warm_start(instance: Instance, solution_path: Path) -> WarmStart:
+	"""Reads a solution file written by `export_solution` in any format and prepares it for warm-starting the
+	solver."""
+	solution = export_solution.read_solution(solution_path)
+	vehicle_trips = vehicle_trips_from_routes(instance, [vehicle['route'] for vehicle in solution['vehicles']])
+	loader_routes = [loader['route'] for loader in solution['loaders']]
+	return WarmStart(vehicle_trips, loader_routes)
+
+
+def loader_job_order(jobs: list[LoaderJob], loader_routes: list[list[int]]) -> list[int]:
+	"""
+	Derives an initial order of loader jobs from previous loader routes.
+
+	Jobs are ordered by their first appearance when the loader routes are read one after another, so the greedy
+	schedule construction assigns them similarly. Jobs not present in the previous routes follow in their current
+	order.
+
+	Args:
+		jobs (list[LoaderJob]): The current loader jobs.
+		loader_routes (list[list[int]]): Previous loader routes as lists of the order IDs of the jobs.
+
+	Returns:
+		list[int]: A permutation of job indices.
+	"""
+	index_by_order = {job.order_id: idx for idx, job in enumerate(jobs)}
+	order: list[int] = []
+	placed: set[int] = set()
+	for route in loader_routes:
+		for order_id in route:
+			idx = index_by_order.get(order_id)
+			if idx is not None and idx not in placed:
+				placed.add(idx)
+				order.append(idx)
+	order += [idx for idx in range(len(jobs)) if idx not in placed]
+	return order